@@ -0,0 +1,147 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+import metrics
+
+
+def _hour_key():
+    return datetime.now().strftime('%Y-%m-%d %H')
+
+
+class CacheEntry:
+    def __init__(self, fingerprint, system, analysis, latest_entry, row_count):
+        self.fingerprint = fingerprint
+        self.system = system
+        self.latest_entry = latest_entry
+        self.row_count = row_count
+        self.created_at = time.time()
+        # (hour, analysis) is replaced as one tuple so concurrent readers never pair an
+        # analysis with the wrong hour
+        self._current = (_hour_key(), analysis)
+
+    @property
+    def analysis(self):
+        return self._current[1]
+
+    def current_analysis(self):
+        """Return the cached analysis, re-predicting the current-hour pattern if the hour rolled over"""
+        hour_key = _hour_key()
+        current_hour, analysis = self._current
+        # Precomputed results without a stored model keep the pattern they were computed with
+        if hour_key != current_hour and self.system is not None:
+            current_pattern = self.system.refresh_current_pattern(self.latest_entry)
+            analysis = dict(analysis, current_pattern=current_pattern)
+            self._current = (hour_key, analysis)
+        return analysis
+
+
+class ResultCache:
+    """Thread-safe LRU of small computed results under caller-built keys.
+
+    Keys should include the user's data version, so an entry never needs invalidating.
+    """
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class AnalyticsCache:
+    """LRU cache of fitted analytics systems and their results, one entry per user.
+
+    An entry is only served while its fingerprint (the user's data version) still
+    matches; a stale entry is kept so its fitted models can be updated incrementally.
+    Eviction is by entry count and by the total number of rows the cached models were
+    fitted on, which tracks model memory. All methods are thread-safe, and entries are
+    never modified after put() apart from the hourly pattern refresh.
+    """
+
+    def __init__(self, max_entries=128, max_rows=2000000):
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self._entries = OrderedDict()
+        self._total_rows = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, user_id, fingerprint):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry.fingerprint != fingerprint:
+                self.misses += 1
+                metrics.analytics_cache_lookups.inc(result='miss')
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            metrics.analytics_cache_lookups.inc(result='hit')
+            return entry
+
+    def put(self, user_id, fingerprint, system, analysis, latest_entry, row_count):
+        entry = CacheEntry(fingerprint, system, analysis, latest_entry, row_count)
+        with self._lock:
+            self._remove(user_id)
+            self._entries[user_id] = entry
+            self._total_rows += row_count
+            self._evict()
+        return entry
+
+    def latest(self, user_id):
+        """Return the user's most recent entry, even if its fingerprint is stale"""
+        with self._lock:
+            return self._entries.get(user_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_rows = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'rows': self._total_rows,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+    def _remove(self, user_id):
+        entry = self._entries.pop(user_id, None)
+        if entry is not None:
+            self._total_rows -= entry.row_count
+
+    def _evict(self):
+        # Always keep the most recently inserted entry, even if it alone exceeds max_rows
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_entries or self._total_rows > self.max_rows
+        ):
+            _, entry = self._entries.popitem(last=False)
+            self._total_rows -= entry.row_count
+            self.evictions += 1
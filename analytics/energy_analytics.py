@@ -1,103 +1,240 @@
 import numpy as np
 import pandas as pd
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.preprocessing import StandardScaler
 from statsmodels.tsa.arima.model import ARIMA
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 import json
 import os
+import threading
+import time
+
+from analytics.models import FEATURE_COLUMNS, create_model, select_model
+from analytics.readings import as_readings, latest_entry
 
 class EnergyPatternAnalyzer:
-    def __init__(self):
+    def __init__(self, model_name=None):
         self.model = None
-        self.scaler = StandardScaler()
-        self.feature_columns = ['hour', 'day_of_week', 'month', 'temperature', 'humidity']
+        # A name from analytics.models.MODELS, or 'auto' to pick by history size
+        self.model_name = model_name or os.environ.get('PATTERN_MODEL', 'auto')
+        self.trained_model_name = None
+        self.fit_seconds = None
+        self.feature_columns = FEATURE_COLUMNS
         
     def preprocess_data(self, historical_data):
         """Preprocess historical energy data for pattern analysis"""
-        df = pd.DataFrame(historical_data)
-        df['timestamp'] = pd.to_datetime(df['date'])
-        df['hour'] = df['timestamp'].dt.hour
-        df['day_of_week'] = df['timestamp'].dt.dayofweek
-        df['month'] = df['timestamp'].dt.month
+        readings = as_readings(historical_data)
+        timestamps = readings['timestamp']
+        days = timestamps.astype('datetime64[D]').astype(np.int64)
+        features = {
+            'hour': (timestamps.astype('datetime64[h]').astype(np.int64) % 24),
+            'day_of_week': (days + 3) % 7,  # 1970-01-01 was a Thursday
+            'month': timestamps.astype('datetime64[M]').astype(np.int64) % 12 + 1,
+            'temperature': readings['temperature'],
+            'humidity': readings['humidity']
+        }
         
-        # Normalize features
-        X = df[self.feature_columns]
-        X_scaled = self.scaler.fit_transform(X)
+        # Scaling, where a model needs it, is part of the model's own pipeline
+        X = np.column_stack([features[column] for column in self.feature_columns]).astype(float)
         
-        return X_scaled, df['electric_energy'].values
+        return X, readings['electric_energy']
         
     def train_model(self, training_data):
-        """Train the pattern analysis model"""
+        """Train the pattern analysis model.
+
+        The fitted estimator is swapped in whole once training finishes and never
+        modified afterwards, so predict_pattern may run from any number of threads.
+        """
         X, y = self.preprocess_data(training_data)
-        self.model = RandomForestRegressor(n_estimators=100, random_state=42)
-        self.model.fit(X, y)
+        name = select_model(len(X), self.model_name)
+        model = create_model(name)
+        started = time.perf_counter()
+        model.fit(X, y)
+        self.fit_seconds = time.perf_counter() - started
+        self.model = model
+        self.trained_model_name = name
         
     def predict_pattern(self, input_data):
         """Predict energy consumption pattern"""
         if self.model is None:
             raise ValueError("Model not trained. Call train_model first.")
             
-        X = pd.DataFrame([input_data])
-        X_scaled = self.scaler.transform(X)
-        return self.model.predict(X_scaled)[0]
+        X = pd.DataFrame([input_data])[self.feature_columns].to_numpy(dtype=float)
+        return self.model.predict(X)[0]
+
+class _CompactARIMAResults:
+    """Picklable stand-in for fitted ARIMA results: the series, orders and parameters.
+
+    Fitted results carry the full filter and smoother output (hundreds of MB for a few
+    weeks of hours); restore() re-runs only the Kalman filter with the fitted parameters,
+    which gives the same forecasts and residuals.
+    """
+
+    def __init__(self, results):
+        self.endog = results.model.data.orig_endog
+        self.order = results.model.order
+        self.seasonal_order = results.model.seasonal_order
+        self.params = np.asarray(results.params)
+
+    def restore(self):
+        return ARIMA(self.endog, order=self.order, seasonal_order=self.seasonal_order).filter(self.params)
 
 class EnergyPredictor:
-    def __init__(self):
+    # (order, seasonal_order) used once a series has at least 100 hourly points
+    SEASONAL_ORDERS = {
+        'short_term': ((1, 1, 1), (1, 1, 1, 24)),
+        'long_term': ((2, 1, 2), (1, 1, 1, 24))
+    }
+
+    def __init__(self, refit_interval=168, drift_threshold=3.0):
         self.short_term_model = None
         self.long_term_model = None
+        # Incremental updates re-estimate parameters after refit_interval appended hours,
+        # or when the new hours' mean absolute standardized error exceeds drift_threshold
+        self.refit_interval = refit_interval
+        self.drift_threshold = drift_threshold
+        self.fit_state = {}
+        # statsmodels forecasts temporarily modify the results' model, so forecasts
+        # from results shared between copies of this predictor take turns
+        self._forecast_lock = threading.Lock()
+
+    def copy(self):
+        """A predictor that starts from this one's fitted models and can be updated without
+        changing this one. Fitted results are shared; statsmodels never updates them in place.
+        """
+        clone = EnergyPredictor(self.refit_interval, self.drift_threshold)
+        clone.short_term_model = self.short_term_model
+        clone.long_term_model = self.long_term_model
+        clone.fit_state = dict(self.fit_state)
+        clone._forecast_lock = self._forecast_lock
+        return clone
+
+    def __getstate__(self):
+        # Pickled for the process pool and the model store, so keep it small
+        state = self.__dict__.copy()
+        del state['_forecast_lock']
+        for attr in ('short_term_model', 'long_term_model'):
+            if state[attr] is not None:
+                state[attr] = _CompactARIMAResults(state[attr])
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._forecast_lock = threading.Lock()
+        for attr in ('short_term_model', 'long_term_model'):
+            compact = getattr(self, attr)
+            if isinstance(compact, _CompactARIMAResults):
+                try:
+                    setattr(self, attr, compact.restore())
+                except Exception as e:
+                    print(f"Error restoring {attr.replace('_model', '').replace('_', '-')} model: {str(e)}")
+                    setattr(self, attr, None)
+                    self.fit_state.pop(attr.replace('_model', ''), None)
         
     def prepare_time_series(self, data):
         """Prepare time series data for prediction"""
-        df = pd.DataFrame(data)
-        df['date'] = pd.to_datetime(df['date'])
-        df.set_index('date', inplace=True)
+        readings = as_readings(data)
+        series = pd.Series(readings['electric_energy'], name='electric_energy',
+                           index=pd.DatetimeIndex(readings['timestamp'], name='date'))
         # Use modern resampling and fill methods
-        series = df['electric_energy'].resample('h').mean().ffill()
-        return series
+        return series.resample('h').mean().ffill()
         
     def train_short_term(self, data):
         """Train short-term prediction model"""
-        try:
-            series = self.prepare_time_series(data)
-            if len(series) < 24:  # Need at least 24 hours of data
-                self.short_term_model = None
-                return
-                
-            # Use simpler model for small datasets
-            if len(series) < 100:
-                self.short_term_model = ARIMA(series, order=(1,0,0))
-            else:
-                self.short_term_model = ARIMA(series, order=(1,1,1), seasonal_order=(1,1,1,24))
-            self.short_term_model = self.short_term_model.fit()
-        except Exception as e:
-            print(f"Error training short-term model: {str(e)}")
-            self.short_term_model = None
+        self.short_term_model = self._train('short_term', data, incremental=False)
+
+    def update_short_term(self, data):
+        """Bring the short-term model up to date, re-estimating parameters only when due"""
+        self.short_term_model = self._train('short_term', data, incremental=True)
         
     def train_long_term(self, data):
         """Train long-term prediction model"""
+        self.long_term_model = self._train('long_term', data, incremental=False)
+
+    def update_long_term(self, data):
+        """Bring the long-term model up to date, re-estimating parameters only when due"""
+        self.long_term_model = self._train('long_term', data, incremental=True)
+
+    def _train(self, kind, data, incremental):
         try:
             series = self.prepare_time_series(data)
             if len(series) < 24:  # Need at least 24 hours of data
-                self.long_term_model = None
-                return
-                
-            # Use simpler model for small datasets
-            if len(series) < 100:
-                self.long_term_model = ARIMA(series, order=(1,0,0))
-            else:
-                self.long_term_model = ARIMA(series, order=(2,1,2), seasonal_order=(1,1,1,24))
-            self.long_term_model = self.long_term_model.fit()
+                self.fit_state.pop(kind, None)
+                return None
+
+            current = getattr(self, f'{kind}_model')
+            if incremental and current is not None:
+                return self._update(kind, current, series)
+            return self._fit(kind, series)
         except Exception as e:
-            print(f"Error training long-term model: {str(e)}")
-            self.long_term_model = None
+            print(f"Error training {kind.replace('_', '-')} model: {str(e)}")
+            self.fit_state.pop(kind, None)
+            return None
+
+    def _select_orders(self, kind, n_obs):
+        # Use simpler model for small datasets
+        if n_obs < 100:
+            return (1, 0, 0), (0, 0, 0, 0)
+        return self.SEASONAL_ORDERS[kind]
+
+    def _fit(self, kind, series):
+        order, seasonal_order = self._select_orders(kind, len(series))
+        results = ARIMA(series, order=order, seasonal_order=seasonal_order).fit()
+        self._remember(kind, series, (order, seasonal_order), appended=0)
+        return results
+
+    def _remember(self, kind, series, orders, appended):
+        self.fit_state[kind] = {
+            'orders': orders,
+            'start': series.index[0],
+            'end': series.index[-1],
+            'checksum': float(series.sum()),
+            'appended': appended
+        }
+
+    def _update(self, kind, results, series):
+        """Extend fitted results with new hours by filtering only; re-estimate when required"""
+        state = self.fit_state.get(kind)
+        if (state is None
+                or state['orders'] != self._select_orders(kind, len(series))
+                or series.index[0] != state['start']
+                or series.index[-1] < state['end']):
+            return self._fit(kind, series)
+
+        fitted_len = series.index.get_loc(state['end']) + 1
+        n_new = len(series) - fitted_len
+        appended = state['appended'] + n_new
+        if appended >= self.refit_interval:
+            return self._fit(kind, series)
+
+        if not np.isclose(float(series.iloc[:fitted_len].sum()), state['checksum']):
+            # Already fitted hours changed (deleted or late readings): re-run the filter
+            # over the whole series with the current parameters
+            results = results.apply(series, refit=False)
+        elif n_new:
+            results = results.append(series.iloc[fitted_len:], refit=False)
+        else:
+            return results
+
+        if n_new and self._drifted(results, n_new):
+            return self._fit(kind, series)
+        self._remember(kind, series, state['orders'], appended)
+        return results
+
+    def _drifted(self, results, n_new):
+        """Check whether the one-step errors on the newest hours are out of line with the fit"""
+        sigma2 = float(results.params.get('sigma2', 0.0))
+        if sigma2 <= 0:
+            return False
+        errors = np.asarray(results.resid)[-n_new:] / np.sqrt(sigma2)
+        return float(np.mean(np.abs(errors))) > self.drift_threshold
         
     def predict_next_hour(self):
         """Predict energy usage for the next hour"""
         if self.short_term_model is None:
             return 0.0  # Return 0 if model not trained
         try:
-            forecast = self.short_term_model.forecast(steps=1)
+            with self._forecast_lock:
+                forecast = self.short_term_model.forecast(steps=1)
             return float(forecast.iloc[0])  # Use iloc for position-based indexing
         except Exception as e:
             print(f"Error in next hour prediction: {str(e)}")
@@ -107,16 +244,27 @@ class EnergyPredictor:
         """Predict energy usage for the next 24 hours"""
         if self.short_term_model is None:
             raise ValueError("Short-term model not trained")
-        return self.short_term_model.forecast(steps=24)
+        with self._forecast_lock:
+            return self.short_term_model.forecast(steps=24)
         
     def predict_next_week(self):
         """Predict energy usage for the next week"""
         if self.long_term_model is None:
             raise ValueError("Long-term model not trained")
-        return self.long_term_model.forecast(steps=168)  # 24 * 7 hours
+        with self._forecast_lock:
+            return self.long_term_model.forecast(steps=168)  # 24 * 7 hours
+
+    def forecast_interval(self, steps, alpha=0.2):
+        """Short-term model forecast as (index, mean, lower, upper), or None if not trained"""
+        if self.short_term_model is None:
+            return None
+        with self._forecast_lock:
+            frame = self.short_term_model.get_forecast(steps=steps).summary_frame(alpha=alpha)
+        return (frame.index, frame['mean'].to_numpy(), frame['mean_ci_lower'].to_numpy(),
+                frame['mean_ci_upper'].to_numpy())
 
 class CarbonCalculator:
-    def __init__(self):
+    def __init__(self, intensity_csv=None):
         # Default emission factors (kg CO2/kWh)
         self.emission_factors = {
             'grid': 0.5,
@@ -125,10 +273,83 @@ class CarbonCalculator:
             'hydro': 0.0,
             'nuclear': 0.0
         }
+        # Optional time-varying grid intensity; falls back to the static 'grid' factor
+        self.intensity_times = None
+        self.intensity_values = None
+        self.hourly_profile = None
+        intensity_csv = intensity_csv or os.environ.get('GRID_INTENSITY_CSV')
+        if intensity_csv:
+            self.load_intensity_profile(intensity_csv)
         
     def update_emission_factors(self, new_factors):
         """Update emission factors with new values"""
         self.emission_factors.update(new_factors)
+
+    def load_intensity_profile(self, path):
+        """Load grid carbon intensity (kg CO2/kWh) from a CSV file.
+
+        Either 'timestamp,intensity' rows (hourly history/forecast) or a 24-row
+        'hour,intensity' profile. Dated profiles also yield an hour-of-day average
+        used for readings outside the covered period.
+        """
+        df = pd.read_csv(path)
+        if 'timestamp' in df.columns:
+            times = pd.to_datetime(df['timestamp'], format='ISO8601').dt.floor('h')
+            profile = pd.Series(df['intensity'].to_numpy(dtype=float), index=times)
+            profile = profile.groupby(level=0).mean()
+            self.intensity_times = profile.index.to_numpy()
+            self.intensity_values = profile.to_numpy()
+            hourly = profile.groupby(profile.index.hour).mean()
+            self.hourly_profile = hourly.reindex(range(24)).fillna(hourly.mean()).to_numpy()
+        elif 'hour' in df.columns:
+            hourly = df.groupby('hour')['intensity'].mean()
+            self.hourly_profile = hourly.reindex(range(24)).fillna(hourly.mean()).to_numpy(dtype=float)
+        else:
+            raise ValueError("Intensity CSV needs 'timestamp' or 'hour' and 'intensity' columns")
+
+    def intensity_for(self, timestamps):
+        """Grid intensity for each timestamp in a DatetimeIndex"""
+        if self.hourly_profile is None:
+            return np.full(len(timestamps), float(self.emission_factors['grid']))
+
+        intensity = self.hourly_profile[timestamps.hour.to_numpy()]
+        if self.intensity_times is not None and len(timestamps):
+            hours = timestamps.floor('h').to_numpy()
+            idx = np.minimum(np.searchsorted(self.intensity_times, hours), len(self.intensity_times) - 1)
+            matched = self.intensity_times[idx] == hours
+            intensity[matched] = self.intensity_values[idx[matched]]
+        return intensity
+
+    def footprint_breakdown(self, consumption_data):
+        """Compute the footprint and its per-day/per-month split in one vectorized pass"""
+        readings = as_readings(consumption_data)
+        timestamps = pd.DatetimeIndex(readings['timestamp'])
+        grid = np.nan_to_num(readings['electric_energy'])
+        solar = np.nan_to_num(readings['solar_energy'])
+
+        intensity = self.intensity_for(timestamps)
+        emissions = grid * intensity + solar * float(self.emission_factors['solar'])
+
+        days = timestamps.to_numpy().astype('datetime64[D]')
+        day_keys, day_index = np.unique(days, return_inverse=True)
+        month_keys, month_index = np.unique(days.astype('datetime64[M]'), return_inverse=True)
+        daily = np.bincount(day_index, weights=emissions, minlength=len(day_keys))
+        monthly = np.bincount(month_index, weights=emissions, minlength=len(month_keys))
+
+        return {
+            'total': float(np.dot(grid, intensity) + solar.sum() * float(self.emission_factors['solar'])),
+            'grid_energy': float(grid.sum()),
+            'solar_energy': float(solar.sum()),
+            'average_intensity': float(np.dot(grid, intensity) / grid.sum()) if grid.sum() > 0 else 0.0,
+            'daily': dict(zip(np.datetime_as_string(day_keys).tolist(), daily.tolist())),
+            'monthly': dict(zip(np.datetime_as_string(month_keys).tolist(), monthly.tolist()))
+        }
+
+    def low_carbon_hours(self, count=3):
+        """Hours of the day with the lowest average grid intensity, or None without a profile"""
+        if self.hourly_profile is None:
+            return None
+        return sorted(int(hour) for hour in np.argsort(self.hourly_profile, kind='stable')[:count])
         
     def calculate_footprint(self, energy_data):
         """Calculate carbon footprint based on energy usage"""
@@ -164,6 +385,12 @@ class CarbonCalculator:
                     recommendations.append("Consider increasing solar energy usage to reduce carbon footprint.")
                 if grid_usage > solar_usage:
                     recommendations.append("Your grid energy usage is higher than solar - try to shift more usage to daylight hours.")
+
+            # With an intensity profile, point at the hours when grid power is cleanest
+            clean_hours = self.low_carbon_hours()
+            if clean_hours and grid_usage > 0:
+                hours = ", ".join(f"{hour:02d}:00" for hour in clean_hours)
+                recommendations.append(f"Grid power is least carbon-intensive around {hours} - shift flexible loads to those hours.")
             
             if not recommendations:
                 recommendations.append("Maintain your current energy usage pattern while looking for opportunities to increase solar usage.")
@@ -174,7 +401,15 @@ class CarbonCalculator:
             return ["Consider increasing solar energy usage to reduce carbon footprint"]
 
 class CostCalculator:
-    def __init__(self):
+    """Time-of-use cost engine backed by (month, hour-of-week) rate lookup tables.
+
+    A tariff is a dict (or a JSON file, see analytics/tariffs/) with per-period
+    'rates', a list of 'seasons' mapping months to 'weekday'/'weekend' hour ranges
+    per period, a 'default_period' for unassigned hours and optional tiered 'blocks'
+    that add a per-kWh charge once monthly consumption passes a threshold.
+    """
+
+    def __init__(self, tariff=None):
         # Default rate schedule ($/kWh)
         self.rate_schedules = {
             'peak': {
@@ -190,51 +425,204 @@ class CostCalculator:
                 'rate': 0.15
             }
         }
-        
+        if tariff is None:
+            tariff = os.environ.get('TARIFF_FILE') or self.schedules_to_tariff(self.rate_schedules)
+        self.load_tariff(tariff)
+
+    @staticmethod
+    def schedules_to_tariff(rate_schedules, default_period='shoulder'):
+        """Convert a simple rate_schedules dict into a year-round tariff definition"""
+        hours = {period: schedule['hours'] for period, schedule in rate_schedules.items()}
+        return {
+            'rates': {period: schedule['rate'] for period, schedule in rate_schedules.items()},
+            'seasons': [{'months': list(range(1, 13)), 'weekday': hours, 'weekend': hours}],
+            'default_period': default_period
+        }
+
+    def load_tariff(self, tariff):
+        """Load a tariff (dict or path to a JSON file) and build the rate lookup tables"""
+        if isinstance(tariff, str):
+            with open(tariff) as f:
+                tariff = json.load(f)
+
+        base_rates = tariff['rates']
+        self.period_names = list(base_rates)
+        default_period = tariff.get('default_period', self.period_names[0])
+        period_index = {name: i for i, name in enumerate(self.period_names)}
+        if default_period not in period_index:
+            raise ValueError(f"Unknown default period: {default_period}")
+
+        # Rows are months, columns are hours of the week (Monday 00:00 = 0)
+        self.period_table = np.full((12, 168), period_index[default_period], dtype=np.intp)
+        self.rate_table = np.zeros((12, 168))
+        for season in tariff.get('seasons', [{}]):
+            weekday = season.get('weekday', {})
+            weekend = season.get('weekend', weekday)
+            week = np.full(168, period_index[default_period], dtype=np.intp)
+            for day in range(7):
+                for period, ranges in (weekend if day >= 5 else weekday).items():
+                    if period not in period_index:
+                        raise ValueError(f"Period '{period}' has no rate")
+                    for start, end in ranges:
+                        week[day * 24 + start:day * 24 + end] = period_index[period]
+
+            rates = dict(base_rates, **season.get('rates', {}))
+            season_rates = np.array([float(rates[name]) for name in self.period_names])
+            for month in season.get('months', range(1, 13)):
+                self.period_table[month - 1] = week
+                self.rate_table[month - 1] = season_rates[week]
+
+        # Tiered blocks: (lower, upper, adder) in kWh of consumption per calendar month
+        self.blocks = []
+        lower = 0.0
+        for block in tariff.get('blocks', []):
+            upper = float(block['up_to']) if block.get('up_to') is not None else np.inf
+            self.blocks.append((lower, upper, float(block.get('adder', 0.0))))
+            lower = upper
+        self.tariff = tariff
+
     def get_rate_for_time(self, timestamp):
         """Get the applicable rate for a given timestamp"""
-        hour = timestamp.hour
-        
-        for period, schedule in self.rate_schedules.items():
-            for start, end in schedule['hours']:
-                if start <= hour < end:
-                    return schedule['rate']
-        return self.rate_schedules['shoulder']['rate']
+        timestamp = pd.Timestamp(timestamp)
+        return float(self.rate_table[timestamp.month - 1, timestamp.dayofweek * 24 + timestamp.hour])
+
+    def _prepare(self, consumption_data):
+        """Return time-sorted (timestamps, energy) arrays"""
+        readings = as_readings(consumption_data)
+        timestamps = readings['timestamp']
+        energy = readings['electric_energy']
+        order = np.argsort(timestamps, kind='stable')
+        return pd.DatetimeIndex(timestamps[order]), energy[order]
+
+    def _block_charges(self, timestamps, energy):
+        """Per-reading tiered block charges, based on cumulative consumption within each month"""
+        charges = np.zeros_like(energy)
+        if not self.blocks or not len(energy):
+            return charges
+
+        month_key = timestamps.year.to_numpy() * 12 + timestamps.month.to_numpy()
+        new_month = np.r_[True, month_key[1:] != month_key[:-1]]
+        cumulative = np.cumsum(energy)
+        month_start = (cumulative - energy)[np.flatnonzero(new_month)]
+        upper = cumulative - month_start[np.cumsum(new_month) - 1]
+        lower = upper - energy
+        for block_lower, block_upper, adder in self.blocks:
+            charges += (np.clip(upper, block_lower, block_upper) - np.clip(lower, block_lower, block_upper)) * adder
+        return charges
+
+    def cost_breakdown(self, consumption_data):
+        """Compute total cost, peak share and per-period totals in one vectorized pass"""
+        timestamps, energy = self._prepare(consumption_data)
+        months = timestamps.month.to_numpy() - 1
+        slots = timestamps.dayofweek.to_numpy() * 24 + timestamps.hour.to_numpy()
+
+        periods = self.period_table[months, slots]
+        block_charges = self._block_charges(timestamps, energy)
+        costs = energy * self.rate_table[months, slots] + block_charges
+
+        n_periods = len(self.period_names)
+        period_energy = np.bincount(periods, weights=energy, minlength=n_periods)
+        period_cost = np.bincount(periods, weights=costs, minlength=n_periods)
+        period_readings = np.bincount(periods, minlength=n_periods)
+
+        total_energy = float(energy.sum())
+        peak_share = 0.0
+        if 'peak' in self.period_names and total_energy > 0:
+            peak_share = float(period_energy[self.period_names.index('peak')] / total_energy)
+
+        return {
+            'total_cost': float(costs.sum()),
+            'total_energy': total_energy,
+            'peak_share': peak_share,
+            'block_charges': float(block_charges.sum()),
+            'periods': {
+                name: {
+                    'energy': float(period_energy[i]),
+                    'cost': float(period_cost[i]),
+                    'readings': int(period_readings[i])
+                }
+                for i, name in enumerate(self.period_names)
+            }
+        }
         
     def calculate_cost(self, consumption_data):
         """Calculate energy costs based on time-of-use pricing"""
-        total_cost = 0
-        for entry in consumption_data:
-            timestamp = pd.to_datetime(entry['date'])
-            rate = self.get_rate_for_time(timestamp)
-            total_cost += entry['electric_energy'] * rate
-        return total_cost
+        return self.cost_breakdown(consumption_data)['total_cost']
         
-    def optimize_schedule(self, consumption_data):
+    def optimize_schedule(self, consumption_data, breakdown=None):
         """Suggest optimal usage times to minimize costs"""
         recommendations = []
+        if breakdown is None:
+            breakdown = self.cost_breakdown(consumption_data)
         
         # Analyze current usage patterns
-        peak_usage = sum(1 for entry in consumption_data 
-                        if any(start <= pd.to_datetime(entry['date']).hour < end 
-                              for start, end in self.rate_schedules['peak']['hours']))
+        readings = sum(period['readings'] for period in breakdown['periods'].values())
+        peak_usage = breakdown['periods'].get('peak', {}).get('readings', 0)
         
-        if peak_usage > len(consumption_data) * 0.3:  # If more than 30% usage during peak
+        if peak_usage > readings * 0.3:  # If more than 30% usage during peak
             recommendations.append("Consider shifting some energy usage to off-peak hours to reduce costs.")
             
         return recommendations
 
 class EnergyAnalyticsSystem:
-    def __init__(self):
+    """Fits and runs every analysis stage for one user's data.
+
+    Thread safety: each analyze_consumption call should get its own system (run_analysis
+    creates one per call). Nothing is shared between systems except fitted models,
+    which are never modified once fitted, so systems for different users, or for
+    the same user, can be analysed concurrently. A system that has finished analysing
+    is read-only: refresh_current_pattern and the predictor's forecasts may be called
+    from any number of threads. Processes that analyse in a pool start it with the
+    forkserver method, never fork, since the threaded web worker has already run
+    OpenMP-backed predictions.
+    """
+
+    def __init__(self, predictor=None):
         self.pattern_analyzer = EnergyPatternAnalyzer()
-        self.predictor = EnergyPredictor()
+        # Start from an existing predictor's fitted models and update a copy incrementally;
+        # the predictor passed in is left as it was
+        self.predictor = predictor.copy() if predictor is not None else EnergyPredictor()
         self.carbon_calculator = CarbonCalculator()
         self.cost_calculator = CostCalculator()
+        # Seconds spent in each stage of the last analyze_consumption call
+        self.stage_timings = {}
+
+    @contextmanager
+    def _stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage_timings[name] = time.perf_counter() - started
         
+    def current_conditions(self, latest_entry):
+        """Build the pattern model input for the current hour"""
+        now = datetime.now()
+        return {
+            'hour': now.hour,
+            'day_of_week': now.weekday(),
+            'month': now.month,
+            'temperature': float(latest_entry.get('temperature', 25)),
+            'humidity': float(latest_entry.get('humidity', 60))
+        }
+
+    def refresh_current_pattern(self, latest_entry):
+        """Re-predict the current pattern with the already trained model"""
+        try:
+            return float(self.pattern_analyzer.predict_pattern(self.current_conditions(latest_entry)))
+        except Exception as e:
+            print(f"Pattern refresh error: {str(e)}")
+            return 0.0
+
     def analyze_consumption(self, data):
-        """Perform comprehensive energy analysis"""
+        """Perform comprehensive energy analysis.
+
+        data is a READING_DTYPE record array (analytics.readings.read_cursor) or
+        anything as_readings converts; every stage works on the same parsed columns.
+        """
         try:
-            if not data:
+            data = as_readings(data)
+            if not len(data):
                 return {
                     'current_pattern': 0.0,
                     'next_hour_prediction': 0.0,
@@ -246,67 +634,68 @@ class EnergyAnalyticsSystem:
                     }
                 }
 
+            self.stage_timings = {}
+
             # Convert data for analysis
-            current_data = {
-                'hour': datetime.now().hour,
-                'day_of_week': datetime.now().weekday(),
-                'month': datetime.now().month,
-                'temperature': float(data[-1].get('temperature', 25)),
-                'humidity': float(data[-1].get('humidity', 60))
-            }
+            current_data = self.current_conditions(latest_entry(data))
 
             # Pattern Analysis
-            try:
-                self.pattern_analyzer.train_model(data)
-                current_pattern = self.pattern_analyzer.predict_pattern(current_data)
-            except Exception as e:
-                print(f"Pattern analysis error: {str(e)}")
-                current_pattern = 0.0
+            with self._stage('pattern_fit'):
+                try:
+                    self.pattern_analyzer.train_model(data)
+                    current_pattern = self.pattern_analyzer.predict_pattern(current_data)
+                except Exception as e:
+                    print(f"Pattern analysis error: {str(e)}")
+                    current_pattern = 0.0
 
             # Predictions
-            try:
-                self.predictor.train_short_term(data)
-                next_hour = self.predictor.predict_next_hour()
-            except Exception as e:
-                print(f"Prediction error: {str(e)}")
-                next_hour = 0.0
+            with self._stage('arima_fit'):
+                try:
+                    self.predictor.update_short_term(data)
+                    next_hour = self.predictor.predict_next_hour()
+                except Exception as e:
+                    print(f"Prediction error: {str(e)}")
+                    next_hour = 0.0
 
             # Carbon Footprint
-            try:
-                total_grid_energy = sum(float(entry.get('electric_energy', 0)) for entry in data)
-                total_solar_energy = sum(float(entry.get('solar_energy', 0)) for entry in data)
-                
-                energy_mix = {
-                    'grid': total_grid_energy,
-                    'solar': total_solar_energy
-                }
+            with self._stage('carbon'):
+                try:
+                    carbon_breakdown = self.carbon_calculator.footprint_breakdown(data)
+                    total_grid_energy = carbon_breakdown['grid_energy']
+                    total_solar_energy = carbon_breakdown['solar_energy']
                 
-                carbon_footprint = self.carbon_calculator.calculate_footprint(energy_mix)
-                carbon_recommendations = self.carbon_calculator.get_recommendations(
-                    carbon_footprint,
-                    {'solar': total_solar_energy, 'grid': total_grid_energy}
-                )
-            except Exception as e:
-                print(f"Carbon calculation error: {str(e)}")
-                carbon_footprint = 0.0
-                carbon_recommendations = ["Consider increasing solar energy usage to reduce carbon footprint"]
+                    carbon_footprint = carbon_breakdown['total']
+                    carbon_recommendations = self.carbon_calculator.get_recommendations(
+                        carbon_footprint,
+                        {'solar': total_solar_energy, 'grid': total_grid_energy}
+                    )
+                except Exception as e:
+                    print(f"Carbon calculation error: {str(e)}")
+                    carbon_footprint = 0.0
+                    carbon_breakdown = None
+                    carbon_recommendations = ["Consider increasing solar energy usage to reduce carbon footprint"]
 
             # Cost Analysis
-            try:
-                energy_cost = self.cost_calculator.calculate_cost(data)
-                cost_recommendations = self.cost_calculator.optimize_schedule(data)
-                if not cost_recommendations:
-                    cost_recommendations = ["Consider shifting energy usage to off-peak hours for cost savings"]
-            except Exception as e:
-                print(f"Cost calculation error: {str(e)}")
-                energy_cost = 0.0
-                cost_recommendations = ["Try to reduce energy usage during peak hours (9AM-12PM and 5PM-9PM)"]
+            with self._stage('cost'):
+                try:
+                    cost_breakdown = self.cost_calculator.cost_breakdown(data)
+                    energy_cost = cost_breakdown['total_cost']
+                    cost_recommendations = self.cost_calculator.optimize_schedule(data, breakdown=cost_breakdown)
+                    if not cost_recommendations:
+                        cost_recommendations = ["Consider shifting energy usage to off-peak hours for cost savings"]
+                except Exception as e:
+                    print(f"Cost calculation error: {str(e)}")
+                    energy_cost = 0.0
+                    cost_breakdown = None
+                    cost_recommendations = ["Try to reduce energy usage during peak hours (9AM-12PM and 5PM-9PM)"]
 
             return {
                 'current_pattern': float(current_pattern),
                 'next_hour_prediction': float(next_hour),
                 'carbon_footprint': float(carbon_footprint),
+                'carbon_breakdown': carbon_breakdown,
                 'energy_cost': float(energy_cost),
+                'cost_breakdown': cost_breakdown,
                 'recommendations': {
                     'carbon': carbon_recommendations if carbon_recommendations else ["Consider increasing solar energy usage"],
                     'cost': cost_recommendations if cost_recommendations else ["Shift usage to off-peak hours when possible"]
@@ -0,0 +1,122 @@
+"""Lightweight multi-horizon consumption forecasts, vectorized across users.
+
+ProfileForecaster predicts each of the next 168 hours as a recency-weighted average
+of the same hour of the week over the last few weeks. Until a user has enough weeks
+of history it uses the same hour of the day instead. Prediction intervals are
+empirical quantiles of the errors the same method made forecasting the most recent
+week from the weeks before it. All of it is numpy over a (users, hours) matrix, so
+one pass forecasts many users for less than a single ARIMA fit.
+"""
+import warnings
+from datetime import timedelta
+from statistics import NormalDist
+
+import numpy as np
+
+HORIZONS = {'1h': 1, '24h': 24, '168h': 168}
+MAX_HORIZON = 168
+WEEK = 168
+DAY = 24
+
+
+def _weighted_nanmean(blocks, decay):
+    """Average (users, n_blocks, width) over blocks, newest block weighted 1, older ones decay**age"""
+    weights = decay ** np.arange(blocks.shape[1] - 1, -1, -1, dtype=float)
+    present = ~np.isnan(blocks)
+    weights = present * weights[None, :, None]
+    total = weights.sum(axis=1)
+    weighted = np.where(present, blocks, 0.0) * weights
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(total > 0, weighted.sum(axis=1) / total, np.nan), present.sum(axis=1)
+
+
+class Forecast:
+    def __init__(self, start, values, lower, upper, model, interval):
+        self.start = start
+        self.values = values
+        self.lower = lower
+        self.upper = upper
+        self.model = model
+        self.interval = interval
+
+    def records(self, steps):
+        return [
+            {
+                'date': (self.start + timedelta(hours=step)).strftime('%Y-%m-%d %H:%M:%S'),
+                'value': round(float(self.values[step]), 4),
+                'lower': round(float(self.lower[step]), 4),
+                'upper': round(float(self.upper[step]), 4)
+            }
+            for step in range(min(steps, len(self.values)))
+        ]
+
+
+class ProfileForecaster:
+    def __init__(self, weeks=4, interval=0.8, min_weeks=2, weekly_decay=0.7, daily_decay=0.85):
+        self.weeks = weeks
+        self.interval = interval
+        # Hours of the week seen in fewer weeks than this use the daily profile
+        self.min_weeks = min_weeks
+        self.weekly_decay = weekly_decay
+        self.daily_decay = daily_decay
+
+    @property
+    def history_hours(self):
+        return self.weeks * WEEK
+
+    def profile(self, matrix):
+        """Expected use for the 168 hours after the last column of a (users, history_hours) matrix"""
+        users, hours = matrix.shape
+        weekly, seen = _weighted_nanmean(matrix.reshape(users, hours // WEEK, WEEK), self.weekly_decay)
+        daily, _ = _weighted_nanmean(matrix.reshape(users, hours // DAY, DAY), self.daily_decay)
+        profile = np.where(seen >= self.min_weeks, weekly, np.tile(daily, WEEK // DAY))
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            overall = np.nanmean(matrix, axis=1)
+        return np.where(np.isnan(profile), overall[:, None], profile)
+
+    def forecast(self, matrix):
+        """Return (values, lower, upper), each (users, 168), for rows ending at each user's latest hour"""
+        users = matrix.shape[0]
+        values = self.profile(matrix)
+
+        # Backtest: forecast the most recent week from the history before it
+        earlier = np.concatenate([np.full((users, WEEK), np.nan), matrix[:, :-WEEK]], axis=1)
+        errors = matrix[:, -WEEK:] - self.profile(earlier)
+        tail = (1 - self.interval) / 2
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            low = np.nanquantile(errors, tail, axis=1)
+            high = np.nanquantile(errors, 1 - tail, axis=1)
+            spread = np.nanstd(matrix, axis=1)
+        # Too little history to backtest: a normal interval around the profile
+        z = NormalDist().inv_cdf(1 - tail)
+        enough = np.sum(~np.isnan(errors), axis=1) >= DAY
+        low = np.where(enough, low, -z * spread)
+        high = np.where(enough, high, z * spread)
+
+        lower = np.clip(values + np.minimum(low, 0)[:, None], 0, None)
+        upper = values + np.maximum(high, 0)[:, None]
+        return np.clip(values, 0, None), lower, upper
+
+    def forecast_series(self, series):
+        """Forecast {user_id: (latest hour, hourly array)} (rollups.hourly_series) in one pass"""
+        user_ids = list(series)
+        if not user_ids:
+            return {}
+        values, lower, upper = self.forecast(np.vstack([series[user_id][1] for user_id in user_ids]))
+        return {
+            user_id: Forecast(series[user_id][0] + timedelta(hours=1), values[i], lower[i], upper[i],
+                              'profile', self.interval)
+            for i, user_id in enumerate(user_ids)
+        }
+
+
+def arima_forecast(predictor, interval=0.8):
+    """Forecast the next 168 hours with a fitted EnergyPredictor, or None if it has no model"""
+    result = predictor.forecast_interval(MAX_HORIZON, alpha=1 - interval)
+    if result is None:
+        return None
+    index, values, lower, upper = result
+    return Forecast(index[0].to_pydatetime(), np.clip(values, 0, None), np.clip(lower, 0, None),
+                    np.clip(upper, 0, None), 'arima', interval)
@@ -0,0 +1,155 @@
+import logging
+import multiprocessing
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger(__name__)
+
+
+def run_analysis(data, predictor=None):
+    """Worker entry point: fit a system on data and return (analysis, fitted system)"""
+    # Imported here so the web process only loads the modelling stack on first use
+    from analytics.energy_analytics import EnergyAnalyticsSystem
+
+    system = EnergyAnalyticsSystem(predictor=predictor)
+    analysis = system.analyze_consumption(data)
+    return analysis, system
+
+
+class AnalyticsJob:
+    def __init__(self, user_id, fingerprint):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.fingerprint = fingerprint
+        self.status = 'pending'
+        self.analysis = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.finished_at = None
+        self.done = threading.Event()
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'submitted_at': self.submitted_at,
+            'finished_at': self.finished_at,
+            'error': self.error
+        }
+
+
+class AnalyticsJobQueue:
+    """Runs analytics jobs on a process pool so model fitting never blocks request threads.
+
+    Jobs are de-duplicated per (user, data fingerprint). The pool is created on first
+    use so that each gunicorn worker gets its own after forking. With max_workers=0
+    jobs run inline in the submitting thread.
+    """
+
+    def __init__(self, max_workers=2, job_ttl=600):
+        self.max_workers = max_workers
+        self.job_ttl = job_ttl
+        self._executor = None
+        self._jobs = {}
+        self._active = {}
+        self._lock = threading.Lock()
+
+    def submit(self, user_id, fingerprint, fn, args, on_done=None):
+        """Queue fn(*args) for the user unless the same fingerprint is already in flight.
+
+        fn must return (analysis, system), like run_analysis; on_done(job, result) is
+        called with that tuple on success.
+        """
+        with self._lock:
+            self._prune()
+            active = self._jobs.get(self._active.get((user_id, fingerprint)))
+            if active is not None and not active.done.is_set():
+                return active
+            job = AnalyticsJob(user_id, fingerprint)
+            self._jobs[job.id] = job
+            self._active[(user_id, fingerprint)] = job.id
+
+        if self.max_workers <= 0:
+            try:
+                self._finish(job, on_done, result=fn(*args))
+            except Exception as e:
+                self._finish(job, on_done, error=e)
+            return job
+
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except BrokenProcessPool:
+            # A crashed worker poisons the pool; start a new one and retry once
+            with self._lock:
+                self._executor = None
+            future = self._get_executor().submit(fn, *args)
+        job.status = 'running'
+        future.add_done_callback(lambda f: self._on_future_done(job, f, on_done))
+        return job
+
+    def active_job(self, user_id, fingerprint):
+        with self._lock:
+            job = self._jobs.get(self._active.get((user_id, fingerprint)))
+            if job is not None and not job.done.is_set():
+                return job
+            return None
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def wait(self, job_id, timeout):
+        job = self.get(job_id)
+        if job is not None and timeout > 0:
+            job.done.wait(timeout)
+        return job
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # Not fork: the web worker runs request and background threads and has used
+                # OpenMP for predictions, and forking such a process can hang the children
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                     mp_context=multiprocessing.get_context('forkserver'))
+            return self._executor
+
+    def _on_future_done(self, job, future, on_done):
+        try:
+            result = future.result()
+        except Exception as e:
+            self._finish(job, on_done, error=e)
+        else:
+            self._finish(job, on_done, result=result)
+
+    def _finish(self, job, on_done, result=None, error=None):
+        if error is None and on_done is not None:
+            try:
+                on_done(job, result)
+            except Exception as e:
+                error = e
+        if error is None:
+            job.status = 'done'
+            job.analysis = result[0]
+        else:
+            logger.error(f"Analytics job {job.id} for user {job.user_id} failed: {str(error)}", exc_info=error)
+            job.status = 'failed'
+            job.error = str(error)
+        job.finished_at = time.time()
+        job.done.set()
+
+    def _prune(self):
+        cutoff = time.time() - self.job_ttl
+        for job_id, job in list(self._jobs.items()):
+            if job.finished_at is not None and job.finished_at < cutoff:
+                del self._jobs[job_id]
+                if self._active.get((job.user_id, job.fingerprint)) == job_id:
+                    del self._active[(job.user_id, job.fingerprint)]
@@ -0,0 +1,267 @@
+"""Fitted analytics models persisted per user and data version.
+
+Each worker process has its own AnalyticsCache, so without a shared store every
+worker (and every restart) refits the same models. An artifact holds the fitted
+EnergyAnalyticsSystem together with the analysis computed from it and is keyed by
+(user, data version): any worker can serve it while the version still matches, and
+an older artifact still seeds the incremental ARIMA update.
+
+DirectoryStore keeps <root>/<user_id>/<version>.joblib files with a JSON sidecar and
+loads numpy arrays memory-mapped copy-on-write, so workers on one host share the pages
+until they modify them. DatabaseStore
+keeps the artifacts in the model_artifacts table for deployments without a shared disk.
+"""
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from database import execute_query
+
+# Bump when the pickled layout of EnergyAnalyticsSystem changes incompatibly
+FORMAT_VERSION = 1
+
+
+def _dump(system, f):
+    # joblib (and through the pickle the modelling stack) is loaded on first use
+    import joblib
+    joblib.dump(system, f)
+
+
+def _load(source, mmap_mode=None):
+    import joblib
+    return joblib.load(source, mmap_mode=mmap_mode)
+
+
+def library_versions():
+    """Versions an artifact must match to be unpickled safely"""
+    import numpy
+    import sklearn
+    import statsmodels
+    return {
+        'format': FORMAT_VERSION,
+        'numpy': numpy.__version__,
+        'sklearn': sklearn.__version__,
+        'statsmodels': statsmodels.__version__
+    }
+
+
+class StoredModels:
+    def __init__(self, metadata, system):
+        self.metadata = metadata
+        self.system = system
+        self.version = metadata['data_version']
+        self.analysis = metadata['analysis']
+        self.latest_entry = metadata['latest_entry']
+        self.row_count = metadata['row_count']
+        self.saved_at = metadata['saved_at']
+
+
+def _metadata(user_id, version, system, analysis, latest_entry, row_count):
+    return {
+        'user_id': user_id,
+        'data_version': version,
+        'saved_at': time.time(),
+        'row_count': row_count,
+        'latest_entry': latest_entry,
+        'analysis': analysis,
+        'pattern_model': getattr(system.pattern_analyzer, 'trained_model_name', None),
+        'libraries': library_versions()
+    }
+
+
+def _compatible(metadata):
+    return metadata.get('libraries') == library_versions()
+
+
+class DirectoryStore:
+    def __init__(self, root, keep=2, mmap=True):
+        self.root = root
+        self.keep = keep
+        self.mmap_mode = 'c' if mmap else None
+        os.makedirs(root, exist_ok=True)
+
+    def save(self, user_id, version, system, analysis, latest_entry, row_count):
+        """Write the artifact atomically; the sidecar is written last and marks it complete"""
+        user_dir = os.path.join(self.root, str(user_id))
+        os.makedirs(user_dir, exist_ok=True)
+        metadata = _metadata(user_id, version, system, analysis, latest_entry, row_count)
+        try:
+            self._write(os.path.join(user_dir, f'{version}.joblib'), lambda f: _dump(system, f))
+            self._write(os.path.join(user_dir, f'{version}.json'),
+                        lambda f: f.write(json.dumps(metadata, default=str).encode()))
+        except Exception as e:
+            print(f"Model store save error: {str(e)}")
+            return False
+        self._prune(user_dir)
+        return True
+
+    def load(self, user_id, version=None):
+        """Return StoredModels for the version (default: the newest one), or None"""
+        user_dir = os.path.join(self.root, str(user_id))
+        if version is None:
+            versions = self._versions(user_dir)
+            if not versions:
+                return None
+            version = versions[-1]
+        meta_path = os.path.join(user_dir, f'{version}.json')
+        try:
+            with open(meta_path) as f:
+                metadata = json.load(f)
+            if not _compatible(metadata):
+                return None
+            system = _load(os.path.join(user_dir, f'{version}.joblib'), self.mmap_mode)
+            # The sidecar's mtime records the last use, for hottest()
+            os.utime(meta_path)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Model store load error: {str(e)}")
+            return None
+        return StoredModels(metadata, system)
+
+    def hottest(self, limit):
+        """User ids whose artifacts were used most recently"""
+        used = []
+        for name in os.listdir(self.root):
+            user_dir = os.path.join(self.root, name)
+            if not name.isdigit() or not os.path.isdir(user_dir):
+                continue
+            mtimes = [os.path.getmtime(os.path.join(user_dir, f'{version}.json'))
+                      for version in self._versions(user_dir)]
+            if mtimes:
+                used.append((max(mtimes), int(name)))
+        return [user_id for _, user_id in sorted(used, reverse=True)[:limit]]
+
+    def clear(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+        os.makedirs(self.root, exist_ok=True)
+
+    def _write(self, path, write):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def _versions(self, user_dir):
+        try:
+            names = os.listdir(user_dir)
+        except FileNotFoundError:
+            return []
+        return sorted(int(name[:-5]) for name in names if name.endswith('.json') and name[:-5].isdigit())
+
+    def _prune(self, user_dir):
+        for version in self._versions(user_dir)[:-self.keep]:
+            for suffix in ('.json', '.joblib'):
+                try:
+                    os.unlink(os.path.join(user_dir, f'{version}{suffix}'))
+                except FileNotFoundError:
+                    pass
+
+
+class DatabaseStore:
+    """Artifacts as blobs in model_artifacts; connect() must return a DB-API connection"""
+
+    def __init__(self, connect, keep=2):
+        self.connect = connect
+        self.keep = keep
+
+    def save(self, user_id, version, system, analysis, latest_entry, row_count):
+        metadata = _metadata(user_id, version, system, analysis, latest_entry, row_count)
+        conn = None
+        try:
+            buffer = io.BytesIO()
+            _dump(system, buffer)
+            conn = self.connect()
+            cursor = conn.cursor()
+            execute_query(cursor, "DELETE FROM model_artifacts WHERE user_id = %s AND data_version = %s",
+                          (user_id, version))
+            execute_query(cursor, '''
+                INSERT INTO model_artifacts (user_id, data_version, metadata, payload, saved_at, used_at)
+                VALUES (%s, %s, %s, %s, %s, %s)
+            ''', (user_id, version, json.dumps(metadata, default=str), buffer.getvalue(),
+                  metadata['saved_at'], metadata['saved_at']))
+            execute_query(cursor, '''
+                DELETE FROM model_artifacts WHERE user_id = %s AND data_version NOT IN (
+                    SELECT data_version FROM model_artifacts WHERE user_id = %s
+                    ORDER BY data_version DESC LIMIT %s
+                )
+            ''', (user_id, user_id, self.keep))
+            conn.commit()
+            return True
+        except Exception as e:
+            print(f"Model store save error: {str(e)}")
+            if conn:
+                conn.rollback()
+            return False
+        finally:
+            if conn:
+                conn.close()
+
+    def load(self, user_id, version=None):
+        conn = None
+        try:
+            conn = self.connect()
+            cursor = conn.cursor()
+            if version is None:
+                execute_query(cursor, '''
+                    SELECT data_version, metadata, payload FROM model_artifacts
+                    WHERE user_id = %s ORDER BY data_version DESC LIMIT 1
+                ''', (user_id,))
+            else:
+                execute_query(cursor, '''
+                    SELECT data_version, metadata, payload FROM model_artifacts
+                    WHERE user_id = %s AND data_version = %s
+                ''', (user_id, version))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            metadata = json.loads(row[1])
+            if not _compatible(metadata):
+                return None
+            system = _load(io.BytesIO(bytes(row[2])))
+            execute_query(cursor, "UPDATE model_artifacts SET used_at = %s WHERE user_id = %s AND data_version = %s",
+                          (time.time(), user_id, row[0]))
+            conn.commit()
+        except Exception as e:
+            print(f"Model store load error: {str(e)}")
+            return None
+        finally:
+            if conn:
+                conn.close()
+        return StoredModels(metadata, system)
+
+    def hottest(self, limit):
+        conn = self.connect()
+        try:
+            cursor = conn.cursor()
+            execute_query(cursor, '''
+                SELECT user_id FROM model_artifacts GROUP BY user_id ORDER BY MAX(used_at) DESC LIMIT %s
+            ''', (limit,))
+            return [row[0] for row in cursor.fetchall()]
+        finally:
+            conn.close()
+
+    def clear(self):
+        conn = self.connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM model_artifacts")
+            conn.commit()
+        finally:
+            conn.close()
+
+
+def create_store(setting, connect=None, keep=2, mmap=True):
+    """'' disables the store, 'db' uses the database, anything else is a directory path"""
+    if not setting:
+        return None
+    if setting == 'db':
+        return DatabaseStore(connect, keep=keep)
+    return DirectoryStore(setting, keep=keep, mmap=mmap)
@@ -0,0 +1,120 @@
+import pickle
+import time
+
+import numpy as np
+from sklearn.ensemble import HistGradientBoostingRegressor, RandomForestRegressor
+from sklearn.linear_model import Ridge
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import FunctionTransformer, StandardScaler
+
+FEATURE_COLUMNS = ['hour', 'day_of_week', 'month', 'temperature', 'humidity']
+
+# Harmonics of the daily cycle, overall and for the weekend shape
+HOUR_HARMONICS = 6
+WEEKEND_HARMONICS = 3
+
+# 'auto' picks the first entry whose row limit the history stays under
+AUTO_SELECTION = [(720, 'ridge'), (None, 'hist_gradient_boosting')]
+
+
+def fourier_features(X):
+    """Expand (hour, day_of_week, month, temperature, humidity) into cyclic features"""
+    X = np.asarray(X, dtype=float)
+    hour, day_of_week, month, temperature, humidity = X.T
+    weekend = (day_of_week >= 5).astype(float)
+    columns = [weekend, temperature, humidity, np.clip(temperature - 24, 0, None)]
+    for k in range(1, HOUR_HARMONICS + 1):
+        columns += [np.sin(2 * np.pi * k * hour / 24), np.cos(2 * np.pi * k * hour / 24)]
+    for k in range(1, WEEKEND_HARMONICS + 1):
+        columns += [weekend * np.sin(2 * np.pi * k * hour / 24), weekend * np.cos(2 * np.pi * k * hour / 24)]
+    for k in (1, 2):
+        columns += [np.sin(2 * np.pi * k * day_of_week / 7), np.cos(2 * np.pi * k * day_of_week / 7)]
+    columns += [np.sin(2 * np.pi * month / 12), np.cos(2 * np.pi * month / 12)]
+    return np.column_stack(columns)
+
+
+def _ridge():
+    return make_pipeline(FunctionTransformer(fourier_features), StandardScaler(), Ridge(alpha=1.0))
+
+
+def _hist_gradient_boosting():
+    return HistGradientBoostingRegressor(max_iter=100, learning_rate=0.1, random_state=42)
+
+
+def _random_forest():
+    return make_pipeline(StandardScaler(), RandomForestRegressor(n_estimators=100, random_state=42))
+
+
+MODELS = {
+    'ridge': _ridge,
+    'hist_gradient_boosting': _hist_gradient_boosting,
+    'random_forest': _random_forest
+}
+
+
+def register_model(name, factory):
+    """Make an estimator factory available by name (PATTERN_MODEL=<name>)"""
+    MODELS[name] = factory
+
+
+def select_model(n_rows, name='auto'):
+    """Resolve a configured model name, applying the 'auto' size rules"""
+    if name and name != 'auto':
+        if name not in MODELS:
+            raise ValueError(f"Unknown pattern model '{name}' (available: {', '.join(sorted(MODELS))})")
+        return name
+    for limit, candidate in AUTO_SELECTION:
+        if limit is None or n_rows < limit:
+            return candidate
+    return AUTO_SELECTION[-1][1]
+
+
+def create_model(name):
+    if name not in MODELS:
+        raise ValueError(f"Unknown pattern model '{name}' (available: {', '.join(sorted(MODELS))})")
+    return MODELS[name]()
+
+
+def model_size(model):
+    """Pickled size in bytes, a proxy for the memory a fitted model holds"""
+    return len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def evaluate_models(X, y, names=None, holdout=0.2):
+    """Fit each model on the oldest rows and score it on the newest holdout fraction.
+
+    Returns one dict per model with fit/predict seconds, fitted size and holdout
+    MAE/RMSE, so deployments can pick their latency/accuracy trade-off.
+    """
+    X = np.asarray(X, dtype=float)
+    y = np.asarray(y, dtype=float)
+    split = max(1, int(len(X) * (1 - holdout)))
+    X_train, y_train, X_test, y_test = X[:split], y[:split], X[split:], y[split:]
+
+    report = []
+    for name in names or list(MODELS):
+        model = create_model(name)
+        started = time.perf_counter()
+        model.fit(X_train, y_train)
+        fit_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        predictions = model.predict(X_test) if len(X_test) else np.array([])
+        predict_seconds = time.perf_counter() - started
+        single_started = time.perf_counter()
+        model.predict(X_train[-1:])
+        single_predict_seconds = time.perf_counter() - single_started
+
+        errors = predictions - y_test
+        report.append({
+            'model': name,
+            'train_rows': len(X_train),
+            'holdout_rows': len(X_test),
+            'fit_seconds': fit_seconds,
+            'predict_seconds': predict_seconds,
+            'single_predict_seconds': single_predict_seconds,
+            'size_bytes': model_size(model),
+            'mae': float(np.mean(np.abs(errors))) if len(errors) else None,
+            'rmse': float(np.sqrt(np.mean(errors ** 2))) if len(errors) else None
+        })
+    return report
@@ -0,0 +1,98 @@
+"""Energy readings as one NumPy record array per history.
+
+The analytics stages take a READING_DTYPE array: timestamps are parsed once, when the
+array is built straight from the database cursor, and every stage works on the same
+columns instead of re-reading a list of per-row dicts. Lists of dicts (and pandas
+frames) are still accepted and converted once by as_readings.
+"""
+from datetime import datetime, timezone
+
+import numpy as np
+
+READING_DTYPE = np.dtype([
+    ('timestamp', 'datetime64[s]'),
+    ('solar_energy', 'f8'),
+    ('electric_energy', 'f8'),
+    ('temperature', 'f8'),
+    ('humidity', 'f8')
+])
+VALUE_COLUMNS = READING_DTYPE.names[1:]
+# Readings stored without weather use the same defaults as the dashboard
+DEFAULTS = {'temperature': 25.0, 'humidity': 60.0}
+
+
+def _parse_one(value):
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        text = str(value).strip()
+        parsed = datetime.fromisoformat(text[:-1] + '+00:00' if text.endswith('Z') else text)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def parse_timestamps(values):
+    """datetime64[s] array from stored dates (text on SQLite, datetime on PostgreSQL)"""
+    try:
+        return np.array(values, dtype='datetime64[s]')
+    except (ValueError, TypeError):
+        # Offsets and other ISO forms numpy does not take
+        return np.array([_parse_one(value) for value in values], dtype='datetime64[s]')
+
+
+def _fill_defaults(records):
+    for column, default in DEFAULTS.items():
+        values = records[column]
+        values[np.isnan(values)] = default
+    return records
+
+
+def read_cursor(cursor, chunk_size=10000):
+    """Record array from an executed query selecting date, solar_energy, electric_energy,
+    temperature, humidity; rows are fetched in chunks so they never all exist as tuples"""
+    chunks = []
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        chunk = np.empty(len(rows), dtype=READING_DTYPE)
+        chunk['timestamp'] = parse_timestamps([row[0] for row in rows])
+        # None becomes NaN
+        values = np.array([(row[1], row[2], row[3], row[4]) for row in rows], dtype=float)
+        for i, column in enumerate(VALUE_COLUMNS):
+            chunk[column] = values[:, i]
+        chunks.append(chunk)
+    records = np.concatenate(chunks) if chunks else np.empty(0, dtype=READING_DTYPE)
+    return _fill_defaults(records)
+
+
+def as_readings(data):
+    """READING_DTYPE array from a record array, a pandas frame or a list of reading dicts"""
+    if isinstance(data, np.ndarray) and data.dtype == READING_DTYPE:
+        return data
+    if hasattr(data, 'columns'):
+        columns = {name: data[name].to_numpy() for name in data.columns}
+    elif isinstance(data, np.ndarray):
+        columns = {name: data[name] for name in data.dtype.names}
+    else:
+        data = list(data)
+        columns = {name: [row.get(name) for row in data] for name in ('date',) + VALUE_COLUMNS}
+
+    timestamps = columns['timestamp'] if 'timestamp' in columns else columns['date']
+    records = np.empty(len(timestamps), dtype=READING_DTYPE)
+    records['timestamp'] = parse_timestamps(timestamps)
+    for column in VALUE_COLUMNS:
+        if column in columns:
+            records[column] = np.array(columns[column], dtype=float)
+        else:
+            records[column] = np.nan
+    return _fill_defaults(records)
+
+
+def latest_entry(records):
+    """The last reading as a JSON-friendly dict, as the analytics cache stores it"""
+    row = records[-1]
+    entry = {'date': str(row['timestamp']).replace('T', ' ')}
+    entry.update((column, float(row[column])) for column in VALUE_COLUMNS)
+    return entry
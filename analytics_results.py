@@ -0,0 +1,74 @@
+"""Analytics precomputed ahead of time by precompute.py, one row per user.
+
+A row records the data version it was computed from and how the run went ('done',
+'timeout', 'failed' or 'empty'). /get_analytics serves a 'done' row while its version
+still matches the user's current one; precompute.py picks up every user whose row is
+missing or older than their data.
+"""
+import json
+from datetime import datetime
+
+from database import TIMESTAMP_FORMAT, execute_query
+
+
+def get(cursor, user_id, version):
+    """Return (analysis, latest_entry, row_count) of a finished run for this data version, or None"""
+    execute_query(cursor, '''
+        SELECT analysis, latest_entry, row_count FROM analytics_results
+        WHERE user_id = %s AND data_version = %s AND status = 'done'
+    ''', (user_id, version))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return json.loads(row[0]), json.loads(row[1]), row[2]
+
+
+def pending(cursor, retry_failed=False, user_ids=None, limit=None):
+    """[(user_id, data_version)] with data newer than their last run, most recently updated first"""
+    # Not data_version > 0: histories from before migration 5 are still at version 0
+    conditions = ['EXISTS (SELECT 1 FROM energy_data e WHERE e.user_id = u.id)', '(r.user_id IS NULL OR r.data_version <> u.data_version{0})'.format(
+        " OR r.status IN ('timeout', 'failed')" if retry_failed else ''
+    )]
+    params = []
+    if user_ids:
+        conditions.append(f"u.id IN ({', '.join(['%s'] * len(user_ids))})")
+        params.extend(user_ids)
+    query = f'''
+        SELECT u.id, u.data_version FROM users u
+        LEFT JOIN analytics_results r ON r.user_id = u.id
+        WHERE {' AND '.join(conditions)}
+        ORDER BY COALESCE(u.data_updated_at, '') DESC, u.id
+    '''
+    if limit:
+        query += ' LIMIT %s'
+        params.append(limit)
+    execute_query(cursor, query, tuple(params))
+    return [(row[0], row[1]) for row in cursor.fetchall()]
+
+
+def save(cursor, user_id, version, status, analysis=None, latest_entry=None, row_count=None,
+         stage_timings=None, error=None, seconds=None):
+    """Insert or replace the user's row; the caller commits"""
+    execute_query(cursor, '''
+        INSERT INTO analytics_results
+            (user_id, data_version, status, analysis, latest_entry, row_count, stage_timings, error,
+             seconds, computed_at)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ON CONFLICT (user_id) DO UPDATE SET
+            data_version = excluded.data_version,
+            status = excluded.status,
+            analysis = excluded.analysis,
+            latest_entry = excluded.latest_entry,
+            row_count = excluded.row_count,
+            stage_timings = excluded.stage_timings,
+            error = excluded.error,
+            seconds = excluded.seconds,
+            computed_at = excluded.computed_at
+    ''', (
+        user_id, version, status,
+        json.dumps(analysis) if analysis is not None else None,
+        json.dumps(latest_entry) if latest_entry is not None else None,
+        row_count,
+        json.dumps(stage_timings) if stage_timings is not None else None,
+        error, seconds, datetime.utcnow().strftime(TIMESTAMP_FORMAT)
+    ))
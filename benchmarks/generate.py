@@ -0,0 +1,113 @@
+"""Synthetic energy_data for benchmarks.
+
+Readings follow a diurnal solar curve scaled by season and daily cloud cover, a
+temperature cycle with humidity moving against it, and household load with
+morning/evening peaks, weekend shifts and cooling load on hot hours.
+
+    python -m benchmarks.generate --db bench.db --users 20 --hours 2160
+"""
+import argparse
+import sqlite3
+from datetime import datetime
+
+import numpy as np
+
+BENCH_PASSWORD = 'benchmark'
+
+
+def generate_readings(hours, start=datetime(2024, 1, 1), seed=0):
+    """Return a dict of numpy arrays (date, solar_energy, electric_energy, temperature, humidity)"""
+    rng = np.random.default_rng(seed)
+    timestamps = np.datetime64(start, 'h') + np.arange(hours)
+    hour = (timestamps.astype('datetime64[h]').astype(np.int64) % 24).astype(float)
+    day = timestamps.astype('datetime64[D]')
+    day_index = (day - day[0]).astype(np.int64)
+    weekday = ((day.astype(np.int64) + 3) % 7)  # 1970-01-01 was a Thursday
+    day_of_year = (day - day.astype('datetime64[Y]')).astype(np.int64)
+
+    # Season: 1 at the June solstice, -1 at the December one
+    season = np.cos(2 * np.pi * (day_of_year - 172) / 365.25)
+
+    temperature = (24 + 6 * season + 5 * np.sin(2 * np.pi * (hour - 9) / 24)
+                   + rng.normal(0, 1.2, hours))
+    humidity = np.clip(65 - 1.8 * (temperature - 24) + rng.normal(0, 5, hours), 15, 100)
+
+    daylight = np.clip(np.sin(np.pi * (hour - 6) / 12), 0, None)
+    cloud_cover = rng.uniform(0.3, 1.0, day_index.max() + 1)[day_index]
+    capacity = rng.uniform(2.5, 5.0)
+    solar = capacity * daylight * (0.8 + 0.2 * season) * cloud_cover
+
+    base_load = rng.uniform(0.3, 0.7)
+    morning = 0.9 * np.exp(-((hour - 7.5) ** 2) / 2)
+    evening = 1.4 * np.exp(-((hour - 19.5) ** 2) / 4)
+    weekend = np.where(weekday >= 5, 1.0 + 0.3 * daylight, 1.0)
+    cooling = 0.15 * np.clip(temperature - 26, 0, None)
+    electric = np.clip((base_load + morning + evening) * weekend + cooling + rng.normal(0, 0.1, hours), 0.05, None)
+
+    return {
+        'date': np.datetime_as_string(timestamps, unit='s'),
+        'solar_energy': np.round(solar, 4),
+        'electric_energy': np.round(electric, 4),
+        'temperature': np.round(temperature, 2),
+        'humidity': np.round(humidity, 2)
+    }
+
+
+def to_records(readings):
+    """Readings as the list of dicts the analytics engine and /add_energy_batch take"""
+    dates = [str(value).replace('T', ' ') for value in readings['date']]
+    columns = ['solar_energy', 'electric_energy', 'temperature', 'humidity']
+    values = zip(*(readings[column].tolist() for column in columns))
+    return [dict(zip(['date'] + columns, (date,) + row)) for date, row in zip(dates, values)]
+
+
+def write_sqlite(path, users, hours, seed=0):
+    """Create (or extend) a SQLite database with users x hours of readings.
+
+    Returns [(user_id, username)]; every user's password is BENCH_PASSWORD.
+    """
+    from werkzeug.security import generate_password_hash
+
+    import migrations
+    import rollups
+
+    conn = sqlite3.connect(path)
+    migrations.migrate(conn)
+    cursor = conn.cursor()
+    password = generate_password_hash(BENCH_PASSWORD)
+
+    created = []
+    for index in range(users):
+        username = f'bench_user_{seed}_{index}'
+        cursor.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, password))
+        user_id = cursor.lastrowid
+        readings = generate_readings(hours, seed=seed * 100003 + index)
+        cursor.executemany('''
+            INSERT INTO energy_data (user_id, date, solar_energy, electric_energy, temperature, humidity)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', ((user_id, record['date'], record['solar_energy'], record['electric_energy'],
+               record['temperature'], record['humidity']) for record in to_records(readings)))
+        cursor.execute("UPDATE users SET data_version = data_version + 1 WHERE id = ?", (user_id,))
+        created.append((user_id, username))
+
+    for user_id, _ in created:
+        rollups.rebuild(conn, user_id=user_id)
+    conn.commit()
+    conn.close()
+    return created
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write synthetic energy data into a SQLite database')
+    parser.add_argument('--db', default='bench.db')
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--hours', type=int, default=24 * 90)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    created = write_sqlite(args.db, args.users, args.hours, args.seed)
+    print(f"Wrote {len(created)} users x {args.hours} hourly readings to {args.db}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""Latency/accuracy trade-off of the pattern models on synthetic histories.
+
+    python -m benchmarks.models --hours 168,720,2160,8760 --models ridge,hist_gradient_boosting
+
+For each history length every model is fitted on the oldest 80% of the hours and
+scored on the newest 20%, reporting fit time, batch and single-row predict time,
+fitted size and holdout MAE/RMSE (kWh). Use it to choose PATTERN_MODEL.
+"""
+import argparse
+import json
+
+from benchmarks.generate import generate_readings, to_records
+
+
+def compare_models(hours_list=(168, 720, 2160), names=None, holdout=0.2, seed=0):
+    """Return {hours: [per-model report]} from analytics.models.evaluate_models"""
+    from analytics.energy_analytics import EnergyPatternAnalyzer
+    from analytics.models import evaluate_models
+
+    reports = {}
+    for hours in hours_list:
+        X, y = EnergyPatternAnalyzer().preprocess_data(to_records(generate_readings(hours, seed=seed)))
+        reports[hours] = evaluate_models(X, y, names=names, holdout=holdout)
+    return reports
+
+
+def print_report(reports):
+    print(f"{'hours':>6s} {'model':24s} {'fit ms':>9s} {'predict ms':>11s} {'1-row ms':>9s} "
+          f"{'size KB':>9s} {'MAE':>7s} {'RMSE':>7s}")
+    for hours, rows in reports.items():
+        for row in rows:
+            print(f"{hours:6d} {row['model']:24s} {row['fit_seconds'] * 1000:9.1f} "
+                  f"{row['predict_seconds'] * 1000:11.2f} {row['single_predict_seconds'] * 1000:9.2f} "
+                  f"{row['size_bytes'] / 1024:9.1f} {row['mae']:7.3f} {row['rmse']:7.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare pattern models')
+    parser.add_argument('--hours', default='168,720,2160')
+    parser.add_argument('--models', help='comma separated model names (default: all registered)')
+    parser.add_argument('--holdout', type=float, default=0.2)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the reports as JSON here')
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.models.split(',')] if args.models else None
+    reports = compare_models([int(hours) for hours in args.hours.split(',')], names, args.holdout, args.seed)
+    print_report(reports)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
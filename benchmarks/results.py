@@ -0,0 +1,72 @@
+"""Timing helpers and JSON result files shared by the benchmark suites."""
+import json
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime
+
+
+def measure(fn, repeat=5, setup=None):
+    """Run fn repeat times (calling setup before each run, untimed) and summarize wall time"""
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return summarize(timings)
+
+
+def summarize(timings):
+    return {
+        'median': statistics.median(timings),
+        'min': min(timings),
+        'max': max(timings),
+        'runs': len(timings)
+    }
+
+
+def write(path, results, settings):
+    document = {
+        'meta': {
+            'created_at': datetime.utcnow().isoformat(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'settings': settings
+        },
+        'results': results
+    }
+    with open(path, 'w') as f:
+        json.dump(document, f, indent=2, sort_keys=True)
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)['results']
+
+
+def compare(results, baseline, tolerance=0.25, min_delta=0.002):
+    """Return [(name, before, now, change)] for medians that slowed down beyond tolerance.
+
+    min_delta ignores sub-millisecond noise on very fast benchmarks.
+    """
+    regressions = []
+    for name, stats in sorted(results.items()):
+        if name not in baseline:
+            continue
+        before, now = baseline[name]['median'], stats['median']
+        if now > before * (1 + tolerance) and now - before > min_delta:
+            regressions.append((name, before, now, now / before - 1 if before else float('inf')))
+    return regressions
+
+
+def report(results, baseline=None):
+    for name, stats in sorted(results.items()):
+        line = f"{name:48s} {stats['median'] * 1000:10.2f} ms  (min {stats['min'] * 1000:.2f})"
+        if baseline and name in baseline:
+            before = baseline[name]['median']
+            if before:
+                line += f"  {(stats['median'] / before - 1) * 100:+6.1f}%"
+        print(line)
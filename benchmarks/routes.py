@@ -0,0 +1,102 @@
+"""Flask route timings through the test client against a generated SQLite database.
+
+main reads its configuration at import time, so this suite must run before anything
+else in the process imports main. Outbound calls go to a local stub server.
+"""
+import json
+import os
+import sys
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.generate import BENCH_PASSWORD, write_sqlite
+from benchmarks.results import measure
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """Stands in for Open-Meteo: a week of hourly radiation values"""
+
+    def do_GET(self):
+        body = json.dumps({'hourly': {'shortwave_radiation': [0.0] * 168}}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def bench_routes(users=3, hours=2160, repeat=5, seed=0):
+    """Return {'routes.<name>': timing summary} for the main read/write paths"""
+    if 'main' in sys.modules:
+        raise RuntimeError('benchmarks.routes must run before main is imported')
+
+    os.environ.pop('DATABASE_URL', None)
+    workdir = tempfile.mkdtemp(prefix='energy-bench-')
+    db_path = os.path.join(workdir, 'bench.db')
+    created = write_sqlite(db_path, users, hours, seed)
+
+    stub = ThreadingHTTPServer(('127.0.0.1', 0), _StubHandler)
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+
+    os.environ.update({
+        'SQLITE_PATH': db_path,
+        'ANALYTICS_WORKERS': '0',
+        'FORECAST_CACHE_DIR': os.path.join(workdir, 'forecast_cache'),
+        'MODEL_STORE': os.path.join(workdir, 'model_store'),
+        'READING_SNAPSHOTS': os.path.join(workdir, 'snapshots'),
+        'OPEN_METEO_URL': f'http://127.0.0.1:{stub.server_port}/v1/forecast',
+        'GEOIP_REMOTE_FALLBACK': '0'
+    })
+    import logging
+    logging.disable(logging.INFO)
+    import main
+
+    main.startup(keep_alive=False)
+    client = main.app.test_client()
+    _, username = created[0]
+    client.post('/login', json={'username': username, 'password': BENCH_PASSWORD})
+
+    etag = client.get('/get_energy_data').headers.get('ETag')
+    # New readings continue the generated hourly history
+    next_hour = iter(range(hours, 10 ** 9))
+
+    def clear_models():
+        main.analytics_cache.clear()
+        main.model_store.clear()
+        main.reading_snapshots.clear()
+
+    def add_energy():
+        timestamp = datetime(2024, 1, 1) + timedelta(hours=next(next_hour))
+        client.post('/add_energy', json={
+            'date': timestamp.isoformat(), 'solar_energy': 1.0, 'electric_energy': 2.0
+        })
+
+    routes = {
+        'index': (lambda: client.get('/'), repeat, None),
+        'login': (lambda: client.post('/login', json={'username': username, 'password': BENCH_PASSWORD}),
+                  repeat, None),
+        'dashboard': (lambda: client.get('/dashboard'), repeat, None),
+        'get_energy_data': (lambda: client.get('/get_energy_data'), repeat, None),
+        'get_energy_data_page': (lambda: client.get('/get_energy_data?limit=500'), repeat, None),
+        'get_energy_data_not_modified': (lambda: client.get('/get_energy_data', headers={'If-None-Match': etag}),
+                                         repeat, None),
+        'export_energy_data': (lambda: client.get('/export_energy_data'), repeat, None),
+        'compare': (lambda: client.get('/compare'), repeat, None),
+        'energy_tips': (lambda: client.get('/energy_tips'), repeat, None),
+        'solar_forecast': (lambda: client.get('/api/solar_forecast'), repeat, None),
+        'get_analytics_cold': (lambda: client.get('/get_analytics'), max(1, repeat // 2), clear_models),
+        'get_analytics_from_store': (lambda: client.get('/get_analytics'), repeat, main.analytics_cache.clear),
+        'get_analytics_cached': (lambda: client.get('/get_analytics'), repeat, None),
+        'add_energy': (add_energy, repeat, None),
+        'get_analytics_after_write': (lambda: client.get('/get_analytics'), max(1, repeat // 2), add_energy)
+    }
+    results = {}
+    for name, (fn, runs, setup) in routes.items():
+        results[f'routes.{name}'] = measure(fn, repeat=runs, setup=setup)
+    stub.shutdown()
+    return results
@@ -0,0 +1,71 @@
+"""Run benchmark suites, write JSON results and compare them with a baseline.
+
+    python -m benchmarks.run --suite stages,routes --hours 168,720,2160 --output results.json
+    python -m benchmarks.run --baseline results.json --tolerance 0.2
+
+Exits with status 1 when any benchmark's median regresses beyond the tolerance.
+"""
+import argparse
+import sys
+
+from benchmarks import results as result_files
+
+SUITES = ('stages', 'routes', 'startup')
+
+
+def run_suites(suites, args):
+    results = {}
+    # routes must import main itself, so it runs before anything else could
+    if 'routes' in suites:
+        from benchmarks.routes import bench_routes
+        results.update(bench_routes(users=args.users, hours=max(args.hours), repeat=args.repeat, seed=args.seed))
+    if 'stages' in suites:
+        from benchmarks.stages import bench_stages
+        results.update(bench_stages(args.hours, repeat=args.repeat, model_repeat=args.model_repeat, seed=args.seed))
+    if 'startup' in suites:
+        from benchmarks.startup import TIMINGS, run_once, summarize
+        summary = summarize([run_once() for _ in range(args.repeat)])
+        for key in TIMINGS:
+            results[f'startup.{key}'] = dict(summary[key], runs=args.repeat)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Energy tracker benchmarks')
+    parser.add_argument('--suite', default='stages,routes', help=f"comma separated: {', '.join(SUITES)}")
+    parser.add_argument('--hours', default='168,720,2160', help='history lengths for the stage benchmarks')
+    parser.add_argument('--users', type=int, default=3)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--model-repeat', type=int, default=2, help='repeats for model fits')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write results JSON here')
+    parser.add_argument('--baseline', help='results JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed fractional slowdown')
+    args = parser.parse_args()
+
+    suites = [suite.strip() for suite in args.suite.split(',') if suite.strip()]
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        parser.error(f"Unknown suite(s): {', '.join(sorted(unknown))}")
+    args.hours = [int(hours) for hours in args.hours.split(',')]
+
+    results = run_suites(suites, args)
+    baseline = result_files.load(args.baseline) if args.baseline else None
+    result_files.report(results, baseline)
+
+    if args.output:
+        result_files.write(args.output, results, {
+            'suites': suites, 'hours': args.hours, 'users': args.users,
+            'repeat': args.repeat, 'model_repeat': args.model_repeat, 'seed': args.seed
+        })
+
+    if baseline is not None:
+        regressions = result_files.compare(results, baseline, args.tolerance)
+        for name, before, now, change in regressions:
+            print(f"REGRESSION {name}: {before * 1000:.2f} ms -> {now * 1000:.2f} ms ({change * 100:+.1f}%)")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
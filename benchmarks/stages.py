@@ -0,0 +1,72 @@
+"""Per-stage timings of EnergyAnalyticsSystem.analyze_consumption across history lengths."""
+import numpy as np
+
+from benchmarks.generate import generate_readings, to_records
+from benchmarks.results import measure
+
+
+def bench_stages(hours_list=(168, 720, 2160), repeat=3, model_repeat=None, seed=0):
+    """Return {'stages.<stage>.<hours>h': timing summary}.
+
+    model_repeat (default: repeat) applies to the slow pattern model/ARIMA fits. Every
+    registered pattern model is timed as 'pattern_fit.<model>' and 'pattern_predict.<model>'.
+    """
+    from analytics.energy_analytics import (
+        CarbonCalculator, CostCalculator, EnergyAnalyticsSystem, EnergyPatternAnalyzer, EnergyPredictor
+    )
+    from analytics.forecasting import MAX_HORIZON, ProfileForecaster
+    from analytics.models import MODELS
+    from analytics.readings import as_readings, latest_entry
+
+    model_repeat = model_repeat or repeat
+    results = {}
+    for hours in hours_list:
+        readings = generate_readings(hours, seed=seed)
+        records = to_records(readings)
+        # The stages take the record array get_analytics builds from the cursor
+        data = as_readings(records)
+        latest = latest_entry(data)
+        system = EnergyAnalyticsSystem()
+        conditions = system.current_conditions(latest)
+
+        predictor = EnergyPredictor()
+        predictor.train_short_term(data)
+        previous = data[:-1]
+        carbon = CarbonCalculator()
+        cost = CostCalculator()
+
+        def fresh_update():
+            # A predictor fitted on all but the last hour, ready to append one reading
+            state['predictor'] = EnergyPredictor()
+            state['predictor'].train_short_term(previous)
+
+        state = {}
+        stages = {
+            'as_readings': (lambda: as_readings(records), repeat, None),
+            'preprocess': (lambda: EnergyPatternAnalyzer().preprocess_data(data), repeat, None),
+            'arima_fit': (lambda: EnergyPredictor().train_short_term(data), model_repeat, None),
+            'arima_update': (lambda: state['predictor'].update_short_term(data), model_repeat, fresh_update),
+            'arima_forecast_1h': (predictor.predict_next_hour, repeat, None),
+            'arima_forecast_24h': (predictor.predict_next_day, repeat, None),
+            'carbon': (lambda: carbon.footprint_breakdown(data), repeat, None),
+            'cost': (lambda: cost.optimize_schedule(data, breakdown=cost.cost_breakdown(data)), repeat, None),
+            'analyze_consumption': (lambda: EnergyAnalyticsSystem().analyze_consumption(data), model_repeat, None)
+        }
+        forecaster = ProfileForecaster()
+        electric = np.full(forecaster.history_hours, np.nan)
+        recent = readings['electric_energy'][-forecaster.history_hours:]
+        electric[-len(recent):] = recent
+        users = np.tile(electric, (100, 1))
+        stages['profile_forecast'] = (lambda: forecaster.forecast(electric[None, :]), repeat, None)
+        stages['profile_forecast_100_users'] = (lambda: forecaster.forecast(users), repeat, None)
+        stages['arima_forecast_interval'] = (lambda: predictor.forecast_interval(MAX_HORIZON), repeat, None)
+        for name in MODELS:
+            analyzer = EnergyPatternAnalyzer(name)
+            analyzer.train_model(data)
+            stages[f'pattern_fit.{name}'] = (lambda name=name: EnergyPatternAnalyzer(name).train_model(data),
+                                             model_repeat, None)
+            stages[f'pattern_predict.{name}'] = (lambda analyzer=analyzer: analyzer.predict_pattern(conditions),
+                                                 repeat, None)
+        for stage, (fn, runs, setup) in stages.items():
+            results[f'stages.{stage}.{hours}h'] = measure(fn, repeat=runs, setup=setup)
+    return results
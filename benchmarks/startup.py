@@ -0,0 +1,114 @@
+"""Measure worker boot cost: importing main, running startup() and the first requests.
+
+Each run happens in a fresh interpreter against a throwaway SQLite database:
+
+    python benchmarks/startup.py --runs 5 --output startup.json
+    python benchmarks/startup.py --baseline startup.json --tolerance 0.25
+
+With --baseline the script exits non-zero when a median timing regresses by more
+than the tolerance, or when a heavy module is imported by main again.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ['numpy', 'pandas', 'sklearn', 'statsmodels', 'scipy']
+
+CHILD = '''
+import json, sys, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+heavy = [name for name in %(heavy)r if name in sys.modules]
+main.startup(keep_alive=False)
+ready = time.perf_counter()
+client = main.app.test_client()
+client.get('/')
+first_request = time.perf_counter()
+client.post('/login', json={'username': 'benchmark', 'password': 'benchmark'})
+first_login = time.perf_counter()
+main.warm_up()
+warmed = time.perf_counter()
+print(json.dumps({
+    'import_seconds': imported - started,
+    'startup_seconds': ready - imported,
+    'first_request_seconds': first_request - ready,
+    'first_login_seconds': first_login - first_request,
+    'warm_up_seconds': warmed - first_login,
+    'heavy_modules_at_import': heavy
+}))
+'''
+
+TIMINGS = ['import_seconds', 'startup_seconds', 'first_request_seconds', 'first_login_seconds', 'warm_up_seconds']
+
+
+def run_once():
+    with tempfile.TemporaryDirectory() as workdir:
+        env = dict(os.environ, SQLITE_PATH=os.path.join(workdir, 'bench.db'),
+                   FORECAST_CACHE_DIR=os.path.join(workdir, 'forecast_cache'))
+        env.pop('DATABASE_URL', None)
+        env['PYTHONPATH'] = ROOT + os.pathsep + env.get('PYTHONPATH', '')
+        output = subprocess.run(
+            [sys.executable, '-c', CHILD % {'heavy': HEAVY_MODULES}],
+            cwd=workdir, env=env, capture_output=True, text=True, check=True
+        ).stdout
+        return json.loads(output.strip().splitlines()[-1])
+
+
+def summarize(runs):
+    summary = {}
+    for key in TIMINGS:
+        values = [run[key] for run in runs]
+        summary[key] = {'median': statistics.median(values), 'min': min(values), 'max': max(values)}
+    summary['heavy_modules_at_import'] = sorted({name for run in runs for name in run['heavy_modules_at_import']})
+    return summary
+
+
+def compare(summary, baseline, tolerance):
+    """Return a list of regression messages against a previous summary"""
+    problems = []
+    for key in TIMINGS:
+        if key not in baseline:
+            continue
+        before, now = baseline[key]['median'], summary[key]['median']
+        if now > before * (1 + tolerance):
+            problems.append(f"{key}: {now:.3f}s vs baseline {before:.3f}s")
+    new_heavy = set(summary['heavy_modules_at_import']) - set(baseline.get('heavy_modules_at_import', []))
+    if new_heavy:
+        problems.append(f"main now imports {', '.join(sorted(new_heavy))} at load time")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--output', help='write the summary as JSON')
+    parser.add_argument('--baseline', help='summary JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed fractional slowdown')
+    args = parser.parse_args()
+
+    summary = summarize([run_once() for _ in range(args.runs)])
+    for key in TIMINGS:
+        print(f"{key:24s} median {summary[key]['median']:.3f}s  (min {summary[key]['min']:.3f}s)")
+    print(f"{'heavy modules at import':24s} {', '.join(summary['heavy_modules_at_import']) or 'none'}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(summary, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = compare(summary, json.load(f), args.tolerance)
+        for problem in problems:
+            print(f"REGRESSION {problem}")
+        if problems:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+"""Concurrent analyses for many users, checked against sequential results.
+
+    python -m benchmarks.stress --users 8 --threads 8 --rounds 3 --hours 720
+    python -m benchmarks.stress --app --users 8 --threads 8
+
+The engine run fits every user's analysis once, sequentially, then has a thread pool
+run analyses for all users in parallel. The analyses start from the same shared
+predictors, and other tasks forecast and re-predict from the shared fitted systems at
+the same time. Every concurrent result must match the user's sequential result, and the
+shared predictors must come out unchanged.
+
+--app does the same through the Flask routes (one test client per thread, analytics
+computed inline). It compares each user's final /get_analytics with a fresh
+analysis of the data /get_energy_data returns. Exits with status 1 on any mismatch.
+"""
+import argparse
+import copy
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from benchmarks.generate import BENCH_PASSWORD, generate_readings, to_records, write_sqlite
+
+COMPARED = ('current_pattern', 'next_hour_prediction', 'carbon_footprint', 'energy_cost')
+
+
+def _mismatches(label, expected, actual, keys=COMPARED):
+    problems = []
+    for key in keys:
+        if not np.isclose(expected[key], actual[key], rtol=1e-6, atol=1e-9):
+            problems.append(f"{label}: {key} {actual[key]!r} != {expected[key]!r}")
+    return problems
+
+
+def _hour():
+    return datetime.now().strftime('%Y-%m-%d %H')
+
+
+def stress_engine(users=8, threads=8, rounds=3, hours=720, seed=0):
+    """Return (problems, timings) for concurrent engine calls"""
+    from analytics.energy_analytics import EnergyPredictor
+    from analytics.jobs import run_analysis
+
+    datasets = [to_records(generate_readings(hours, seed=seed * 100003 + index)) for index in range(users)]
+    # Predictors fitted on all but the last day, as a cached entry would hold them
+    shared = []
+    for data in datasets:
+        predictor = EnergyPredictor()
+        predictor.train_short_term(data[:-24])
+        shared.append(predictor)
+    shared_state = [copy.deepcopy(predictor.fit_state) for predictor in shared]
+
+    hour = _hour()
+    started = time.perf_counter()
+    sequential = [run_analysis(data, predictor) for data, predictor in zip(datasets, shared)]
+    sequential_seconds = time.perf_counter() - started
+    forecasts = [system.predictor.predict_next_day().to_numpy() for _, system in sequential]
+
+    def task(kind, user):
+        analysis, system = sequential[user]
+        if kind == 'analyze':
+            result, _ = run_analysis(datasets[user], shared[user])
+            return _mismatches(f'user {user} analyze', analysis, result)
+        if kind == 'forecast':
+            forecast = system.predictor.predict_next_day().to_numpy()
+            if not np.allclose(forecast, forecasts[user]):
+                return [f'user {user} forecast: shared predictor returned a different forecast']
+            return []
+        current = system.refresh_current_pattern(datasets[user][-1])
+        return _mismatches(f'user {user} refresh', analysis, {'current_pattern': current}, ('current_pattern',))
+
+    tasks = [(kind, user) for _ in range(rounds) for user in range(users)
+             for kind in ('analyze', 'forecast', 'refresh')]
+    random.Random(seed).shuffle(tasks)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(lambda args: task(*args), tasks))
+    concurrent_seconds = time.perf_counter() - started
+
+    problems = [problem for result in results for problem in result]
+    if _hour() != hour:
+        # The current-hour pattern legitimately changes when the hour rolls over
+        problems = [problem for problem in problems if 'current_pattern' not in problem]
+    for user, (predictor, state) in enumerate(zip(shared, shared_state)):
+        if predictor.fit_state != state:
+            problems.append(f'user {user}: shared predictor was modified')
+
+    analyses = rounds * users
+    return problems, {
+        'sequential_analyses_per_second': users / sequential_seconds,
+        'concurrent_analyses_per_second': analyses / concurrent_seconds,
+        'concurrent_tasks': len(tasks),
+        'concurrent_seconds': concurrent_seconds
+    }
+
+
+def stress_app(users=8, threads=8, rounds=3, hours=720, seed=0):
+    """Return (problems, timings) for concurrent /add_energy + /get_analytics traffic"""
+    if 'main' in sys.modules:
+        raise RuntimeError('the --app stress run must import main itself')
+
+    os.environ.pop('DATABASE_URL', None)
+    workdir = tempfile.mkdtemp(prefix='energy-stress-')
+    db_path = os.path.join(workdir, 'stress.db')
+    created = write_sqlite(db_path, users, hours, seed)
+    os.environ.update({
+        'SQLITE_PATH': db_path,
+        'ANALYTICS_WORKERS': '0',
+        'MODEL_STORE': os.path.join(workdir, 'model_store'),
+        'READING_SNAPSHOTS': os.path.join(workdir, 'snapshots'),
+        'FORECAST_CACHE_DIR': os.path.join(workdir, 'forecast_cache'),
+        'GEOIP_REMOTE_FALLBACK': '0'
+    })
+    import logging
+    logging.disable(logging.INFO)
+    import main
+    from analytics.jobs import run_analysis
+
+    main.startup(keep_alive=False)
+    problems = []
+    problems_lock = threading.Lock()
+    final = {}
+
+    def user_session(index):
+        user_id, username = created[index]
+        client = main.app.test_client()
+        client.post('/login', json={'username': username, 'password': BENCH_PASSWORD})
+        for step in range(rounds):
+            timestamp = datetime(2024, 1, 1) + timedelta(hours=hours + step)
+            client.post('/add_energy', json={
+                'date': timestamp.isoformat(), 'solar_energy': 1.0, 'electric_energy': 1.5 + index / 10
+            })
+            response = client.get('/get_analytics')
+            if response.status_code != 200 or response.json['stale']:
+                with problems_lock:
+                    problems.append(f'user {user_id}: unexpected analytics response {response.status_code}')
+        final[index] = (client.get('/get_analytics').json['analysis'], client.get('/get_energy_data').json['data'])
+
+    hour = _hour()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(user_session, range(users)))
+    concurrent_seconds = time.perf_counter() - started
+
+    # The incrementally updated ARIMA legitimately differs from a fresh fit
+    keys = ('current_pattern', 'carbon_footprint', 'energy_cost') if _hour() == hour else (
+        'carbon_footprint', 'energy_cost')
+    for index, (analysis, data) in final.items():
+        expected, _ = run_analysis(data)
+        problems.extend(_mismatches(f'user {created[index][0]}', expected, analysis, keys))
+
+    return problems, {
+        'requests': users * (rounds * 2 + 2),
+        'concurrent_seconds': concurrent_seconds,
+        'requests_per_second': users * (rounds * 2 + 2) / concurrent_seconds
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent analytics stress test')
+    parser.add_argument('--users', type=int, default=8)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--hours', type=int, default=720)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--app', action='store_true', help='go through the Flask routes')
+    args = parser.parse_args()
+
+    run = stress_app if args.app else stress_engine
+    problems, timings = run(args.users, args.threads, args.rounds, args.hours, args.seed)
+    for name, value in timings.items():
+        print(f"{name:36s} {value:10.2f}")
+    for problem in problems:
+        print(f"MISMATCH {problem}")
+    print('OK' if not problems else f'{len(problems)} mismatches')
+    if problems:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
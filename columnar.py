@@ -0,0 +1,69 @@
+"""Parquet and Arrow IPC files of a user's readings, for /export_energy_data and
+/import_energy_data.
+
+A file has one row per reading with the columns date (timestamp, seconds),
+solar_energy, electric_energy, temperature and humidity. pyarrow is imported on
+first use so the web process only loads it for exports and imports.
+"""
+import io
+
+FORMATS = {
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+    'arrow': ('application/vnd.apache.arrow.file', 'arrow')
+}
+PARQUET_MAGIC = b'PAR1'
+ARROW_MAGIC = b'ARROW1'
+
+
+def to_table(records):
+    """pyarrow Table from an analytics.readings record array"""
+    import pyarrow as pa
+
+    columns = {'date': pa.array(records['timestamp'])}
+    for name in records.dtype.names[1:]:
+        columns[name] = pa.array(records[name])
+    return pa.table(columns)
+
+
+def to_bytes(records, fmt='parquet'):
+    """Serialize a record array as a Parquet (zstd) or Arrow IPC file"""
+    import pyarrow.ipc as ipc
+    import pyarrow.parquet as pq
+
+    table = to_table(records)
+    buffer = io.BytesIO()
+    if fmt == 'parquet':
+        pq.write_table(table, buffer, compression='zstd')
+    elif fmt == 'arrow':
+        with ipc.new_file(buffer, table.schema, options=ipc.IpcWriteOptions(compression='zstd')) as writer:
+            writer.write_table(table)
+    else:
+        raise ValueError(f"Unknown format: {fmt}")
+    return buffer.getvalue()
+
+
+def read_frame(payload):
+    """DataFrame with a 'date' column from Parquet or Arrow IPC (file or stream) bytes.
+
+    Raises ValueError when the payload is neither.
+    """
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+    import pyarrow.parquet as pq
+
+    try:
+        if payload[:4] == PARQUET_MAGIC:
+            table = pq.read_table(io.BytesIO(payload))
+        elif payload[:6] == ARROW_MAGIC:
+            table = ipc.open_file(pa.BufferReader(payload)).read_all()
+        else:
+            table = ipc.open_stream(pa.BufferReader(payload)).read_all()
+    except (pa.ArrowInvalid, OSError) as e:
+        raise ValueError(f"Expected a Parquet or Arrow file: {str(e)}")
+
+    frame = table.to_pandas()
+    if 'date' not in frame.columns and 'timestamp' in frame.columns:
+        frame = frame.rename(columns={'timestamp': 'date'})
+    if 'date' not in frame.columns:
+        raise ValueError("The file has no 'date' column")
+    return frame
@@ -0,0 +1,35 @@
+"""Per-user data versions.
+
+users.data_version is advanced in the same transaction as every write to a user's
+energy_data, so (user, data_version) names the exact data a response was built from.
+It keys the analytics cache and the ETags of the read endpoints.
+"""
+import hashlib
+from datetime import datetime, timezone
+
+from database import TIMESTAMP_FORMAT, execute_query
+
+
+def bump(cursor, user_id):
+    """Advance the user's data version; call inside the transaction that writes their data"""
+    execute_query(cursor, '''
+        UPDATE users SET data_version = data_version + 1, data_updated_at = %s WHERE id = %s
+    ''', (datetime.utcnow().strftime(TIMESTAMP_FORMAT), user_id))
+
+
+def get(cursor, user_id):
+    """Return (version, last modified as an aware UTC datetime or None) for the user"""
+    execute_query(cursor, "SELECT data_version, data_updated_at FROM users WHERE id = %s", (user_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return 0, None
+    updated_at = None
+    if row[1]:
+        updated_at = datetime.strptime(row[1], TIMESTAMP_FORMAT).replace(tzinfo=timezone.utc)
+    return row[0] or 0, updated_at
+
+
+def make_etag(user_id, version, *parts):
+    """Strong ETag value for a representation of the user's data at a version"""
+    key = '|'.join(str(part) for part in (user_id, version) + parts)
+    return hashlib.sha1(key.encode()).hexdigest()
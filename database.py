@@ -0,0 +1,366 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+
+import psycopg2
+from flask import g, has_app_context
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class TimedCursor:
+    """Cursor proxy that records statement latency in db_query_duration_seconds"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        # Settings such as itersize belong on the real cursor
+        if name == '_cursor':
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._cursor, name, value)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def execute(self, query, params=None):
+        with metrics.db_query_duration.time(operation=metrics.statement_operation(query)):
+            if params is None:
+                return self._cursor.execute(query)
+            return self._cursor.execute(query, params)
+
+    def executemany(self, query, params):
+        with metrics.db_query_duration.time(operation=metrics.statement_operation(query)):
+            return self._cursor.executemany(query, params)
+
+    def copy_expert(self, sql, file, *args, **kwargs):
+        with metrics.db_query_duration.time(operation='COPY'):
+            return self._cursor.copy_expert(sql, file, *args, **kwargs)
+
+
+class PooledConnection:
+    """Connection handed out by a pool; close() returns it to the pool instead of closing it"""
+
+    def __init__(self, pool, conn, created_at):
+        self._pool = pool
+        self._conn = conn
+        self.created_at = created_at
+        self.last_used = time.time()
+        self.released = False
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    @property
+    def raw(self):
+        return self._conn
+
+    def cursor(self, *args, **kwargs):
+        return TimedCursor(self._conn.cursor(*args, **kwargs))
+
+    def close(self):
+        if not self.released:
+            self.released = True
+            self._pool.release(self)
+
+
+class PostgresPool:
+    """Thread-safe psycopg2 pool that blocks (up to timeout) when all connections are in use.
+
+    Idle connections are health-checked with SELECT 1 before reuse once they have been
+    idle longer than health_check_after, and are recycled after max_lifetime seconds.
+    """
+
+    def __init__(self, dsn_kwargs, max_size=10, timeout=10.0, max_lifetime=1800.0, health_check_after=30.0):
+        self.dsn_kwargs = dsn_kwargs
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.health_check_after = health_check_after
+        self._idle = deque()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self._stats = {
+            'checkouts': 0, 'created': 0, 'recycled': 0, 'failed_health_checks': 0,
+            'timeouts': 0, 'in_use': 0, 'wait_seconds_total': 0.0
+        }
+
+    def acquire(self):
+        started = time.time()
+        if not self._slots.acquire(timeout=self.timeout):
+            self._count('timeouts')
+            raise PoolTimeout(f"No database connection available within {self.timeout}s")
+        waited = time.time() - started
+
+        try:
+            conn = self._take_idle()
+            if conn is None:
+                conn = PooledConnection(self, psycopg2.connect(**self.dsn_kwargs), time.time())
+                self._count('created')
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._stats['checkouts'] += 1
+            self._stats['in_use'] += 1
+            self._stats['wait_seconds_total'] += waited
+        conn.released = False
+        return conn
+
+    def release(self, conn):
+        raw = conn.raw
+        try:
+            if not raw.closed:
+                raw.rollback()
+        except Exception:
+            pass
+
+        with self._lock:
+            self._stats['in_use'] -= 1
+            if raw.closed or time.time() - conn.created_at > self.max_lifetime:
+                self._stats['recycled'] += 1
+                self._discard(raw)
+            else:
+                conn.last_used = time.time()
+                self._idle.append(conn)
+        self._slots.release()
+
+    def close_all(self):
+        with self._lock:
+            while self._idle:
+                self._discard(self._idle.popleft().raw)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, idle=len(self._idle), max_size=self.max_size)
+
+    def _take_idle(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                # Most recently used first, so surplus connections age out
+                conn = self._idle.pop()
+            now = time.time()
+            if conn.raw.closed or now - conn.created_at > self.max_lifetime:
+                self._count('recycled')
+                self._discard(conn.raw)
+                continue
+            if now - conn.last_used > self.health_check_after and not self._healthy(conn.raw):
+                self._count('failed_health_checks')
+                self._discard(conn.raw)
+                continue
+            return conn
+
+    def _healthy(self, raw):
+        try:
+            cursor = raw.cursor()
+            cursor.execute('SELECT 1')
+            cursor.close()
+            raw.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+
+class SQLitePool:
+    """One reusable SQLite connection per thread, in WAL mode with tuned pragmas"""
+
+    PRAGMAS = (
+        'PRAGMA journal_mode=WAL',
+        'PRAGMA synchronous=NORMAL',
+        'PRAGMA busy_timeout=5000',
+        'PRAGMA temp_store=MEMORY',
+        'PRAGMA cache_size=-16000'
+    )
+
+    def __init__(self, path, max_lifetime=3600.0):
+        self.path = path
+        self.max_lifetime = max_lifetime
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stats = {'checkouts': 0, 'created': 0, 'recycled': 0, 'in_use': 0}
+
+    def acquire(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and time.time() - conn.created_at > self.max_lifetime:
+            conn.raw.close()
+            conn = None
+            self._count('recycled')
+        if conn is None:
+            raw = sqlite3.connect(self.path)
+            raw.row_factory = sqlite3.Row
+            for pragma in self.PRAGMAS:
+                raw.execute(pragma)
+            conn = PooledConnection(self, raw, time.time())
+            self._local.conn = conn
+            self._count('created')
+
+        with self._lock:
+            self._stats['checkouts'] += 1
+            self._stats['in_use'] += 1
+        conn.released = False
+        return conn
+
+    def release(self, conn):
+        # Leave the thread's connection clean for its next user
+        if conn.raw.in_transaction:
+            conn.raw.rollback()
+        with self._lock:
+            self._stats['in_use'] -= 1
+
+    def close_all(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.raw.close()
+            self._local.conn = None
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return this process's pool, creating it on first use (and again after a fork)"""
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = create_pool()
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def create_pool():
+    if os.environ.get('DATABASE_URL'):
+        # Production - PostgreSQL
+        result = urlparse(os.environ.get('DATABASE_URL'))
+        return PostgresPool(
+            {
+                'database': result.path[1:],
+                'user': result.username,
+                'password': result.password,
+                'host': result.hostname,
+                'port': result.port
+            },
+            max_size=int(os.environ.get('DB_POOL_SIZE', 10)),
+            timeout=float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+            max_lifetime=float(os.environ.get('DB_POOL_MAX_LIFETIME', 1800)),
+            health_check_after=float(os.environ.get('DB_POOL_HEALTH_CHECK_AFTER', 30))
+        )
+    # Development - SQLite
+    return SQLitePool(
+        os.environ.get('SQLITE_PATH', 'solar_energy.db'),
+        max_lifetime=float(os.environ.get('DB_POOL_MAX_LIFETIME', 3600))
+    )
+
+
+def get_db_connection():
+    """Check out a pooled connection; close() hands it back.
+
+    Connections taken inside a Flask request are also released at teardown, so an
+    error path that skips close() cannot leak a pool slot.
+    """
+    conn = get_pool().acquire()
+    if has_app_context():
+        g.setdefault('db_connections', []).append(conn)
+    return conn
+
+
+def release_request_connections(exception=None):
+    if has_app_context():
+        for conn in g.pop('db_connections', []):
+            conn.close()
+
+
+def check_database():
+    """Round-trip a trivial query; returns (ok, error message)"""
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT 1')
+        cursor.fetchone()
+        return True, None
+    except Exception as e:
+        logger.error(f"Database health check failed: {str(e)}")
+        return False, str(e)
+    finally:
+        if conn:
+            conn.close()
+
+
+def execute_query(cursor, query, params):
+    """Execute a query with the appropriate parameter style based on the database type."""
+    if os.environ.get('DATABASE_URL'):
+        # PostgreSQL style
+        return cursor.execute(query, params)
+    else:
+        # SQLite style - convert %s to ?
+        sqlite_query = query.replace('%s', '?')
+        return cursor.execute(sqlite_query, params)
+
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def normalize_timestamp(value, end_of_day=False):
+    """Convert an ISO date/datetime string (or datetime) to the stored 'YYYY-MM-DD HH:MM:SS' form.
+
+    Timezone-aware values are converted to UTC. A bare date maps to midnight, or to
+    23:59:59 with end_of_day so it can close an inclusive range. Raises ValueError
+    for unparseable input.
+    """
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        text = str(value).strip()
+        if text.endswith('Z'):
+            text = text[:-1] + '+00:00'
+        parsed = datetime.fromisoformat(text)
+        if end_of_day and len(text) == 10:
+            parsed = parsed.replace(hour=23, minute=59, second=59)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed.strftime(TIMESTAMP_FORMAT)
+
+
+def format_timestamp(value):
+    """Render a stored date (datetime on PostgreSQL, text on SQLite) for JSON responses"""
+    if isinstance(value, datetime):
+        return value.strftime(TIMESTAMP_FORMAT)
+    return value
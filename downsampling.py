@@ -0,0 +1,104 @@
+"""Downsampling of time series for charts.
+
+Each method reduces (x, series...) to at most max_points points, with x as
+seconds (or any increasing number):
+
+- lttb: Largest-Triangle-Three-Buckets, real points chosen to keep the visual
+  shape of each series.
+- minmax: the minimum and maximum of each series in equal time buckets, real
+  points that keep every peak and trough.
+- average: per-bucket averages in equal time buckets (weighted by the number of
+  readings a point stands for), synthetic points.
+
+lttb and minmax return indices into the input so callers can return whole
+readings; with several series the per-series selections are merged.
+"""
+import numpy as np
+
+METHODS = ('lttb', 'minmax', 'average')
+
+
+def time_buckets(x, count):
+    """Bucket number (0..count-1) of each x for count equal-width buckets over its range"""
+    x = np.asarray(x, dtype=float)
+    span = x[-1] - x[0]
+    if span <= 0:
+        return np.zeros(len(x), dtype=np.intp)
+    return np.minimum(((x - x[0]) * count / span).astype(np.intp), count - 1)
+
+
+def lttb(x, y, max_points):
+    """Indices of at most max_points points of y(x) chosen by Largest-Triangle-Three-Buckets"""
+    size = len(x)
+    if max_points >= size or size < 3:
+        return np.arange(size)
+    max_points = max(max_points, 3)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    # Points between the fixed first and last one, split into max_points - 2 buckets
+    edges = np.linspace(1, size - 1, max_points - 1).astype(np.intp)
+    starts, ends = edges[:-1], edges[1:]
+    # Each bucket is compared against the average point of the next one
+    sum_x = np.concatenate([[0.0], np.cumsum(x)])
+    sum_y = np.concatenate([[0.0], np.cumsum(y)])
+    widths = ends - starts
+    next_x = np.append(((sum_x[ends] - sum_x[starts]) / widths)[1:], x[-1])
+    next_y = np.append(((sum_y[ends] - sum_y[starts]) / widths)[1:], y[-1])
+
+    selected = np.empty(max_points, dtype=np.intp)
+    selected[0], selected[-1] = 0, size - 1
+    previous = 0
+    for i, (start, end) in enumerate(zip(starts, ends)):
+        px, py = x[previous], y[previous]
+        area = np.abs((px - next_x[i]) * (y[start:end] - py) - (px - x[start:end]) * (next_y[i] - py))
+        previous = start + int(np.argmax(area))
+        selected[i + 1] = previous
+    return selected
+
+
+def min_max(x, y, buckets):
+    """Indices of the minimum and maximum of y in each time bucket, plus the first and last point"""
+    size = len(x)
+    if size <= buckets * 2:
+        return np.arange(size)
+    bucket = time_buckets(x, buckets)
+    order = np.lexsort((np.asarray(y, dtype=float), bucket))
+    # In bucket order, then value order: the first of each run is the minimum, the last the maximum
+    boundaries = np.flatnonzero(np.diff(bucket[order])) + 1
+    first = np.concatenate([[0], boundaries])
+    last = np.concatenate([boundaries - 1, [size - 1]])
+    return np.unique(np.concatenate([[0, size - 1], order[first], order[last]]))
+
+
+def bucket_average(x, columns, max_points, weights=None):
+    """Average x and each column over max_points equal time buckets.
+
+    Returns (x, {name: values}, weights) for the non-empty buckets; weights (e.g.
+    reading counts) both weight the averages and are summed per bucket.
+    """
+    x = np.asarray(x, dtype=float)
+    weights = np.ones(len(x)) if weights is None else np.asarray(weights, dtype=float)
+    bucket = time_buckets(x, max_points)
+    totals = np.bincount(bucket, weights=weights, minlength=max_points)
+    present = totals > 0
+
+    def average(values):
+        sums = np.bincount(bucket, weights=np.asarray(values, dtype=float) * weights, minlength=max_points)
+        return sums[present] / totals[present]
+
+    return average(x), {name: average(values) for name, values in columns.items()}, totals[present]
+
+
+def select(x, columns, max_points, method='lttb'):
+    """Indices of the real points lttb or minmax keep for all columns together"""
+    if method == 'lttb':
+        share = max(3, max_points // max(1, len(columns)))
+        picks = [lttb(x, values, share) for values in columns.values()]
+    elif method == 'minmax':
+        # Two points per bucket and series, plus the shared first and last point
+        share = max(1, (max_points - 2) // (2 * max(1, len(columns))))
+        picks = [min_max(x, values, share) for values in columns.values()]
+    else:
+        raise ValueError(f"Unknown method: {method}")
+    return np.unique(np.concatenate(picks)) if picks else np.arange(len(x))
@@ -0,0 +1,188 @@
+"""Cache for the Open-Meteo solar forecast proxy.
+
+Forecasts are keyed by latitude/longitude snapped to a grid, so nearby users share
+one upstream request, and expire at the next upstream hourly update. Concurrent
+misses for the same cell wait on a single in-flight request, entries are mirrored
+to a directory so they survive worker restarts, and an expired entry is served
+(marked stale) when the upstream request fails.
+"""
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_URL = 'https://api.open-meteo.com/v1/forecast'
+
+
+class ForecastUnavailable(Exception):
+    pass
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.entry = None
+        self.error = None
+
+
+class ForecastCache:
+    def __init__(self, base_url=DEFAULT_URL, grid=0.1, cache_dir=None, timeout=10.0,
+                 refresh_offset=300, max_stale=86400, max_entries=1024, http=None):
+        self.base_url = base_url
+        # Anything with a requests-style get(), normally the shared http_client
+        self.http = http or requests
+        self.grid = grid
+        self.cache_dir = cache_dir
+        self.timeout = timeout
+        self.refresh_offset = refresh_offset
+        self.max_stale = max_stale
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'stale': 0, 'upstream_requests': 0, 'upstream_errors': 0}
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def cell(self, lat, lon):
+        """Snap a coordinate to the centre of its grid cell"""
+        return (round(round(lat / self.grid) * self.grid, 6),
+                round(round(lon / self.grid) * self.grid, 6))
+
+    def expires_after(self, fetched_at):
+        """Upstream refreshes hourly; keep an entry until shortly after the next update"""
+        return (int(fetched_at // 3600) + 1) * 3600 + self.refresh_offset
+
+    def get(self, lat, lon):
+        """Return (forecast, info) for a location, where info describes how it was served.
+
+        Raises ForecastUnavailable when upstream fails and nothing usable is cached.
+        """
+        key = self.cell(lat, lon)
+        now = time.time()
+        entry = self._lookup(key)
+        if entry is not None and entry['expires_at'] > now:
+            self._count('hits')
+            return entry['data'], self._info(key, entry, 'hit')
+
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if leader:
+            self._count('misses')
+            try:
+                flight.entry = self._refresh(key)
+            except Exception as e:
+                flight.error = e
+            finally:
+                with self._lock:
+                    del self._flights[key]
+                flight.done.set()
+        else:
+            # The leader always finishes: each attempt is bounded by the timeout, and the
+            # HTTP client's retries and backoff are finite. Waiting any less would fail
+            # requests whose forecast is about to arrive.
+            flight.done.wait()
+
+        if flight.entry is not None:
+            return flight.entry['data'], self._info(key, flight.entry, 'miss')
+
+        # Upstream failed: fall back to whatever we still have for the cell
+        entry = entry or self._lookup(key)
+        if entry is not None and now - entry['fetched_at'] <= self.max_stale:
+            self._count('stale')
+            return entry['data'], self._info(key, entry, 'stale')
+        raise ForecastUnavailable(str(flight.error))
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries))
+
+    def _refresh(self, key):
+        self._count('upstream_requests')
+        try:
+            response = self.http.get(self.base_url, params={
+                'latitude': key[0],
+                'longitude': key[1],
+                'hourly': 'shortwave_radiation'
+            }, timeout=self.timeout)
+            response.raise_for_status()
+            data = response.json()
+        except Exception:
+            self._count('upstream_errors')
+            raise
+
+        fetched_at = time.time()
+        entry = {'fetched_at': fetched_at, 'expires_at': self.expires_after(fetched_at), 'data': data}
+        self._store(key, entry)
+        return entry
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is None or entry['expires_at'] <= time.time():
+            # Another worker may already have refreshed the cell
+            stored = self._read_disk(key)
+            if stored is not None and (entry is None or stored['fetched_at'] > entry['fetched_at']):
+                entry = stored
+                self._remember(key, entry)
+        return entry
+
+    def _store(self, key, entry):
+        self._remember(key, entry)
+        self._write_disk(key, entry)
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f'{key[0]}_{key[1]}.json')
+
+    def _read_disk(self, key):
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._path(key)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_disk(self, key, entry):
+        if not self.cache_dir:
+            return
+        # Write then rename so other workers never read a partial file
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            logger.error(f"Forecast cache write error: {str(e)}")
+
+    def _info(self, key, entry, source):
+        return {
+            'cache': source,
+            'cell': {'latitude': key[0], 'longitude': key[1]},
+            'fetched_at': entry['fetched_at'],
+            'expires_at': entry['expires_at']
+        }
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
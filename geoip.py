@@ -0,0 +1,194 @@
+"""Offline IP geolocation.
+
+Loads a CSV of IP ranges (start_ip, end_ip, country, region, city, latitude,
+longitude; addresses dotted or as integers) into sorted arrays per address family
+and answers lookups with bisect. Results go through a small LRU cache. The remote
+ipinfo.io lookup is only used when enabled and the local index has no answer.
+"""
+import csv
+import ipaddress
+import logging
+import threading
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+COLUMN_ALIASES = {
+    'start_ip': ('start_ip', 'ip_start', 'start', 'range_start'),
+    'end_ip': ('end_ip', 'ip_end', 'end', 'range_end'),
+    'country': ('country', 'country_code'),
+    'region': ('region', 'stateprov', 'state'),
+    'city': ('city',),
+    'latitude': ('latitude', 'lat'),
+    'longitude': ('longitude', 'lon', 'lng')
+}
+
+
+def _parse_ip(value):
+    """Return (address family, integer value) for a dotted/colon or integer address"""
+    value = str(value).strip()
+    if value.isdigit():
+        number = int(value)
+        return (4 if number < 2 ** 32 else 6), number
+    address = ipaddress.ip_address(value)
+    return address.version, int(address)
+
+
+def _empty_tables():
+    # IPv6 numbers do not fit an array typecode, so that table keeps Python ints
+    return {4: _RangeTable('L'), 6: _RangeTable(None)}
+
+
+class _RangeTable:
+    """Sorted, non-overlapping ranges: starts/ends plus an index into the location list"""
+
+    def __init__(self, typecode):
+        self.starts = array(typecode) if typecode else []
+        self.ends = array(typecode) if typecode else []
+        self.locations = array('I')
+
+    def find(self, number):
+        i = bisect_right(self.starts, number) - 1
+        if i >= 0 and number <= self.ends[i]:
+            return self.locations[i]
+        return None
+
+    def __len__(self):
+        return len(self.starts)
+
+
+class GeoIPIndex:
+    def __init__(self, path=None, cache_size=4096, remote_fallback=False, remote_timeout=3.0, http=None):
+        self.cache_size = cache_size
+        self.remote_fallback = remote_fallback
+        self.remote_timeout = remote_timeout
+        self.http = http or requests
+        self._locations = []
+        self._tables = _empty_tables()
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        if path:
+            self.load(path)
+
+    def load(self, path):
+        """Build the index from a CSV of IP ranges; returns the number of ranges loaded"""
+        ranges = {4: [], 6: []}
+        locations = []
+        location_ids = {}
+        with open(path, newline='', encoding='utf-8') as f:
+            reader = csv.DictReader(f)
+            columns = self._resolve_columns(reader.fieldnames or [])
+            for record in reader:
+                try:
+                    version, first = _parse_ip(record[columns['start_ip']])
+                    _, last = _parse_ip(record[columns['end_ip']])
+                    location = (
+                        record.get(columns.get('city'), '') or '',
+                        record.get(columns.get('region'), '') or '',
+                        record.get(columns.get('country'), '') or '',
+                        float(record[columns['latitude']]) if record.get(columns.get('latitude')) else None,
+                        float(record[columns['longitude']]) if record.get(columns.get('longitude')) else None
+                    )
+                except (ValueError, KeyError):
+                    continue
+                if last < first:
+                    continue
+                if location not in location_ids:
+                    location_ids[location] = len(locations)
+                    locations.append(location)
+                ranges[version].append((first, last, location_ids[location]))
+
+        tables = _empty_tables()
+        for version, rows in ranges.items():
+            rows.sort()
+            table = tables[version]
+            for first, last, location_id in rows:
+                table.starts.append(first)
+                table.ends.append(last)
+                table.locations.append(location_id)
+
+        with self._lock:
+            self._locations = locations
+            self._tables = tables
+            self._cache.clear()
+        count = len(tables[4]) + len(tables[6])
+        logger.info(f"Loaded {count} IP ranges ({len(locations)} locations) from {path}")
+        return count
+
+    def lookup(self, ip):
+        """Return {'city', 'region', 'country', 'latitude', 'longitude'} for an address, or None"""
+        with self._lock:
+            if ip in self._cache:
+                self._cache.move_to_end(ip)
+                return self._cache[ip]
+
+        location = self._lookup_local(ip)
+        if location is None and self.remote_fallback:
+            location = remote_lookup(ip, self.remote_timeout, self.http)
+        if location is not None:
+            with self._lock:
+                self._cache[ip] = location
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return location
+
+    def __len__(self):
+        return len(self._tables[4]) + len(self._tables[6])
+
+    def _lookup_local(self, ip):
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return None
+        if address.version == 6 and address.ipv4_mapped is not None:
+            address = address.ipv4_mapped
+        location_id = self._tables[address.version].find(int(address))
+        if location_id is None:
+            return None
+        city, region, country, latitude, longitude = self._locations[location_id]
+        return {'city': city, 'region': region, 'country': country, 'latitude': latitude, 'longitude': longitude}
+
+    def _resolve_columns(self, fieldnames):
+        normalized = {name.strip().lower(): name for name in fieldnames}
+        columns = {}
+        for column, aliases in COLUMN_ALIASES.items():
+            for alias in aliases:
+                if alias in normalized:
+                    columns[column] = normalized[alias]
+                    break
+        missing = {'start_ip', 'end_ip'} - set(columns)
+        if missing:
+            raise ValueError(f"IP range CSV is missing columns: {', '.join(sorted(missing))}")
+        return columns
+
+
+def remote_lookup(ip, timeout=3.0, http=requests):
+    """Look an address up on ipinfo.io; loopback/private addresses use the server's public IP"""
+    try:
+        if ipaddress.ip_address(ip).is_private:
+            ip = http.get('https://api.ipify.org', timeout=timeout).text.strip()
+        response = http.get(f'https://ipinfo.io/{ip}/json', timeout=timeout)
+        if response.status_code != 200:
+            return None
+        data = response.json()
+    except Exception as e:
+        logger.error(f"Remote geolocation failed for {ip}: {str(e)}")
+        return None
+
+    latitude = longitude = None
+    if data.get('loc'):
+        try:
+            latitude, longitude = (float(part) for part in data['loc'].split(','))
+        except ValueError:
+            pass
+    return {
+        'city': data.get('city', ''),
+        'region': data.get('region', ''),
+        'country': data.get('country', ''),
+        'latitude': latitude,
+        'longitude': longitude
+    }
@@ -0,0 +1,28 @@
+"""Gunicorn settings and start-up hooks (gunicorn -c gunicorn.conf.py main:app).
+
+Migrations run once in the master before any worker forks. Importing main there is
+cheap because the analytics stack is loaded lazily; each worker then imports it in
+the background after it starts serving and loads the stored models of the most
+recently active users (MODEL_STORE_WARM_USERS), unless ANALYTICS_WARMUP=0. Background
+threads are only started in workers, never in the master that forks them.
+"""
+import os
+import threading
+
+# Threaded workers: the analytics engine and the shared caches are thread-safe (see
+# EnergyAnalyticsSystem and 'python -m benchmarks.stress'). Keep DB_POOL_SIZE at or
+# above the thread count so requests do not queue for connections.
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+
+
+def on_starting(server):
+    import main
+    main.startup(keep_alive=False)
+
+
+def post_worker_init(worker):
+    import main
+    main.start_keep_alive()
+    if os.environ.get('ANALYTICS_WARMUP', '1') != '0':
+        threading.Thread(target=main.warm_up, name='analytics-warmup', daemon=True).start()
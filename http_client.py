@@ -0,0 +1,247 @@
+"""Shared client for outbound HTTP calls.
+
+One keep-alive requests.Session per worker process, with per-host timeouts and
+concurrency limits, jittered retries for idempotent requests, a circuit breaker
+that fails fast while a host keeps failing, and latency/error counters per host.
+Hosts can be redirected to local stand-in servers with HTTP_HOST_OVERRIDES.
+"""
+import json
+import logging
+import os
+import random
+import threading
+import time
+from urllib.parse import urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {429, 502, 503, 504}
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+
+
+class CircuitOpenError(requests.RequestException):
+    pass
+
+
+class HostBusyError(requests.RequestException):
+    pass
+
+
+class HostPolicy:
+    def __init__(self, connect_timeout=3.05, read_timeout=10.0, max_concurrency=8, retries=2,
+                 backoff=0.25, failure_threshold=5, reset_after=30.0):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_concurrency = max_concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+
+    def replace(self, **settings):
+        policy = HostPolicy(**vars(self))
+        for name, value in settings.items():
+            if not hasattr(policy, name):
+                raise ValueError(f"Unknown HTTP host setting: {name}")
+            setattr(policy, name, value)
+        return policy
+
+
+class _Host:
+    """Concurrency slots, breaker state and counters for one host"""
+
+    def __init__(self, policy):
+        self.policy = policy
+        self.slots = threading.BoundedSemaphore(policy.max_concurrency)
+        self.lock = threading.Lock()
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.stats = {
+            'requests': 0, 'errors': 0, 'retries': 0, 'short_circuited': 0, 'busy': 0,
+            'latency_total': 0.0, 'latency_max': 0.0
+        }
+
+    def allow(self):
+        """Closed: allow. Open: reject until reset_after, then let one trial request through."""
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.time() - self.opened_at >= self.policy.reset_after and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True
+            self.stats['short_circuited'] += 1
+            return False
+
+    def record(self, ok, latency):
+        with self.lock:
+            self.stats['requests'] += 1
+            self.stats['latency_total'] += latency
+            self.stats['latency_max'] = max(self.stats['latency_max'], latency)
+            self.trial_in_flight = False
+            if ok:
+                self.consecutive_failures = 0
+                self.opened_at = None
+                return
+            self.stats['errors'] += 1
+            self.consecutive_failures += 1
+            if self.opened_at is not None or self.consecutive_failures >= self.policy.failure_threshold:
+                self.opened_at = time.time()
+
+    def reject_busy(self):
+        with self.lock:
+            self.stats['busy'] += 1
+            # A rejected half-open trial must not block the next one
+            self.trial_in_flight = False
+
+    def count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def snapshot(self):
+        with self.lock:
+            requests_made = self.stats['requests']
+            return dict(
+                self.stats,
+                state='closed' if self.opened_at is None else 'open',
+                latency_avg=self.stats['latency_total'] / requests_made if requests_made else None
+            )
+
+
+class HttpClient:
+    def __init__(self, default_policy=None, host_policies=None, host_overrides=None, pool_size=10):
+        self.default_policy = default_policy or HostPolicy()
+        self.host_policies = host_policies or {}
+        self.host_overrides = host_overrides or {}
+        self.pool_size = pool_size
+        self._hosts = {}
+        self._lock = threading.Lock()
+        self._session = None
+        self._session_pid = None
+
+    @property
+    def session(self):
+        """This process's keep-alive session, created on first use (and again after a fork)"""
+        with self._lock:
+            if self._session is None or self._session_pid != os.getpid():
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._session = session
+                self._session_pid = os.getpid()
+            return self._session
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def request(self, method, url, **kwargs):
+        """Send a request under the host's policy.
+
+        Raises CircuitOpenError while the host's breaker is open and HostBusyError when
+        no concurrency slot frees up in time; other failures raise the usual requests
+        exceptions. Responses with error statuses are returned, not raised.
+        """
+        # Policies and counters belong to the logical host, even when it is overridden
+        hostname = urlsplit(url).hostname or ''
+        url = self.resolve(url)
+        host = self._host(hostname)
+        policy = host.policy
+        kwargs.setdefault('timeout', (policy.connect_timeout, policy.read_timeout))
+        attempts = 1 + (policy.retries if method.upper() in IDEMPOTENT_METHODS else 0)
+
+        for attempt in range(attempts):
+            if not host.allow():
+                raise CircuitOpenError(f"Circuit open for {hostname}")
+            if not host.slots.acquire(timeout=policy.connect_timeout):
+                host.reject_busy()
+                raise HostBusyError(f"Too many concurrent requests to {hostname}")
+
+            started = time.time()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                host.record(False, time.time() - started)
+                metrics.external_request_duration.observe(time.time() - started, host=hostname, outcome='error')
+                if attempt + 1 >= attempts:
+                    raise
+                logger.warning(f"{method} {hostname} failed ({type(e).__name__}), retrying")
+            else:
+                failed = response.status_code >= 500 or response.status_code == 429
+                host.record(not failed, time.time() - started)
+                metrics.external_request_duration.observe(
+                    time.time() - started, host=hostname, outcome=f'{response.status_code // 100}xx'
+                )
+                if response.status_code not in RETRY_STATUSES or attempt + 1 >= attempts:
+                    return response
+                response.close()
+            finally:
+                host.slots.release()
+
+            host.count('retries')
+            # Full jitter keeps retries from many workers from arriving in lockstep
+            time.sleep(random.uniform(0, policy.backoff * (2 ** attempt)))
+
+    def resolve(self, url):
+        """Apply HTTP_HOST_OVERRIDES, e.g. ipinfo.io -> http://127.0.0.1:9001"""
+        parts = urlsplit(url)
+        target = self.host_overrides.get(parts.hostname)
+        if not target:
+            return url
+        override = urlsplit(target if '://' in target else f'{parts.scheme}://{target}')
+        path = override.path.rstrip('/') + parts.path
+        return urlunsplit((override.scheme, override.netloc, path, parts.query, parts.fragment))
+
+    def stats(self):
+        with self._lock:
+            hosts = dict(self._hosts)
+        return {hostname: host.snapshot() for hostname, host in hosts.items()}
+
+    def _host(self, hostname):
+        with self._lock:
+            host = self._hosts.get(hostname)
+            if host is None:
+                policy = self.host_policies.get(hostname, self.default_policy)
+                host = self._hosts[hostname] = _Host(policy)
+            return host
+
+
+def _parse_overrides(value):
+    """'host=url,host2=url2' -> {'host': 'url', ...}"""
+    overrides = {}
+    for item in (value or '').split(','):
+        if '=' in item:
+            host, target = item.split('=', 1)
+            overrides[host.strip()] = target.strip()
+    return overrides
+
+
+def create_client(host_settings=None):
+    """Build a client from the environment.
+
+    host_settings maps hostnames to HostPolicy overrides; HTTP_HOST_SETTINGS (a JSON
+    object of the same shape) is applied on top.
+    """
+    default_policy = HostPolicy(
+        connect_timeout=float(os.environ.get('HTTP_CONNECT_TIMEOUT', 3.05)),
+        read_timeout=float(os.environ.get('HTTP_READ_TIMEOUT', 10)),
+        max_concurrency=int(os.environ.get('HTTP_MAX_CONCURRENCY', 8)),
+        retries=int(os.environ.get('HTTP_RETRIES', 2)),
+        backoff=float(os.environ.get('HTTP_RETRY_BACKOFF', 0.25)),
+        failure_threshold=int(os.environ.get('HTTP_BREAKER_THRESHOLD', 5)),
+        reset_after=float(os.environ.get('HTTP_BREAKER_RESET', 30))
+    )
+    settings = dict(host_settings or {})
+    for hostname, overrides in json.loads(os.environ.get('HTTP_HOST_SETTINGS') or '{}').items():
+        settings[hostname] = dict(settings.get(hostname, {}), **overrides)
+    return HttpClient(
+        default_policy=default_policy,
+        host_policies={hostname: default_policy.replace(**overrides) for hostname, overrides in settings.items()},
+        host_overrides=_parse_overrides(os.environ.get('HTTP_HOST_OVERRIDES')),
+        pool_size=int(os.environ.get('HTTP_POOL_SIZE', 10))
+    )
@@ -0,0 +1,216 @@
+"""Bulk ingestion of energy readings from JSON arrays and streamed CSV/NDJSON uploads.
+
+Records are consumed in chunks: each chunk is validated column-wise with pandas,
+valid rows are written with one executemany (SQLite) or COPY (PostgreSQL) and
+folded into the rollups in the same transaction, and invalid rows are reported
+back with their 1-based row number. Columnar imports (Parquet/Arrow, see columnar.py)
+arrive as one frame and are written in a single transaction by ingest_frame.
+"""
+import csv
+import io
+import json
+import os
+import time
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+
+import data_versions
+import rollups
+from database import TIMESTAMP_FORMAT, execute_query
+
+COLUMNS = ['date', 'solar_energy', 'electric_energy', 'temperature', 'humidity']
+NUMERIC_COLUMNS = ['solar_energy', 'electric_energy', 'temperature', 'humidity']
+REQUIRED_COLUMNS = ['date', 'solar_energy', 'electric_energy']
+DEFAULTS = {'temperature': 25.0, 'humidity': 60.0}
+
+
+def iter_csv(stream):
+    for record in csv.DictReader(stream):
+        yield record
+
+
+def iter_ndjson(stream):
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None
+
+
+def records_from_request(request):
+    """Return an iterator of raw records from a JSON, CSV, NDJSON or multipart upload.
+
+    Raises ValueError when the body is not in a supported format.
+    """
+    upload = request.files.get('file')
+    if upload is not None:
+        name = (upload.filename or '').lower()
+        kind = 'csv' if name.endswith('.csv') or 'csv' in (upload.mimetype or '') else 'ndjson'
+        stream = io.TextIOWrapper(upload.stream, encoding='utf-8', newline='')
+        return iter_csv(stream) if kind == 'csv' else iter_ndjson(stream)
+
+    content_type = (request.content_type or '').lower()
+    if 'csv' in content_type:
+        return iter_csv(io.TextIOWrapper(request.stream, encoding='utf-8', newline=''))
+    if 'ndjson' in content_type or 'jsonl' in content_type:
+        return iter_ndjson(io.TextIOWrapper(request.stream, encoding='utf-8'))
+
+    body = request.get_json(silent=True)
+    if isinstance(body, dict):
+        body = body.get('readings')
+    if not isinstance(body, list):
+        raise ValueError('Expected a JSON array of readings, a CSV or an NDJSON upload')
+    return iter(body)
+
+
+def validate_chunk(records, first_row):
+    """Validate a chunk of raw records column-wise.
+
+    Returns (valid, errors): a DataFrame of normalized rows ready to insert and a list
+    of {'row', 'error'} dicts for rejected records.
+    """
+    is_object = np.array([isinstance(record, dict) for record in records], dtype=bool)
+    frame = pd.DataFrame.from_records(
+        [record if isinstance(record, dict) else {} for record in records],
+        columns=COLUMNS
+    )
+    return validate_frame(frame, first_row, is_object)
+
+
+def validate_frame(frame, first_row, is_object=None):
+    """validate_chunk for a DataFrame with the COLUMNS columns"""
+    if is_object is None:
+        is_object = np.ones(len(frame), dtype=bool)
+    blank = frame.isna() | frame.apply(lambda column: column.astype(str).str.strip() == '')
+
+    numbers = {}
+    for column in NUMERIC_COLUMNS:
+        values = pd.to_numeric(frame[column], errors='coerce')
+        if column in DEFAULTS:
+            values = values.where(~blank[column], DEFAULTS[column])
+        numbers[column] = values.to_numpy(dtype=float)
+
+    # Timezone-aware values are converted to UTC; naive ones are kept as they are
+    if pd.api.types.is_datetime64_any_dtype(frame['date']):
+        dates = frame['date'].dt.tz_convert('UTC') if frame['date'].dt.tz is not None else frame['date']
+        dates = dates.dt.tz_localize(None)
+    else:
+        dates = pd.to_datetime(frame['date'].astype(str), format='ISO8601', errors='coerce', utc=True)
+        dates = dates.dt.tz_localize(None)
+
+    missing = blank[REQUIRED_COLUMNS].to_numpy().any(axis=1)
+    bad_numbers = ~np.isfinite(np.column_stack([numbers[column] for column in NUMERIC_COLUMNS])).all(axis=1)
+    bad_date = dates.isna().to_numpy()
+
+    reasons = [
+        (~is_object, 'Invalid record'),
+        (missing, 'Missing required fields'),
+        (bad_numbers, 'Invalid numeric values'),
+        (bad_date, 'Invalid date')
+    ]
+    rejected = np.zeros(len(frame), dtype=bool)
+    errors = []
+    for mask, message in reasons:
+        new = mask & ~rejected
+        errors.extend({'row': int(first_row + i), 'error': message} for i in np.flatnonzero(new))
+        rejected |= new
+    errors.sort(key=lambda error: error['row'])
+
+    valid = pd.DataFrame({'date': dates.dt.strftime(TIMESTAMP_FORMAT)})
+    for column in NUMERIC_COLUMNS:
+        valid[column] = numbers[column]
+    return valid[~rejected], errors
+
+
+def insert_rows(cursor, user_id, rows):
+    """Write validated rows: COPY on PostgreSQL, executemany on SQLite"""
+    if os.environ.get('DATABASE_URL'):
+        buffer = io.StringIO()
+        rows.assign(user_id=user_id)[['user_id'] + COLUMNS].to_csv(buffer, index=False, header=False)
+        buffer.seek(0)
+        cursor.copy_expert(
+            'COPY energy_data (user_id, date, solar_energy, electric_energy, temperature, humidity) '
+            'FROM STDIN WITH (FORMAT csv)',
+            buffer
+        )
+    else:
+        cursor.executemany('''
+            INSERT INTO energy_data (user_id, date, solar_energy, electric_energy, temperature, humidity)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', ((user_id,) + tuple(row) for row in rows.itertuples(index=False, name=None)))
+
+
+def ingest_records(conn, user_id, records, chunk_size=10000, max_errors=1000):
+    """Validate and insert records chunk by chunk, committing once per chunk"""
+    started = time.time()
+    cursor = conn.cursor()
+    inserted = rejected = 0
+    errors = []
+    first_row = 1
+    records = iter(records)
+
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            break
+        valid, chunk_errors = validate_chunk(chunk, first_row)
+        first_row += len(chunk)
+
+        if len(valid):
+            try:
+                insert_rows(cursor, user_id, valid)
+                rollups.record_frame(cursor, user_id, valid)
+                data_versions.bump(cursor, user_id)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            inserted += len(valid)
+
+        rejected += len(chunk_errors)
+        errors.extend(chunk_errors[:max(0, max_errors - len(errors))])
+
+    return _summary(started, inserted, rejected, errors)
+
+
+def ingest_frame(conn, user_id, frame, max_errors=1000, replace=False):
+    """Validate and insert a whole frame of readings in one transaction.
+
+    With replace the user's existing readings (and rollups) are deleted first, so a
+    failed import leaves the old history in place.
+    """
+    started = time.time()
+    cursor = conn.cursor()
+    frame = frame.reindex(columns=COLUMNS).reset_index(drop=True)
+    valid, errors = validate_frame(frame, 1)
+    try:
+        if replace:
+            execute_query(cursor, "DELETE FROM energy_data WHERE user_id = %s", (user_id,))
+            rollups.clear(cursor, user_id)
+        if len(valid):
+            insert_rows(cursor, user_id, valid)
+            rollups.record_frame(cursor, user_id, valid)
+        if replace or len(valid):
+            data_versions.bump(cursor, user_id)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return _summary(started, len(valid), len(errors), errors[:max_errors])
+
+
+def _summary(started, inserted, rejected, errors):
+    elapsed = time.time() - started
+    return {
+        'inserted': inserted,
+        'rejected': rejected,
+        'errors': errors,
+        'errors_truncated': rejected > len(errors),
+        'seconds': round(elapsed, 3),
+        'rows_per_second': round((inserted + rejected) / elapsed, 1) if elapsed > 0 else None
+    }
@@ -1,15 +1,30 @@
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify
-import sqlite3
+from flask import Flask, render_template, request, redirect, url_for, session, jsonify, Response, stream_with_context, g
 from werkzeug.security import generate_password_hash, check_password_hash
 import os
 from datetime import datetime, timedelta
-import requests  # ✅ Added for API calls
 import json
-from analytics.energy_analytics import EnergyAnalyticsSystem
-import psycopg2
-from urllib.parse import urlparse
+import base64
+import uuid
+from analytics.cache import AnalyticsCache, ResultCache
+from analytics.jobs import AnalyticsJobQueue, run_analysis
+from analytics.model_store import create_store
+from forecast_cache import ForecastCache, ForecastUnavailable
+from geoip import GeoIPIndex
+from http_client import create_client
+from profiler import SlowRequestProfiler
+import metrics
+from database import (
+    get_db_connection, execute_query, get_pool, check_database, release_request_connections,
+    normalize_timestamp, format_timestamp, TIMESTAMP_FORMAT
+)
+import migrations
+import rollups
+import data_versions
+import analytics_results
+from snapshots import create_snapshot_store
 from flask_cors import CORS  # Add this import
 import logging
+import click
 import threading
 import time
 
@@ -29,121 +44,110 @@ CORS(app, resources={
     }
 })
 
+# Return any pooled connections a request did not close itself
+app.teardown_appcontext(release_request_connections)
+
+# Shared outbound HTTP client (HTTP_HOST_OVERRIDES redirects hosts to local stand-ins)
+http_client = create_client({
+    'api.open-meteo.com': {'read_timeout': 10.0, 'max_concurrency': 4},
+    'ipinfo.io': {'read_timeout': 3.0, 'max_concurrency': 4, 'retries': 1},
+    'api.ipify.org': {'read_timeout': 3.0, 'max_concurrency': 4, 'retries': 1},
+    'smart-energy-tracker.onrender.com': {'retries': 0}
+})
+
+# Sample stacks of requests slower than PROFILE_SLOW_REQUESTS seconds (disabled when unset)
+slow_request_profiler = None
+if os.environ.get('PROFILE_SLOW_REQUESTS'):
+    slow_request_profiler = SlowRequestProfiler(
+        threshold=float(os.environ['PROFILE_SLOW_REQUESTS']),
+        interval=float(os.environ.get('PROFILE_INTERVAL', 0.005)),
+        output_dir=os.environ.get('PROFILE_DIR', 'profiles')
+    )
+
+@app.before_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    metrics.http_in_flight.inc()
+    if slow_request_profiler:
+        slow_request_profiler.start()
+
+@app.after_request
+def remember_status(response):
+    g.response_status = response.status_code
+    return response
+
+@app.teardown_request
+def record_request_metrics(exception=None):
+    started = g.pop('request_started', None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    status = 500 if exception is not None else g.pop('response_status', 500)
+    metrics.http_in_flight.dec()
+    metrics.http_requests.inc(route=route, method=request.method, status=status)
+    metrics.http_request_duration.observe(elapsed, route=route, method=request.method)
+    if slow_request_profiler:
+        slow_request_profiler.stop(f'{request.method} {route}', elapsed)
+
+# Prometheus metrics for this worker (set METRICS_TOKEN to require a bearer token)
+@app.route('/metrics')
+def metrics_endpoint():
+    token = os.environ.get('METRICS_TOKEN')
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return jsonify({'status': 'fail', 'message': 'Unauthorized'}), 401
+
+    pool_stats = get_pool().stats()
+    for state in ('in_use', 'idle'):
+        if state in pool_stats:
+            metrics.db_pool.set(pool_stats[state], state=state)
+    cache_stats = analytics_cache.stats()
+    metrics.analytics_cache_entries.set(cache_stats['entries'])
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
 # Keep-alive endpoint
 @app.route('/keep-alive')
 def keep_alive():
     return jsonify({'status': 'alive'})
 
+# Health check with database pool metrics
+@app.route('/health')
+def health():
+    ok, error = check_database()
+    return jsonify({
+        'status': 'ok' if ok else 'fail',
+        'database': {'ok': ok, 'error': error, 'pool': get_pool().stats()},
+        'http': http_client.stats()
+    }), 200 if ok else 503
+
 # Background task to keep the app alive
 def keep_alive_task():
     while True:
         try:
             # Ping the app every 5 minutes
-            requests.get('https://smart-energy-tracker.onrender.com/keep-alive')
+            http_client.get('https://smart-energy-tracker.onrender.com/keep-alive')
             logger.info("Keep-alive ping sent")
         except Exception as e:
             logger.error(f"Keep-alive ping failed: {str(e)}")
         time.sleep(300)  # Sleep for 5 minutes
 
-# Start the keep-alive task in a separate thread
-if os.environ.get('RENDER'):
-    keep_alive_thread = threading.Thread(target=keep_alive_task)
-    keep_alive_thread.daemon = True
-    keep_alive_thread.start()
+keep_alive_thread = None
 
-# Database configuration
-def get_db_connection():
-    if os.environ.get('DATABASE_URL'):
-        # Production - PostgreSQL
-        result = urlparse(os.environ.get('DATABASE_URL'))
-        username = result.username
-        password = result.password
-        database = result.path[1:]
-        hostname = result.hostname
-        port = result.port
-        
-        conn = psycopg2.connect(
-            database=database,
-            user=username,
-            password=password,
-            host=hostname,
-            port=port
-        )
-    else:
-        # Development - SQLite
-        conn = sqlite3.connect('solar_energy.db')
-        conn.row_factory = sqlite3.Row
-    return conn
-
-def execute_query(cursor, query, params):
-    """Execute a query with the appropriate parameter style based on the database type."""
-    if os.environ.get('DATABASE_URL'):
-        # PostgreSQL style
-        return cursor.execute(query, params)
-    else:
-        # SQLite style - convert %s to ?
-        sqlite_query = query.replace('%s', '?')
-        return cursor.execute(sqlite_query, params)
+def start_keep_alive():
+    """Start the keep-alive task in a separate thread (only on Render, and only once)"""
+    global keep_alive_thread
+    if os.environ.get('RENDER') and keep_alive_thread is None:
+        keep_alive_thread = threading.Thread(target=keep_alive_task)
+        keep_alive_thread.daemon = True
+        keep_alive_thread.start()
 
 # Database Setup
 def init_db():
+    conn = None
     try:
         conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        if os.environ.get('DATABASE_URL'):
-            # PostgreSQL tables
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS users (
-                    id SERIAL PRIMARY KEY,
-                    username TEXT NOT NULL UNIQUE,
-                    password TEXT NOT NULL
-                )
-            ''')
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS energy_data (
-                    id SERIAL PRIMARY KEY,
-                    user_id INTEGER REFERENCES users(id),
-                    date TEXT,
-                    solar_energy REAL,
-                    electric_energy REAL,
-                    temperature REAL,
-                    humidity REAL
-                )
-            ''')
-        else:
-            # SQLite tables
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS users (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    username TEXT NOT NULL UNIQUE,
-                    password TEXT NOT NULL
-                )
-            ''')
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS energy_data (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER,
-                    date TEXT,
-                    solar_energy REAL,
-                    electric_energy REAL,
-                    temperature REAL,
-                    humidity REAL,
-                    FOREIGN KEY (user_id) REFERENCES users (id)
-                )
-            ''')
-            
-            # Check if temperature and humidity columns exist
-            cursor.execute("PRAGMA table_info(energy_data)")
-            columns = [column[1] for column in cursor.fetchall()]
-            
-            if 'temperature' not in columns:
-                cursor.execute("ALTER TABLE energy_data ADD COLUMN temperature REAL DEFAULT 25")
-            if 'humidity' not in columns:
-                cursor.execute("ALTER TABLE energy_data ADD COLUMN humidity REAL DEFAULT 60")
-        
-        conn.commit()
-        logger.info("Database tables initialized successfully")
+        applied = migrations.migrate(conn)
+        logger.info(f"Database schema up to date (applied migrations: {applied or 'none'})")
         
     except Exception as e:
         logger.error(f"Error initializing database: {str(e)}")
@@ -152,11 +156,249 @@ def init_db():
         if conn:
             conn.close()
 
-# Initialize analytics system
-analytics_system = EnergyAnalyticsSystem()
+# Cache of fitted analytics models and results per user
+analytics_cache = AnalyticsCache(
+    max_entries=int(os.environ.get('ANALYTICS_CACHE_SIZE', 128)),
+    max_rows=int(os.environ.get('ANALYTICS_CACHE_MAX_ROWS', 2000000))
+)
+
+# Fitted models shared by workers and restarts: a directory (default), 'db', or '' to disable
+model_store = create_store(
+    os.environ.get('MODEL_STORE', 'model_store'),
+    connect=get_db_connection,
+    keep=int(os.environ.get('MODEL_STORE_KEEP', 2)),
+    mmap=os.environ.get('MODEL_STORE_MMAP', '1') != '0'
+)
+
+# Memory-mapped per-user copies of energy_data for analytics: a directory, or '' to disable
+reading_snapshots = create_snapshot_store(
+    os.environ.get('READING_SNAPSHOTS', 'snapshots'),
+    chunk_size=int(os.environ.get('READING_SNAPSHOT_CHUNK_SIZE', 10000))
+)
+
+def load_stored_analysis(user_id, fingerprint):
+    """Put a stored artifact for this data version into the cache instead of refitting"""
+    if model_store is None:
+        return None
+    stored = model_store.load(user_id, fingerprint)
+    if stored is None:
+        return None
+    # The artifact may have been saved in an earlier hour
+    analysis = dict(stored.analysis, current_pattern=stored.system.refresh_current_pattern(stored.latest_entry))
+    return analytics_cache.put(user_id, fingerprint, stored.system, analysis, stored.latest_entry, stored.row_count)
+
+def load_precomputed_analysis(cursor, user_id, fingerprint):
+    """Put the precompute.py result for this data version into the cache, if there is one"""
+    result = analytics_results.get(cursor, user_id, fingerprint)
+    if result is None:
+        return None
+    analysis, latest_entry, row_count = result
+    # The stored model, when there is one, keeps the hourly pattern refresh working
+    stored = model_store.load(user_id, fingerprint) if model_store is not None else None
+    system = stored.system if stored is not None else None
+    if system is not None:
+        analysis = dict(analysis, current_pattern=system.refresh_current_pattern(latest_entry))
+    return analytics_cache.put(user_id, fingerprint, system, analysis, latest_entry, row_count)
+
+def fetch_analysis_data(cursor, user_id, version=None):
+    """The user's readings, oldest first, as the record array the analytics engine takes.
+
+    Read from the user's snapshot (appending readings added since) when snapshots are
+    enabled; version is the data version the caller read, which lets an up-to-date
+    snapshot skip the database.
+    """
+    if reading_snapshots is not None:
+        try:
+            return reading_snapshots.readings(cursor, user_id, version)
+        except Exception as e:
+            logger.error(f"Snapshot read error for user {user_id}: {str(e)}")
+    # Deferred so numpy is only loaded once analytics is used
+    from analytics.readings import read_cursor
+    execute_query(cursor, '''
+        SELECT date, solar_energy, electric_energy, temperature, humidity
+        FROM energy_data
+        WHERE user_id = %s
+        ORDER BY date
+    ''', (user_id,))
+    return read_cursor(cursor)
+
+def data_validators(cursor, user_id, *parts):
+    """Return (data version, ETag, Last-Modified) for a response built from the user's data"""
+    version, updated_at = data_versions.get(cursor, user_id)
+    return version, data_versions.make_etag(user_id, version, request.path, *parts), updated_at
+
+def not_modified(etag, last_modified=None):
+    """A 304 response when the client's If-None-Match (or If-Modified-Since) still holds"""
+    if request.if_none_match:
+        matched = request.if_none_match.contains(etag)
+    elif request.if_modified_since and last_modified:
+        matched = last_modified <= request.if_modified_since
+    else:
+        matched = False
+    if not matched:
+        return None
+    return with_validators(Response(status=304), etag, last_modified)
+
+def with_validators(response, etag, last_modified=None):
+    """Per-user responses may be stored by the browser but must be revalidated"""
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Cookie')
+    return response
+
+def get_analytics_predictor(user_id):
+    """Reuse the user's fitted ARIMA models so they can be updated incrementally"""
+    previous = analytics_cache.latest(user_id)
+    if previous is not None and previous.system is not None:
+        return previous.system.predictor
+    # Another worker or an earlier process may have fitted an older data version
+    stored = model_store.load(user_id) if model_store is not None else None
+    if stored is not None:
+        return stored.system.predictor
+    # Deferred so pandas/scikit-learn/statsmodels are only loaded once analytics is used
+    from analytics.energy_analytics import EnergyPredictor
+    return EnergyPredictor(
+        refit_interval=int(os.environ.get('ARIMA_REFIT_INTERVAL', 168)),
+        drift_threshold=float(os.environ.get('ARIMA_DRIFT_THRESHOLD', 3.0))
+    )
 
-# Initialize database
-init_db()
+# Background analytics jobs (ANALYTICS_WORKERS=0 computes inline in the request)
+analytics_jobs = AnalyticsJobQueue(max_workers=int(os.environ.get('ANALYTICS_WORKERS', 2)))
+
+# Consumption forecasts per (user, data version, model)
+forecast_results = ResultCache(max_entries=int(os.environ.get('FORECAST_RESULT_CACHE_SIZE', 4096)))
+FORECAST_INTERVAL = float(os.environ.get('FORECAST_INTERVAL', 0.8))
+
+def profile_forecasts(cursor, versions):
+    """Profile forecasts for {user_id: data version} in one vectorized pass, cached per version"""
+    # Deferred so numpy is only loaded once forecasts are used
+    from analytics.forecasting import ProfileForecaster
+    forecaster = ProfileForecaster(weeks=int(os.environ.get('FORECAST_PROFILE_WEEKS', 4)), interval=FORECAST_INTERVAL)
+    forecasts = forecaster.forecast_series(rollups.hourly_series(cursor, list(versions), forecaster.history_hours))
+    for user_id, forecast in forecasts.items():
+        forecast_results.put((user_id, versions[user_id], 'profile'), forecast)
+    return forecasts
+
+def user_forecast(cursor, user_id, version, model):
+    """The user's 168-hour forecast for a data version, or None without data.
+
+    'arima' uses the short-term model fitted by the analytics job for this version and
+    falls back to the profile forecast until that model exists.
+    """
+    cached = forecast_results.get((user_id, version, model))
+    if cached is not None:
+        return cached
+    if model == 'arima':
+        entry = analytics_cache.get(user_id, version) or load_stored_analysis(user_id, version)
+        if entry is not None and entry.system is not None:
+            from analytics.forecasting import arima_forecast
+            forecast = arima_forecast(entry.system.predictor, FORECAST_INTERVAL)
+            if forecast is not None:
+                return forecast_results.put((user_id, version, 'arima'), forecast)
+    return profile_forecasts(cursor, {user_id: version}).get(user_id)
+
+def empty_analysis(message):
+    return {
+        'current_pattern': 0.0,
+        'next_hour_prediction': 0.0,
+        'carbon_footprint': 0.0,
+        'energy_cost': 0.0,
+        'recommendations': {
+            'carbon': [message],
+            'cost': [message]
+        }
+    }
+
+# Open-Meteo forecasts shared by nearby users (OPEN_METEO_URL can point at a local stub)
+forecast_cache = ForecastCache(
+    base_url=os.environ.get('OPEN_METEO_URL', 'https://api.open-meteo.com/v1/forecast'),
+    grid=float(os.environ.get('FORECAST_GRID_DEGREES', 0.1)),
+    cache_dir=os.environ.get('FORECAST_CACHE_DIR', 'forecast_cache') or None,
+    timeout=float(os.environ.get('FORECAST_TIMEOUT', 10)),
+    refresh_offset=int(os.environ.get('FORECAST_REFRESH_OFFSET', 300)),
+    max_stale=int(os.environ.get('FORECAST_MAX_STALE', 86400)),
+    http=http_client
+)
+
+# Offline IP geolocation (GEOIP_CSV). ipinfo.io answers addresses the index does not cover
+# when GEOIP_REMOTE_FALLBACK is set, which is the default only without a GEOIP_CSV
+geoip_index = GeoIPIndex(
+    os.environ.get('GEOIP_CSV'),
+    cache_size=int(os.environ.get('GEOIP_CACHE_SIZE', 4096)),
+    remote_fallback=os.environ.get(
+        'GEOIP_REMOTE_FALLBACK', '0' if os.environ.get('GEOIP_CSV') else '1'
+    ).lower() in ('1', 'true', 'yes'),
+    remote_timeout=float(os.environ.get('GEOIP_REMOTE_TIMEOUT', 3)),
+    http=http_client
+)
+
+startup_complete = False
+startup_lock = threading.Lock()
+
+def startup(keep_alive=True):
+    """Explicit process start-up: apply schema migrations and start background tasks.
+
+    Run once by the gunicorn master (gunicorn.conf.py) before workers fork, or by
+    'python main.py'; importing this module has no side effects.
+    """
+    global startup_complete
+    with startup_lock:
+        if startup_complete:
+            return
+        init_db()
+        if not len(geoip_index):
+            logger.warning("No IP ranges loaded (set GEOIP_CSV); geolocation "
+                           + ("uses ipinfo.io" if geoip_index.remote_fallback
+                              else "is disabled, so /api/geolocation returns 404 and regional tips are off"))
+        # Do not carry open connections into forked workers
+        get_pool().close_all()
+        startup_complete = True
+    if keep_alive:
+        start_keep_alive()
+
+@app.before_request
+def ensure_startup():
+    # Fallback for servers that never called startup() (e.g. 'flask run')
+    if not startup_complete:
+        startup(keep_alive=False)
+
+def warm_up():
+    """Import the analytics stack ahead of the first analytics request"""
+    started = time.time()
+    import analytics.energy_analytics  # noqa: F401
+    import ingest  # noqa: F401
+    logger.info(f"Analytics modules loaded in {time.time() - started:.2f}s")
+    warm_models(int(os.environ.get('MODEL_STORE_WARM_USERS', 20)))
+
+def warm_models(limit):
+    """Load the stored models of the most recently active users into this worker's cache"""
+    if model_store is None or limit <= 0:
+        return 0
+    started = time.time()
+    loaded = 0
+    forecasts = {}
+    conn = None
+    try:
+        user_ids = model_store.hottest(limit)
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        versions = {}
+        for user_id in user_ids:
+            version, _ = data_versions.get(cursor, user_id)
+            versions[user_id] = version
+            if analytics_cache.get(user_id, version) is None and load_stored_analysis(user_id, version):
+                loaded += 1
+        forecasts = profile_forecasts(cursor, versions)
+    except Exception as e:
+        logger.error(f"Model warm-up error: {str(e)}")
+    finally:
+        if conn:
+            conn.close()
+    logger.info(f"Loaded stored models for {loaded} users and forecasts for {len(forecasts)} "
+                f"in {time.time() - started:.2f}s")
+    return loaded
 
 # Index Route
 @app.route('/')
@@ -176,7 +418,7 @@ def register():
         try:
             conn = get_db_connection()
             cursor = conn.cursor()
-            cursor.execute("INSERT INTO users (username, password) VALUES (%s, %s)", (username, password))
+            execute_query(cursor, "INSERT INTO users (username, password) VALUES (%s, %s)", (username, password))
             conn.commit()
             conn.close()
             return jsonify({'status': 'success', 'message': 'User registered successfully'})
@@ -258,15 +500,20 @@ def add_energy():
         except (TypeError, ValueError):
             return jsonify({'status': 'fail', 'message': 'Invalid numeric values'}), 400
 
+        try:
+            date = normalize_timestamp(date)
+        except ValueError:
+            return jsonify({'status': 'fail', 'message': 'Invalid date'}), 400
+
         try:
             conn = get_db_connection()
-            logger.info("Database connection established")
+            logger.debug("Database connection established")
             
             cursor = conn.cursor()
-            logger.info("Cursor created")
+            logger.debug("Cursor created")
             
             # Log the values being inserted
-            logger.info(f"Inserting values: user_id={session['user_id']}, date={date}, solar={solar_energy}, electric={electric_energy}")
+            logger.debug(f"Inserting values: user_id={session['user_id']}, date={date}, solar={solar_energy}, electric={electric_energy}")
             
             # Use the execute_query helper function
             if os.environ.get('DATABASE_URL'):
@@ -284,10 +531,13 @@ def add_energy():
                     VALUES (%s, %s, %s, %s, %s, %s)
                 ''', (session['user_id'], date, solar_energy, electric_energy, temperature, humidity))
                 inserted_id = cursor.lastrowid
+
+            rollups.record_reading(cursor, session['user_id'], date, solar_energy, electric_energy)
+            data_versions.bump(cursor, session['user_id'])
             
-            logger.info("Query executed successfully")
+            logger.debug("Query executed successfully")
             conn.commit()
-            logger.info("Transaction committed")
+            logger.debug("Transaction committed")
             
             return jsonify({
                 'status': 'success', 
@@ -318,7 +568,7 @@ def add_energy():
                 cursor.close()
             if conn:
                 conn.close()
-                logger.info("Database connection closed")
+                logger.debug("Database connection closed")
 
     except Exception as e:
         logger.error(f"Error in add_energy: {str(e)}")
@@ -329,6 +579,190 @@ def add_energy():
             'error_type': type(e).__name__
         }), 500
 
+# Add Energy Data in bulk (JSON array, CSV or NDJSON, streamed in chunks)
+@app.route('/add_energy_batch', methods=['POST'])
+def add_energy_batch():
+    if 'user_id' not in session:
+        return jsonify({'status': 'fail', 'message': 'User not logged in'}), 401
+
+    import ingest
+
+    user_id = session['user_id']
+    try:
+        records = ingest.records_from_request(request)
+    except ValueError as e:
+        return jsonify({'status': 'fail', 'message': str(e)}), 400
+
+    conn = None
+    try:
+        conn = get_db_connection()
+        result = ingest.ingest_records(
+            conn, user_id, records,
+            chunk_size=int(os.environ.get('INGEST_CHUNK_SIZE', 10000))
+        )
+    except Exception as e:
+        logger.error(f"Error in add_energy_batch: {str(e)}")
+        return jsonify({
+            'status': 'fail',
+            'message': f'Database error: {str(e)}',
+            'error_type': type(e).__name__
+        }), 500
+    finally:
+        if conn:
+            conn.close()
+
+    logger.info(f"Batch ingest for user {user_id}: {result['inserted']} inserted, "
+                f"{result['rejected']} rejected in {result['seconds']}s")
+    if result['inserted'] == 0 and result['rejected'] > 0:
+        return jsonify(dict(result, status='fail', message='No valid readings')), 400
+    return jsonify(dict(result, status='success'))
+
+ENERGY_DATA_COLUMNS = 'id, date, solar_energy, electric_energy, temperature, humidity'
+
+def energy_row_to_dict(row):
+    return {
+        'id': row[0],
+        'date': format_timestamp(row[1]),
+        'solar_energy': row[2],
+        'electric_energy': row[3],
+        'temperature': row[4],
+        'humidity': row[5]
+    }
+
+def encode_page_cursor(row):
+    """Opaque keyset cursor pointing just after the given (id, date, ...) row"""
+    token = json.dumps({'d': format_timestamp(row[1]), 'i': row[0]})
+    return base64.urlsafe_b64encode(token.encode()).decode()
+
+def decode_page_cursor(token):
+    position = json.loads(base64.urlsafe_b64decode(token.encode()).decode())
+    return normalize_timestamp(position['d']), int(position['i'])
+
+def stream_energy_data(query, params, batch_size=1000):
+    """Stream rows as NDJSON, pulling them in batches (server-side cursor on PostgreSQL)"""
+    conn = get_db_connection()
+    if os.environ.get('DATABASE_URL'):
+        cursor = conn.cursor(name=f'energy_stream_{uuid.uuid4().hex}')
+        cursor.itersize = batch_size
+    else:
+        cursor = conn.cursor()
+    try:
+        execute_query(cursor, query, params)
+    except Exception:
+        conn.close()
+        raise
+
+    def generate():
+        try:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield ''.join(json.dumps(energy_row_to_dict(row)) + '\n' for row in rows)
+        finally:
+            cursor.close()
+            conn.close()
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+def energy_data_rows(cursor, where, params):
+    execute_query(cursor, f"SELECT {ENERGY_DATA_COLUMNS} FROM energy_data WHERE {where} ORDER BY date, id", params)
+    return cursor.fetchall()
+
+BUCKET_LENGTHS = {'hour': timedelta(hours=1), 'day': timedelta(days=1), 'week': timedelta(weeks=1)}
+
+def clipped_bucket(cursor, where, params, granularity, bucket):
+    """Rollup-shaped (bucket, solar, electric, readings) row of the range's own readings in a bucket"""
+    start = rollups.bucket_start(granularity, bucket)
+    end = start + BUCKET_LENGTHS[granularity]
+    execute_query(cursor, f'''
+        SELECT SUM(solar_energy), SUM(electric_energy), COUNT(*)
+        FROM energy_data WHERE {where} AND date >= %s AND date < %s
+    ''', list(params) + [start.strftime(TIMESTAMP_FORMAT), end.strftime(TIMESTAMP_FORMAT)])
+    solar, electric, count = cursor.fetchone()
+    return (bucket, float(solar or 0), float(electric or 0), count)
+
+def rollup_averages(cursor, user_id, where, params, first, last, max_points):
+    """Mean readings per hour, day or week from the rollups, merged further if still too many.
+
+    The rollups hold whole buckets, so the first and last bucket are recomputed
+    from the readings inside the range.
+    """
+    import numpy as np
+    import downsampling
+
+    start = datetime.strptime(normalize_timestamp(first), TIMESTAMP_FORMAT)
+    end = datetime.strptime(normalize_timestamp(last), TIMESTAMP_FORMAT)
+    hours = (end - start).total_seconds() / 3600 + 1
+    granularity = 'hour' if hours <= max_points else 'day' if hours / 24 <= max_points else 'week'
+    first_bucket = dict(rollups.reading_buckets(first))[granularity]
+    last_bucket = dict(rollups.reading_buckets(last))[granularity]
+    rows = list(rollups.get_rollup_range(cursor, user_id, granularity, first_bucket, last_bucket))
+    edges = {bucket: clipped_bucket(cursor, where, params, granularity, bucket)
+             for bucket in (first_bucket, last_bucket)}
+    rows = [row for row in (edges.get(row[0], row) for row in rows) if row[3] > 0]
+    if not rows:
+        return [], granularity
+
+    x = np.array([rollups.bucket_start(granularity, row[0]) for row in rows], dtype='datetime64[s]').astype(np.int64)
+    counts = np.array([row[3] for row in rows], dtype=float)
+    columns = {
+        'solar_energy': np.array([row[1] for row in rows], dtype=float) / counts,
+        'electric_energy': np.array([row[2] for row in rows], dtype=float) / counts
+    }
+    if len(rows) > max_points:
+        x, columns, counts = downsampling.bucket_average(x, columns, max_points, weights=counts)
+    return [
+        {
+            'id': None,
+            'date': str(np.datetime64(int(round(x[i])), 's')).replace('T', ' '),
+            'solar_energy': round(float(columns['solar_energy'][i]), 4),
+            'electric_energy': round(float(columns['electric_energy'][i]), 4),
+            'temperature': None,
+            'humidity': None,
+            'readings': int(counts[i])
+        }
+        for i in range(len(x))
+    ], granularity
+
+def downsampled_energy_data(cursor, user_id, conditions, params, max_points, method):
+    """/get_energy_data?max_points=: at most max_points chart points and exact totals for the range.
+
+    lttb and minmax return real readings picked from the range; average returns
+    per-bucket means read from the rollups, so wide ranges never scan raw rows.
+    """
+    import numpy as np
+    import downsampling
+    from analytics.readings import parse_timestamps
+
+    where = ' AND '.join(conditions)
+    execute_query(cursor, f'''
+        SELECT COUNT(*), SUM(solar_energy), SUM(electric_energy), MIN(date), MAX(date)
+        FROM energy_data WHERE {where}
+    ''', params)
+    count, solar, electric, first, last = cursor.fetchone()
+    result = {
+        'totals': {'readings': count, 'solar_energy': float(solar or 0), 'electric_energy': float(electric or 0)},
+        'downsampling': {'method': method, 'source_points': count}
+    }
+
+    if count <= max_points:
+        result['downsampling']['method'] = None
+        result['data'] = [energy_row_to_dict(row) for row in energy_data_rows(cursor, where, params)]
+    elif method == 'average':
+        result['data'], result['downsampling']['granularity'] = rollup_averages(
+            cursor, user_id, where, params, first, last, max_points)
+    else:
+        rows = energy_data_rows(cursor, where, params)
+        x = parse_timestamps([row[1] for row in rows]).astype(np.int64)
+        columns = {
+            'solar_energy': np.nan_to_num(np.array([row[2] for row in rows], dtype=float)),
+            'electric_energy': np.nan_to_num(np.array([row[3] for row in rows], dtype=float))
+        }
+        result['data'] = [energy_row_to_dict(rows[i]) for i in downsampling.select(x, columns, max_points, method)]
+    result['downsampling']['points'] = len(result['data'])
+    return result
+
 # Get Energy Data
 @app.route('/get_energy_data', methods=['GET'])
 def get_energy_data():
@@ -339,62 +773,173 @@ def get_energy_data():
         user_id = session['user_id']
         from_date = request.args.get('from_date')
         to_date = request.args.get('to_date')
+        if from_date and to_date:
+            try:
+                from_date = normalize_timestamp(from_date)
+                to_date = normalize_timestamp(to_date, end_of_day=True)
+            except ValueError:
+                return jsonify({'status': 'fail', 'message': 'Invalid date range'}), 400
 
+        # Keyset pagination: ?limit=N with ?cursor=<next_cursor> or ?after_date=&after_id=
+        try:
+            limit = request.args.get('limit')
+            limit = min(int(limit), int(os.environ.get('ENERGY_DATA_MAX_LIMIT', 5000))) if limit else None
+            if limit is not None and limit < 1:
+                raise ValueError('limit must be positive')
+            after = None
+            if request.args.get('cursor'):
+                after = decode_page_cursor(request.args['cursor'])
+            elif request.args.get('after_date'):
+                after = (normalize_timestamp(request.args['after_date']), int(request.args.get('after_id', 0)))
+        except (ValueError, TypeError, KeyError):
+            return jsonify({'status': 'fail', 'message': 'Invalid pagination parameters'}), 400
+
+        # Chart data: ?max_points=N&method=lttb|minmax|average bounds the points returned
+        method = request.args.get('method', 'lttb')
+        try:
+            max_points = request.args.get('max_points')
+            max_points = min(int(max_points), int(os.environ.get('DOWNSAMPLE_MAX_POINTS', 5000))) if max_points else None
+            if max_points is not None and (max_points < 10 or method not in ('lttb', 'minmax', 'average')):
+                raise ValueError('max_points must be at least 10 and method lttb, minmax or average')
+        except ValueError:
+            return jsonify({'status': 'fail', 'message': 'Invalid downsampling parameters'}), 400
+
+        conditions = ['user_id = %s']
+        params = [user_id]
+        if from_date and to_date:
+            conditions.append('date BETWEEN %s AND %s')
+            params.extend([from_date, to_date])
+        if after is not None:
+            conditions.append('(date, id) > (%s, %s)')
+            params.extend(after)
+        query = f"SELECT {ENERGY_DATA_COLUMNS} FROM energy_data WHERE {' AND '.join(conditions)} ORDER BY date, id"
+        if limit is not None:
+            # One extra row tells us whether another page follows
+            query += ' LIMIT %s'
+            params.append(limit + 1)
+
+        wants_stream = (request.args.get('format') == 'ndjson'
+                        or 'application/x-ndjson' in request.headers.get('Accept', ''))
+        if max_points is not None and (limit is not None or after is not None or wants_stream):
+            return jsonify({'status': 'fail', 'message': 'max_points cannot be combined with pagination or streaming'}), 400
+
+        # Unchanged polls are answered from the user's data version alone
         conn = get_db_connection()
         cursor = conn.cursor()
-        
-        if from_date and to_date:
-            if os.environ.get('DATABASE_URL'):
-                cursor.execute('''
-                    SELECT id, date, solar_energy, electric_energy, temperature, humidity
-                    FROM energy_data
-                    WHERE user_id = %s AND date BETWEEN %s AND %s
-                    ORDER BY date
-                ''', (user_id, from_date, to_date))
-            else:
-                cursor.execute('''
-                    SELECT id, date, solar_energy, electric_energy, temperature, humidity
-                    FROM energy_data
-                    WHERE user_id = ? AND date BETWEEN ? AND ?
-                    ORDER BY date
-                ''', (user_id, from_date, to_date))
-        else:
-            if os.environ.get('DATABASE_URL'):
-                cursor.execute('''
-                    SELECT id, date, solar_energy, electric_energy, temperature, humidity
-                    FROM energy_data
-                    WHERE user_id = %s
-                    ORDER BY date
-                ''', (user_id,))
-            else:
-                cursor.execute('''
-                    SELECT id, date, solar_energy, electric_energy, temperature, humidity
-                    FROM energy_data
-                    WHERE user_id = ?
-                    ORDER BY date
-                ''', (user_id,))
-                
+        _, etag, last_modified = data_validators(
+            cursor, user_id, sorted(request.args.items(multi=True)), wants_stream
+        )
+        unchanged = not_modified(etag, last_modified)
+        if unchanged is not None:
+            conn.close()
+            return unchanged
+
+        if wants_stream:
+            conn.close()
+            return with_validators(stream_energy_data(query, params), etag, last_modified)
+
+        if max_points is not None:
+            response = downsampled_energy_data(cursor, user_id, conditions, params, max_points, method)
+            conn.close()
+            return with_validators(jsonify(dict(response, status='success')), etag, last_modified)
+
+        execute_query(cursor, query, params)
         data = cursor.fetchall()
         conn.close()
 
-        # Convert to list of dictionaries
-        energy_data = []
-        for row in data:
-            energy_data.append({
-                'id': row[0],
-                'date': row[1],
-                'solar_energy': row[2],
-                'electric_energy': row[3],
-                'temperature': row[4],
-                'humidity': row[5]
-            })
+        response = {'status': 'success'}
+        if limit is not None:
+            has_more = len(data) > limit
+            data = data[:limit]
+            response['next_cursor'] = encode_page_cursor(data[-1]) if has_more else None
 
-        return jsonify({'status': 'success', 'data': energy_data})
+        # Convert to list of dictionaries
+        response['data'] = [energy_row_to_dict(row) for row in data]
+        return with_validators(jsonify(response), etag, last_modified)
 
     except Exception as e:
         logger.error(f"Error in get_energy_data: {str(e)}")
         return jsonify({'status': 'fail', 'message': 'Error retrieving energy data'}), 500
 
+# Export the full history as one Parquet (default) or Arrow IPC file
+@app.route('/export_energy_data', methods=['GET'])
+def export_energy_data():
+    if 'user_id' not in session:
+        return jsonify({'status': 'fail', 'message': 'Unauthorized'}), 401
+
+    import columnar
+
+    fmt = request.args.get('format', 'parquet')
+    if fmt not in columnar.FORMATS:
+        return jsonify({'status': 'fail', 'message': f"format must be one of {', '.join(columnar.FORMATS)}"}), 400
+
+    user_id = session['user_id']
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        version, etag, last_modified = data_validators(cursor, user_id, fmt)
+        unchanged = not_modified(etag, last_modified)
+        if unchanged is not None:
+            return unchanged
+        payload = columnar.to_bytes(fetch_analysis_data(cursor, user_id, version), fmt)
+    except Exception as e:
+        logger.error(f"Error in export_energy_data: {str(e)}")
+        return jsonify({'status': 'fail', 'message': 'Error exporting energy data'}), 500
+    finally:
+        if conn:
+            conn.close()
+
+    mimetype, extension = columnar.FORMATS[fmt]
+    response = Response(payload, mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename=energy_data.{extension}'
+    return with_validators(response, etag, last_modified)
+
+# Import a Parquet or Arrow IPC file; mode=replace restores it as the whole history
+@app.route('/import_energy_data', methods=['POST'])
+def import_energy_data():
+    if 'user_id' not in session:
+        return jsonify({'status': 'fail', 'message': 'User not logged in'}), 401
+
+    import columnar
+    import ingest
+
+    mode = request.args.get('mode', 'append')
+    if mode not in ('append', 'replace'):
+        return jsonify({'status': 'fail', 'message': 'mode must be append or replace'}), 400
+    max_bytes = int(os.environ.get('IMPORT_MAX_BYTES', 256 * 1024 * 1024))
+    if request.content_length and request.content_length > max_bytes:
+        return jsonify({'status': 'fail', 'message': 'File too large'}), 413
+
+    upload = request.files.get('file')
+    payload = upload.read() if upload is not None else request.get_data()
+    try:
+        frame = columnar.read_frame(payload)
+    except ValueError as e:
+        return jsonify({'status': 'fail', 'message': str(e)}), 400
+
+    user_id = session['user_id']
+    conn = None
+    try:
+        conn = get_db_connection()
+        result = ingest.ingest_frame(conn, user_id, frame, replace=mode == 'replace')
+    except Exception as e:
+        logger.error(f"Error in import_energy_data: {str(e)}")
+        return jsonify({
+            'status': 'fail',
+            'message': f'Database error: {str(e)}',
+            'error_type': type(e).__name__
+        }), 500
+    finally:
+        if conn:
+            conn.close()
+
+    logger.info(f"Import ({mode}) for user {user_id}: {result['inserted']} inserted, "
+                f"{result['rejected']} rejected in {result['seconds']}s")
+    if result['inserted'] == 0 and result['rejected'] > 0:
+        return jsonify(dict(result, status='fail', message='No valid readings')), 400
+    return jsonify(dict(result, status='success', mode=mode))
+
 # Get Analytics
 @app.route('/get_analytics', methods=['GET'])
 def get_analytics():
@@ -402,61 +947,63 @@ def get_analytics():
         return jsonify({'status': 'fail', 'message': 'Unauthorized'}), 401
 
     try:
+        user_id = session['user_id']
+
         # Get energy data
         conn = get_db_connection()
         cursor = conn.cursor()
-        
-        if os.environ.get('DATABASE_URL'):
-            cursor.execute('''
-                SELECT date, solar_energy, electric_energy, temperature, humidity
-                FROM energy_data
-                WHERE user_id = %s
-                ORDER BY date
-            ''', (session['user_id'],))
-        else:
-            cursor.execute('''
-                SELECT date, solar_energy, electric_energy, temperature, humidity
-                FROM energy_data
-                WHERE user_id = ?
-                ORDER BY date
-            ''', (session['user_id'],))
-            
-        rows = cursor.fetchall()
-        conn.close()
 
-        if not rows:
-            return jsonify({
-                'status': 'success',
-                'analysis': {
-                    'current_pattern': 0.0,
-                    'next_hour_prediction': 0.0,
-                    'carbon_footprint': 0.0,
-                    'energy_cost': 0.0,
-                    'recommendations': {
-                        'carbon': ["No data available"],
-                        'cost': ["No data available"]
-                    }
-                }
-            })
+        # The analysis only changes with the data or when the hour rolls over
+        fingerprint, etag, _ = data_validators(cursor, user_id, datetime.now().strftime('%Y-%m-%d %H'))
+        unchanged = not_modified(etag)
+        if unchanged is not None:
+            conn.close()
+            return unchanged
 
-        # Convert rows to list of dictionaries
-        data = []
-        for row in rows:
-            data.append({
-                'date': row[0],
-                'solar_energy': float(row[1]),
-                'electric_energy': float(row[2]),
-                'temperature': float(row[3]) if row[3] is not None else 25.0,
-                'humidity': float(row[4]) if row[4] is not None else 60.0
-            })
+        # Serve the cached, precomputed or stored analysis while the user's data is unchanged
+        cached = (analytics_cache.get(user_id, fingerprint)
+                  or load_precomputed_analysis(cursor, user_id, fingerprint)
+                  or load_stored_analysis(user_id, fingerprint))
+        if cached is not None:
+            conn.close()
+            return analytics_response(cached, fingerprint, etag=etag)
 
-        # Perform analytics
-        analysis = analytics_system.analyze_consumption(data)
-        
-        return jsonify({
-            'status': 'success',
-            'analysis': analysis
-        })
+        # Stale-while-revalidate: answer with the last result and recompute in the background
+        job = analytics_jobs.active_job(user_id, fingerprint)
+        if job is None:
+            data = fetch_analysis_data(cursor, user_id, fingerprint)
+            conn.close()
+
+            if not len(data):
+                return with_validators(jsonify({
+                    'status': 'success',
+                    'analysis': empty_analysis("No data available")
+                }), etag)
+
+            from analytics.readings import latest_entry as latest_reading
+
+            def store_result(job, result, latest_entry=latest_reading(data), row_count=len(data)):
+                analysis, fitted_system = result
+                metrics.observe_stages(getattr(fitted_system, 'stage_timings', None))
+                analytics_cache.put(job.user_id, job.fingerprint, fitted_system, analysis, latest_entry, row_count)
+                if model_store is not None:
+                    model_store.save(job.user_id, job.fingerprint, fitted_system, analysis, latest_entry, row_count)
+
+            job = analytics_jobs.submit(
+                user_id, fingerprint, run_analysis,
+                (data, get_analytics_predictor(user_id)),
+                on_done=store_result
+            )
+        else:
+            conn.close()
+
+        # With nothing to show yet, give small histories a moment to finish
+        latest = analytics_cache.latest(user_id)
+        if latest is None:
+            analytics_jobs.wait(job.id, float(os.environ.get('ANALYTICS_FIRST_RESULT_WAIT', 2)))
+            latest = analytics_cache.latest(user_id)
+
+        return analytics_response(latest, fingerprint, job, etag)
 
     except Exception as e:
         logger.error(f"Analytics error: {str(e)}")
@@ -474,6 +1021,48 @@ def get_analytics():
             }
         })
 
+def analytics_response(entry, fingerprint, job=None, etag=None):
+    """Wrap a cached analysis with its age and the state of any pending recompute.
+
+    Only a fresh analysis carries the ETag; stale ones are about to change.
+    """
+    pending = job is not None and not job.done.is_set()
+    if job is not None and job.status == 'failed' and entry is None:
+        analysis = empty_analysis(f"Error: {job.error}")
+    elif entry is None:
+        analysis = empty_analysis("Analysis in progress")
+    else:
+        analysis = entry.current_analysis()
+    stale = entry is None or entry.fingerprint != fingerprint
+    response = jsonify({
+        'status': 'success',
+        'analysis': analysis,
+        'stale': stale,
+        'age_seconds': round(time.time() - entry.created_at, 3) if entry is not None else None,
+        'job_id': job.id if pending else None
+    })
+    if stale or etag is None:
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+    return with_validators(response, etag)
+
+# Poll or wait on a background analytics job
+@app.route('/analytics_job/<job_id>', methods=['GET'])
+def analytics_job_status(job_id):
+    if 'user_id' not in session:
+        return jsonify({'status': 'fail', 'message': 'Unauthorized'}), 401
+
+    try:
+        wait = min(float(request.args.get('wait', 0)), 30.0)
+    except ValueError:
+        return jsonify({'status': 'fail', 'message': 'Invalid wait value'}), 400
+
+    job = analytics_jobs.wait(job_id, wait)
+    if job is None or job.user_id != session['user_id']:
+        return jsonify({'status': 'fail', 'message': 'Job not found'}), 404
+
+    return jsonify(dict(job.to_dict(), status='success', job_status=job.status, analysis=job.analysis))
+
 # Delete Entry
 @app.route('/delete_entry', methods=['POST'])
 def delete_entry():
@@ -489,12 +1078,18 @@ def delete_entry():
 
         conn = get_db_connection()
         cursor = conn.cursor()
-        
-        if os.environ.get('DATABASE_URL'):
-            cursor.execute("DELETE FROM energy_data WHERE id = %s AND user_id = %s", (entry_id, session["user_id"]))
-        else:
-            cursor.execute("DELETE FROM energy_data WHERE id = ? AND user_id = ?", (entry_id, session["user_id"]))
-            
+
+        # Read the reading first so its contribution can be taken out of the rollups
+        execute_query(cursor, '''
+            SELECT date, solar_energy, electric_energy FROM energy_data WHERE id = %s AND user_id = %s
+        ''', (entry_id, session["user_id"]))
+        entry = cursor.fetchone()
+
+        if entry is not None:
+            execute_query(cursor, "DELETE FROM energy_data WHERE id = %s AND user_id = %s", (entry_id, session["user_id"]))
+            rollups.record_reading(cursor, session['user_id'], entry[0], entry[1], entry[2], sign=-1)
+            data_versions.bump(cursor, session['user_id'])
+
         conn.commit()
         conn.close()
 
@@ -516,33 +1111,49 @@ def compare():
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
-        
-        if os.environ.get('DATABASE_URL'):
-            cursor.execute('''
-                SELECT SUM(solar_energy), SUM(electric_energy)
-                FROM energy_data
-                WHERE user_id = %s
-            ''', (session['user_id'],))
-        else:
-            cursor.execute('''
-                SELECT SUM(solar_energy), SUM(electric_energy)
-                FROM energy_data
-                WHERE user_id = ?
-            ''', (session['user_id'],))
-            
-        result = cursor.fetchone()
+        _, etag, last_modified = data_validators(cursor, session['user_id'])
+        unchanged = not_modified(etag, last_modified)
+        if unchanged is not None:
+            conn.close()
+            return unchanged
+
+        result = rollups.get_rollup(cursor, session['user_id'], 'total', rollups.TOTAL_BUCKET)
         conn.close()
 
-        return jsonify({
+        return with_validators(jsonify({
             'status': 'success',
             'solar_total': result[0] or 0,
             'electric_total': result[1] or 0
-        })
+        }), etag, last_modified)
 
     except Exception as e:
         logger.error(f"Error in compare: {str(e)}")
         return jsonify({'status': 'fail', 'message': 'Error comparing energy totals'}), 500
 
+COUNTRY_TIPS = {
+    'IN': " In India, consider using solar water heaters and LED lighting for better energy efficiency.",
+    'US': " In the US, check for local solar incentives and tax credits to maximize your savings."
+}
+COUNTRY_CODES = {'india': 'IN', 'usa': 'US', 'united states': 'US'}
+CITY_TIPS = {
+    'bangalore': " Bangalore has good solar potential - consider installing solar panels on your rooftop.",
+    'bengaluru': " Bangalore has good solar potential - consider installing solar panels on your rooftop.",
+    'mumbai': " Mumbai's coastal climate is great for solar energy - take advantage of the abundant sunlight."
+}
+
+def client_ip():
+    # Behind Render's proxy the client is the first X-Forwarded-For hop
+    return request.access_route[0] if request.access_route else request.remote_addr
+
+def regional_tips(location_data):
+    """Country and city specific advice for a geolocation result (country code or name)"""
+    if not location_data:
+        return ''
+    country = (location_data.get('country') or '').strip()
+    country = COUNTRY_CODES.get(country.lower(), country.upper())
+    city = (location_data.get('city') or '').strip().lower()
+    return COUNTRY_TIPS.get(country, '') + CITY_TIPS.get(city, '')
+
 # Energy Usage Tips
 @app.route('/energy_tips', methods=['GET'])
 def energy_tips():
@@ -554,46 +1165,16 @@ def energy_tips():
         today = datetime.now().date()
         start_of_this_week = today - timedelta(days=today.weekday())
         start_of_last_week = start_of_this_week - timedelta(weeks=1)
-        end_of_last_week = start_of_this_week - timedelta(days=1)
 
-        # Get user's location
-        try:
-            ip = request.remote_addr
-            if ip == '127.0.0.1':  # For local development
-                ip = requests.get('https://api.ipify.org').text
-            location_response = requests.get(f'https://ipinfo.io/{ip}/json')
-            location_data = location_response.json() if location_response.status_code == 200 else {}
-        except:
-            location_data = {}
+        # Get user's location from the local IP index
+        location_data = geoip_index.lookup(client_ip()) or {}
 
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        if os.environ.get('DATABASE_URL'):
-            cursor.execute('''
-                SELECT SUM(electric_energy) FROM energy_data
-                WHERE user_id = %s AND date BETWEEN %s AND %s
-            ''', (user_id, str(start_of_last_week), str(end_of_last_week)))
-            last_week_total = cursor.fetchone()[0] or 0
-
-            cursor.execute('''
-                SELECT SUM(electric_energy) FROM energy_data
-                WHERE user_id = %s AND date BETWEEN %s AND %s
-            ''', (user_id, str(start_of_this_week), str(today)))
-            this_week_total = cursor.fetchone()[0] or 0
-        else:
-            cursor.execute('''
-                SELECT SUM(electric_energy) FROM energy_data
-                WHERE user_id = ? AND date BETWEEN ? AND ?
-            ''', (user_id, str(start_of_last_week), str(end_of_last_week)))
-            last_week_total = cursor.fetchone()[0] or 0
-
-            cursor.execute('''
-                SELECT SUM(electric_energy) FROM energy_data
-                WHERE user_id = ? AND date BETWEEN ? AND ?
-            ''', (user_id, str(start_of_this_week), str(today)))
-            this_week_total = cursor.fetchone()[0] or 0
-            
+        last_week_total = rollups.get_rollup(cursor, user_id, 'week', rollups.week_bucket(start_of_last_week))[1] or 0
+        this_week_total = rollups.get_rollup(cursor, user_id, 'week', rollups.week_bucket(today))[1] or 0
+
         conn.close()
 
         # Base message
@@ -609,21 +1190,7 @@ def energy_tips():
                 message = "Your electricity usage is consistent with last week. Keep monitoring for better savings."
 
         # Add location-specific tips
-        if location_data:
-            city = location_data.get('city', '').lower()
-            country = location_data.get('country', '').lower()
-            
-            # Add regional tips
-            if 'india' in country:
-                message += " In India, consider using solar water heaters and LED lighting for better energy efficiency."
-            elif 'usa' in country:
-                message += " In the US, check for local solar incentives and tax credits to maximize your savings."
-            
-            # Add city-specific tips
-            if 'bangalore' in city:
-                message += " Bangalore has good solar potential - consider installing solar panels on your rooftop."
-            elif 'mumbai' in city:
-                message += " Mumbai's coastal climate is great for solar energy - take advantage of the abundant sunlight."
+        message += regional_tips(location_data)
 
         return jsonify({'status': 'success', 'tip': message})
 
@@ -643,24 +1210,66 @@ def solar_forecast_api():
     if 'user_id' not in session:
         return jsonify({'status': 'fail', 'message': 'Unauthorized'}), 401
 
-    lat = request.args.get('lat', '12.9716')  # Default: Bangalore
-    lon = request.args.get('lon', '77.5946')
+    try:
+        lat = float(request.args.get('lat', '12.9716'))  # Default: Bangalore
+        lon = float(request.args.get('lon', '77.5946'))
+    except ValueError:
+        return jsonify({'status': 'fail', 'message': 'Invalid coordinates'}), 400
 
-    # Open-Meteo solar radiation API (no API key needed)
-    url = (
-        f"https://api.open-meteo.com/v1/forecast"
-        f"?latitude={lat}&longitude={lon}&hourly=shortwave_radiation"
-    )
+    try:
+        data, info = forecast_cache.get(lat, lon)
+    except ForecastUnavailable as e:
+        logger.error(f"Solar forecast unavailable: {str(e)}")
+        return jsonify({'status': 'fail', 'message': 'API Error'}), 502
+
+    response = jsonify({'status': 'success', 'forecast': data, 'cache': info})
+    max_age = max(0, int(info['expires_at'] - time.time())) if info['cache'] != 'stale' else 0
+    response.headers['Cache-Control'] = f'private, max-age={max_age}'
+    return response
+
+# Consumption forecast with prediction intervals
+@app.route('/api/forecast', methods=['GET'])
+def consumption_forecast_api():
+    if 'user_id' not in session:
+        return jsonify({'status': 'fail', 'message': 'Unauthorized'}), 401
+
+    from analytics.forecasting import HORIZONS
+    horizon = request.args.get('horizon', '24h')
+    model = request.args.get('model', os.environ.get('FORECAST_MODEL', 'profile'))
+    if horizon not in HORIZONS:
+        return jsonify({'status': 'fail', 'message': f"horizon must be one of {', '.join(HORIZONS)}"}), 400
+    if model not in ('profile', 'arima'):
+        return jsonify({'status': 'fail', 'message': "model must be 'profile' or 'arima'"}), 400
 
+    conn = None
     try:
-        response = requests.get(url)
-        if response.status_code == 200:
-            data = response.json()
-            return jsonify({'status': 'success', 'forecast': data})
-        else:
-            return jsonify({'status': 'fail', 'message': 'API Error'}), response.status_code
+        user_id = session['user_id']
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        version, etag, last_modified = data_validators(cursor, user_id, horizon, model)
+        unchanged = not_modified(etag, last_modified)
+        if unchanged is not None:
+            return unchanged
+        forecast = user_forecast(cursor, user_id, version, model)
     except Exception as e:
-        return jsonify({'status': 'fail', 'message': str(e)}), 500
+        logger.error(f"Forecast error: {str(e)}")
+        return jsonify({'status': 'fail', 'message': 'Forecast unavailable'}), 500
+    finally:
+        if conn:
+            conn.close()
+
+    response = jsonify({
+        'status': 'success',
+        'horizon': horizon,
+        'model': forecast.model if forecast is not None else model,
+        'interval': FORECAST_INTERVAL,
+        'forecast': forecast.records(HORIZONS[horizon]) if forecast is not None else []
+    })
+    if forecast is not None and forecast.model != model:
+        # A fallback answer; the requested model's forecast will differ once it is fitted
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+    return with_validators(response, etag, last_modified)
 
 # Geolocation API endpoint
 @app.route('/api/geolocation', methods=['GET'])
@@ -668,30 +1277,42 @@ def get_geolocation():
     if 'user_id' not in session:
         return jsonify({'status': 'fail', 'message': 'Unauthorized'}), 401
 
+    location_data = geoip_index.lookup(client_ip())
+    if location_data is None:
+        return jsonify({'status': 'fail', 'message': 'Failed to fetch location data'}), 404
+
+    loc = '0,0'
+    if location_data['latitude'] is not None and location_data['longitude'] is not None:
+        loc = f"{location_data['latitude']},{location_data['longitude']}"
+    return jsonify({
+        'status': 'success',
+        'data': {
+            'city': location_data['city'] or 'Unknown',
+            'region': location_data['region'] or 'Unknown',
+            'country': location_data['country'] or 'Unknown',
+            'loc': loc  # Latitude,Longitude
+        }
+    })
+
+@app.cli.command('rebuild-rollups')
+@click.option('--user-id', type=int, default=None, help="Only rebuild this user's rollups")
+def rebuild_rollups_command(user_id):
+    """Recompute energy_rollups from energy_data."""
+    conn = get_db_connection()
     try:
-        # Get user's IP address from request
-        ip = request.remote_addr
-        if ip == '127.0.0.1':  # For local development
-            ip = requests.get('https://api.ipify.org').text
-
-        # Get location data from ipinfo.io
-        response = requests.get(f'https://ipinfo.io/{ip}/json')
-        if response.status_code == 200:
-            location_data = response.json()
-            return jsonify({
-                'status': 'success',
-                'data': {
-                    'city': location_data.get('city', 'Unknown'),
-                    'region': location_data.get('region', 'Unknown'),
-                    'country': location_data.get('country', 'Unknown'),
-                    'loc': location_data.get('loc', '0,0')  # Latitude,Longitude
-                }
-            })
-        else:
-            return jsonify({'status': 'fail', 'message': 'Failed to fetch location data'}), response.status_code
-    except Exception as e:
-        return jsonify({'status': 'fail', 'message': str(e)}), 500
+        count = rollups.rebuild(conn, user_id=user_id)
+        conn.commit()
+    finally:
+        conn.close()
+    click.echo(f"Rebuilt rollups from {count} readings")
+
+@app.cli.command('init-db')
+def init_db_command():
+    """Apply pending schema migrations."""
+    init_db()
+    click.echo("Database schema up to date")
 
 if __name__ == '__main__':
+    startup()
     app.run()
 
@@ -0,0 +1,184 @@
+"""In-process metrics rendered in the Prometheus text exposition format.
+
+Counters, gauges and histograms with labels, kept per worker process (a scrape sees
+the worker that answered it). The metrics the app records are defined at the
+bottom of this module.
+"""
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_value(key, value))
+        return lines
+
+    def _render_value(self, key, value):
+        return [f'{self.name}{_labels(self.labelnames, key)} {_number(value)}']
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['counts'][i] += 1
+                    break
+            state['sum'] += value
+            state['count'] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _render_value(self, key, state):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, state['counts']):
+            cumulative += count
+            labels = _labels(self.labelnames, key, [('le', _number(bound))])
+            lines.append(f'{self.name}_bucket{labels} {cumulative}')
+        labels = _labels(self.labelnames, key)
+        lines.append(f'{self.name}_sum{labels} {_number(state["sum"])}')
+        lines.append(f'{self.name}_count{labels} {state["count"]}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+http_requests = REGISTRY.register(Counter(
+    'http_requests_total', 'HTTP requests by route, method and status code', ('route', 'method', 'status')
+))
+http_request_duration = REGISTRY.register(Histogram(
+    'http_request_duration_seconds', 'HTTP request latency by route and method', ('route', 'method')
+))
+http_in_flight = REGISTRY.register(Gauge(
+    'http_requests_in_flight', 'HTTP requests currently being served'
+))
+analytics_stage_duration = REGISTRY.register(Histogram(
+    'analytics_stage_duration_seconds', 'Time spent in each analyze_consumption stage', ('stage',)
+))
+db_query_duration = REGISTRY.register(Histogram(
+    'db_query_duration_seconds', 'Database statement latency by statement type', ('operation',),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+))
+external_request_duration = REGISTRY.register(Histogram(
+    'external_request_duration_seconds', 'Outbound HTTP latency by host and outcome', ('host', 'outcome')
+))
+db_pool = REGISTRY.register(Gauge(
+    'db_pool_connections', 'Database pool connections by state', ('state',)
+))
+analytics_cache_entries = REGISTRY.register(Gauge(
+    'analytics_cache_entries', 'Users with a cached analysis in this worker'
+))
+analytics_cache_lookups = REGISTRY.register(Counter(
+    'analytics_cache_lookups_total', 'Analytics cache lookups by result', ('result',)
+))
+
+
+def observe_stages(timings):
+    """Record {stage: seconds} measured inside analyze_consumption (possibly in another process)"""
+    for stage, seconds in (timings or {}).items():
+        analytics_stage_duration.observe(seconds, stage=stage)
+
+
+def statement_operation(query):
+    """First keyword of a SQL statement, used as a low-cardinality label"""
+    if isinstance(query, bytes):
+        query = query.decode('utf-8', 'replace')
+    words = str(query).split(None, 1)
+    return words[0].upper() if words else 'UNKNOWN'
@@ -0,0 +1,278 @@
+"""Versioned schema migrations.
+
+Each migration is a (version, name, function) entry in MIGRATIONS; the function gets
+a cursor and a flag telling it whether the database is PostgreSQL. Applied versions
+are recorded in schema_migrations, and every migration runs in its own transaction.
+Append new migrations to the end of the list and never edit one that has shipped.
+"""
+import logging
+import os
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary key for the PostgreSQL advisory lock that serializes concurrent migrators
+MIGRATION_LOCK_KEY = 5146
+
+# Legacy date strings PostgreSQL can cast to a timestamp: YYYY-MM-DD, optionally with a
+# time, and a time may carry 'Z' or a UTC offset (converted to UTC, as SQLite's datetime() does)
+_ISO_DATE = r'\d{4}-(0[1-9]|1[0-2])-(0[1-9]|[12]\d|3[01])'
+_ISO_TIME = r'[ T]([01]\d|2[0-3]):[0-5]\d(:[0-5]\d(\.\d+)?)?'
+ISO_DATE_PATTERN = rf'^{_ISO_DATE}({_ISO_TIME})?$'
+ISO_OFFSET_DATE_PATTERN = rf'^{_ISO_DATE}{_ISO_TIME}(Z|[+-]\d{{2}}:?\d{{2}})$'
+
+
+def _create_base_tables(cursor, postgres):
+    if postgres:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS users (
+                id SERIAL PRIMARY KEY,
+                username TEXT NOT NULL UNIQUE,
+                password TEXT NOT NULL
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS energy_data (
+                id SERIAL PRIMARY KEY,
+                user_id INTEGER REFERENCES users(id),
+                date TEXT,
+                solar_energy REAL,
+                electric_energy REAL,
+                temperature REAL,
+                humidity REAL
+            )
+        ''')
+        cursor.execute("ALTER TABLE energy_data ADD COLUMN IF NOT EXISTS temperature REAL DEFAULT 25")
+        cursor.execute("ALTER TABLE energy_data ADD COLUMN IF NOT EXISTS humidity REAL DEFAULT 60")
+    else:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT NOT NULL UNIQUE,
+                password TEXT NOT NULL
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS energy_data (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER,
+                date TEXT,
+                solar_energy REAL,
+                electric_energy REAL,
+                temperature REAL,
+                humidity REAL,
+                FOREIGN KEY (user_id) REFERENCES users (id)
+            )
+        ''')
+
+        # Databases created before these columns existed
+        cursor.execute("PRAGMA table_info(energy_data)")
+        columns = [column[1] for column in cursor.fetchall()]
+        if 'temperature' not in columns:
+            cursor.execute("ALTER TABLE energy_data ADD COLUMN temperature REAL DEFAULT 25")
+        if 'humidity' not in columns:
+            cursor.execute("ALTER TABLE energy_data ADD COLUMN humidity REAL DEFAULT 60")
+
+
+def _add_user_date_index(cursor, postgres):
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_energy_data_user_date ON energy_data (user_id, date)")
+
+
+def _convert_date_to_timestamp(cursor, postgres):
+    # add_energy used to store any non-empty date string
+    if postgres:
+        cursor.execute(f'''
+            SELECT COUNT(*) FROM energy_data
+            WHERE date IS NOT NULL AND date <> ''
+              AND date !~ '{ISO_DATE_PATTERN}' AND date !~ '{ISO_OFFSET_DATE_PATTERN}'
+        ''')
+        invalid = cursor.fetchone()[0]
+        if invalid:
+            logger.warning(f"{invalid} energy_data rows have an unparseable date; it is set to NULL")
+        cursor.execute(f'''
+            ALTER TABLE energy_data
+            ALTER COLUMN date TYPE TIMESTAMP
+            USING CASE
+                WHEN date ~ '{ISO_DATE_PATTERN}' THEN date::timestamp
+                WHEN date ~ '{ISO_OFFSET_DATE_PATTERN}' THEN date::timestamptz AT TIME ZONE 'UTC'
+            END
+        ''')
+        return
+
+    cursor.execute("SELECT COUNT(*) FROM energy_data WHERE date IS NOT NULL AND date <> '' AND datetime(date) IS NULL")
+    invalid = cursor.fetchone()[0]
+    if invalid:
+        logger.warning(f"{invalid} energy_data rows have an unparseable date; it is kept as stored")
+
+    # SQLite cannot change a column type in place: rebuild the table with dates
+    # normalized to 'YYYY-MM-DD HH:MM:SS' so text order is chronological order
+    cursor.execute('''
+        CREATE TABLE energy_data_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            date TIMESTAMP,
+            solar_energy REAL,
+            electric_energy REAL,
+            temperature REAL DEFAULT 25,
+            humidity REAL DEFAULT 60,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    cursor.execute('''
+        INSERT INTO energy_data_new (id, user_id, date, solar_energy, electric_energy, temperature, humidity)
+        SELECT id, user_id, COALESCE(datetime(date), date), solar_energy, electric_energy, temperature, humidity
+        FROM energy_data
+    ''')
+    cursor.execute("DROP TABLE energy_data")
+    cursor.execute("ALTER TABLE energy_data_new RENAME TO energy_data")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_energy_data_user_date ON energy_data (user_id, date)")
+
+
+def _create_energy_rollups(cursor, postgres):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS energy_rollups (
+            user_id INTEGER NOT NULL,
+            granularity TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            solar_total REAL NOT NULL DEFAULT 0,
+            electric_total REAL NOT NULL DEFAULT 0,
+            reading_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, granularity, bucket)
+        )
+    ''')
+    # Backfill from existing readings in SQL, so replaying this migration never depends
+    # on the current rollups module. Buckets are hours ('YYYY-MM-DD HH:00:00'), days
+    # ('YYYY-MM-DD'), ISO weeks ('YYYY-Www') and one 'all' total.
+    if postgres:
+        valid = "date IS NOT NULL"
+        buckets = {
+            'hour': "to_char(date, 'YYYY-MM-DD HH24:00:00')",
+            'day': "to_char(date, 'YYYY-MM-DD')",
+            'week': "to_char(date, 'IYYY-\"W\"IW')",
+            'total': "'all'"
+        }
+    else:
+        # Legacy dates SQLite cannot parse are skipped; the ISO week is the one holding
+        # the Thursday of the reading's Monday-based week
+        valid = "datetime(date) IS NOT NULL"
+        thursday = "date(date, '-' || ((CAST(strftime('%w', date) AS INTEGER) + 6) % 7) || ' days', '+3 days')"
+        buckets = {
+            'hour': "strftime('%Y-%m-%d %H:00:00', date)",
+            'day': "strftime('%Y-%m-%d', date)",
+            'week': f"strftime('%Y', {thursday}) || '-W' || "
+                    f"printf('%02d', (CAST(strftime('%j', {thursday}) AS INTEGER) - 1) / 7 + 1)",
+            'total': "'all'"
+        }
+    for granularity, bucket in buckets.items():
+        cursor.execute(f'''
+            INSERT INTO energy_rollups (user_id, granularity, bucket, solar_total, electric_total, reading_count)
+            SELECT user_id, '{granularity}', {bucket},
+                   SUM(COALESCE(solar_energy, 0)), SUM(COALESCE(electric_energy, 0)), COUNT(*)
+            FROM energy_data
+            WHERE {valid}
+            GROUP BY user_id{'' if granularity == 'total' else ', ' + bucket}
+        ''')
+
+
+def _add_user_data_version(cursor, postgres):
+    if postgres:
+        cursor.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS data_version INTEGER NOT NULL DEFAULT 0")
+        cursor.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS data_updated_at TEXT")
+    else:
+        cursor.execute("ALTER TABLE users ADD COLUMN data_version INTEGER NOT NULL DEFAULT 0")
+        cursor.execute("ALTER TABLE users ADD COLUMN data_updated_at TEXT")
+
+
+def _create_model_artifacts(cursor, postgres):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS model_artifacts (
+            user_id INTEGER NOT NULL,
+            data_version INTEGER NOT NULL,
+            metadata TEXT NOT NULL,
+            payload {0} NOT NULL,
+            saved_at REAL NOT NULL,
+            used_at REAL NOT NULL,
+            PRIMARY KEY (user_id, data_version)
+        )
+    '''.format('BYTEA' if postgres else 'BLOB'))
+
+
+def _create_analytics_results(cursor, postgres):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS analytics_results (
+            user_id INTEGER PRIMARY KEY,
+            data_version INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            analysis TEXT,
+            latest_entry TEXT,
+            row_count INTEGER,
+            stage_timings TEXT,
+            error TEXT,
+            seconds REAL,
+            computed_at TEXT NOT NULL
+        )
+    ''')
+
+
+MIGRATIONS = [
+    (1, 'create_base_tables', _create_base_tables),
+    (2, 'add_user_date_index', _add_user_date_index),
+    (3, 'convert_date_to_timestamp', _convert_date_to_timestamp),
+    (4, 'create_energy_rollups', _create_energy_rollups),
+    (5, 'add_user_data_version', _add_user_data_version),
+    (6, 'create_model_artifacts', _create_model_artifacts),
+    (7, 'create_analytics_results', _create_analytics_results),
+]
+
+
+def applied_versions(cursor):
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def migrate(conn, target=None):
+    """Apply all pending migrations (up to target) and return the versions applied"""
+    postgres = bool(os.environ.get('DATABASE_URL'))
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TEXT NOT NULL
+        )
+    ''')
+    conn.commit()
+
+    applied = []
+    if postgres:
+        cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_KEY,))
+    try:
+        for version, name, migration in MIGRATIONS:
+            if target is not None and version > target:
+                break
+            if not postgres:
+                # Take the write lock up front so concurrent workers apply each step once
+                cursor.execute("BEGIN IMMEDIATE")
+            if version in applied_versions(cursor):
+                conn.rollback()
+                continue
+            try:
+                migration(cursor, postgres)
+                cursor.execute(
+                    "INSERT INTO schema_migrations (version, name, applied_at) VALUES ({0}, {0}, {0})".format(
+                        '%s' if postgres else '?'
+                    ),
+                    (version, name, datetime.utcnow().isoformat())
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                logger.error(f"Migration {version} ({name}) failed")
+                raise
+            logger.info(f"Applied migration {version} ({name})")
+            applied.append(version)
+    finally:
+        if postgres:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_KEY,))
+            conn.commit()
+    return applied
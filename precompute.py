@@ -0,0 +1,211 @@
+"""Precompute analytics for every user with new data since the last run.
+
+    python precompute.py --workers 4 --budget 120
+    python precompute.py --user-id 12 --user-id 15 --retry-failed --output report.json
+
+Users whose data version differs from their analytics_results row are analysed on
+a process pool, most recently updated first, starting from their stored ARIMA
+models. Each result is written to analytics_results (and the fitted models to the
+model store) as soon as it arrives, so /get_analytics serves it without fitting and
+an interrupted run resumes where it stopped. A user that exceeds the per-user time
+budget is recorded as 'timeout' and only retried with --retry-failed.
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import signal
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+
+import numpy as np
+
+import analytics_results
+import data_versions
+import main
+from analytics.readings import latest_entry
+
+logger = logging.getLogger('precompute')
+
+
+class BudgetExceeded(BaseException):
+    # Not an Exception: analyze_consumption must not swallow it as a stage error
+    pass
+
+
+@contextmanager
+def time_budget(seconds):
+    """Raise BudgetExceeded in the calling (main) thread after seconds; 0 means no budget"""
+    if not seconds:
+        yield
+        return
+
+    def expire(signum, frame):
+        raise BudgetExceeded()
+
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def analyze_user(user_id, budget=0):
+    """Worker entry point: analyse one user and return the row to save"""
+    started = time.perf_counter()
+    timings = {}
+    result = {'user_id': user_id, 'status': 'done', 'stage_timings': timings}
+    conn = main.get_db_connection()
+    try:
+        cursor = conn.cursor()
+        # The version is read before the data: if data arrives in between, the row is
+        # merely older than the data and the next run picks the user up again
+        result['version'], _ = data_versions.get(cursor, user_id)
+        stage_started = time.perf_counter()
+        data = main.fetch_analysis_data(cursor, user_id, result['version'])
+        timings['load_data'] = time.perf_counter() - stage_started
+    finally:
+        conn.close()
+
+    if not len(data):
+        result['status'] = 'empty'
+    else:
+        try:
+            with time_budget(budget):
+                stage_started = time.perf_counter()
+                analysis, system = main.run_analysis(data, main.get_analytics_predictor(user_id))
+                timings['analyze'] = time.perf_counter() - stage_started
+        except BudgetExceeded:
+            result.update(status='timeout', error=f'exceeded the {budget:g}s budget')
+        except Exception as e:
+            result.update(status='failed', error=str(e))
+        else:
+            timings.update(system.stage_timings)
+            result.update(analysis=analysis, latest_entry=latest_entry(data), row_count=len(data))
+            if main.model_store is not None:
+                stage_started = time.perf_counter()
+                main.model_store.save(user_id, result['version'], system, analysis, result['latest_entry'],
+                                      len(data))
+                timings['store_model'] = time.perf_counter() - stage_started
+    result['seconds'] = time.perf_counter() - started
+    return result
+
+
+def save_result(conn, result):
+    analytics_results.save(
+        conn.cursor(), result['user_id'], result['version'], result['status'],
+        analysis=result.get('analysis'), latest_entry=result.get('latest_entry'),
+        row_count=result.get('row_count'), stage_timings=result['stage_timings'],
+        error=result.get('error'), seconds=result['seconds']
+    )
+    conn.commit()
+
+
+def precompute(workers=2, budget=0, user_ids=None, limit=None, retry_failed=False):
+    """Analyse every pending user and return the run report"""
+    main.startup(keep_alive=False)
+    conn = main.get_db_connection()
+    try:
+        pending = analytics_results.pending(conn.cursor(), retry_failed=retry_failed,
+                                            user_ids=user_ids, limit=limit)
+        logger.info(f"{len(pending)} users with new data")
+        results = []
+        started = time.perf_counter()
+        interrupted = False
+
+        def record(result):
+            save_result(conn, result)
+            results.append(result)
+            if result['status'] != 'done':
+                logger.warning(f"User {result['user_id']}: {result['status']} {result.get('error') or ''}")
+
+        try:
+            if workers <= 0:
+                for user_id, _ in pending:
+                    record(analyze_user(user_id, budget))
+            else:
+                # forkserver, as for the web process's analytics pool (see analytics.jobs)
+                context = multiprocessing.get_context('forkserver')
+                with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                    futures = {pool.submit(analyze_user, user_id, budget): user_id for user_id, _ in pending}
+                    try:
+                        for future in as_completed(futures):
+                            try:
+                                record(future.result())
+                            except Exception as e:
+                                # The worker itself died (e.g. out of memory); retried next run
+                                logger.error(f"User {futures[future]}: worker error: {str(e)}")
+                    except KeyboardInterrupt:
+                        pool.shutdown(wait=False, cancel_futures=True)
+                        raise
+        except KeyboardInterrupt:
+            # Finished users are already saved; a rerun picks up the rest
+            interrupted = True
+        elapsed = time.perf_counter() - started
+    finally:
+        conn.close()
+    return report(results, len(pending), elapsed, interrupted)
+
+
+def report(results, pending, elapsed, interrupted=False):
+    statuses = {}
+    stages = {}
+    for result in results:
+        statuses[result['status']] = statuses.get(result['status'], 0) + 1
+        for stage, seconds in result['stage_timings'].items():
+            stages.setdefault(stage, []).append(seconds)
+    return {
+        'pending': pending,
+        'processed': len(results),
+        'interrupted': interrupted,
+        'statuses': statuses,
+        'seconds': elapsed,
+        'users_per_second': len(results) / elapsed if elapsed > 0 else 0.0,
+        'stages': {
+            stage: {
+                'count': len(values),
+                'total_seconds': float(np.sum(values)),
+                'median_seconds': float(np.median(values)),
+                'p95_seconds': float(np.percentile(values, 95))
+            }
+            for stage, values in stages.items()
+        }
+    }
+
+
+def print_report(run):
+    status = ', '.join(f"{count} {name}" for name, count in sorted(run['statuses'].items())) or 'nothing to do'
+    print(f"{run['processed']}/{run['pending']} users in {run['seconds']:.1f}s "
+          f"({run['users_per_second']:.2f} users/s): {status}"
+          + (' - interrupted, rerun to resume' if run['interrupted'] else ''))
+    if run['stages']:
+        print(f"{'stage':28s} {'count':>6s} {'total s':>9s} {'median ms':>10s} {'p95 ms':>9s}")
+    for stage, row in sorted(run['stages'].items(), key=lambda item: -item[1]['total_seconds']):
+        print(f"{stage:28s} {row['count']:6d} {row['total_seconds']:9.2f} "
+              f"{row['median_seconds'] * 1000:10.1f} {row['p95_seconds'] * 1000:9.1f}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Precompute analytics for users with new data')
+    parser.add_argument('--workers', type=int, default=2, help='worker processes (0 runs inline)')
+    parser.add_argument('--budget', type=float, default=300, help='seconds per user (0 for no limit)')
+    parser.add_argument('--user-id', type=int, action='append', dest='user_ids', help='only these users')
+    parser.add_argument('--limit', type=int, help='at most this many users')
+    parser.add_argument('--retry-failed', action='store_true', help='also rerun timed out and failed users')
+    parser.add_argument('--output', help='write the report as JSON here')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    run = precompute(args.workers, args.budget, args.user_ids, args.limit, args.retry_failed)
+    print_report(run)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(run, f, indent=2)
+    if run['interrupted']:
+        sys.exit(130)
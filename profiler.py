@@ -0,0 +1,83 @@
+"""Sampling profiler for slow requests.
+
+While enabled, one background thread samples the stacks of every thread that is
+serving a request. When a request takes longer than the threshold its samples are
+written in the collapsed-stack format ('frame;frame;frame count' per line), which
+flamegraph.pl and speedscope read directly.
+"""
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+
+class SlowRequestProfiler:
+    def __init__(self, threshold, interval=0.005, output_dir='profiles', max_depth=64):
+        self.threshold = threshold
+        self.interval = interval
+        self.output_dir = output_dir
+        self.max_depth = max_depth
+        self._active = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._thread_pid = None
+        os.makedirs(output_dir, exist_ok=True)
+
+    def start(self):
+        """Begin sampling the calling thread"""
+        self._ensure_sampler()
+        with self._lock:
+            self._active[threading.get_ident()] = Counter()
+
+    def stop(self, name, elapsed):
+        """Stop sampling the calling thread; dump its stacks if the request was slow"""
+        with self._lock:
+            samples = self._active.pop(threading.get_ident(), None)
+        if not samples or elapsed < self.threshold:
+            return None
+        safe_name = re.sub(r'[^A-Za-z0-9_.-]+', '_', name).strip('_') or 'request'
+        path = os.path.join(self.output_dir, f'{time.strftime("%Y%m%d-%H%M%S")}-{safe_name}-{int(elapsed * 1000)}ms.folded')
+        try:
+            with open(path, 'w') as f:
+                for stack, count in samples.most_common():
+                    f.write(f'{stack} {count}\n')
+        except OSError as e:
+            logger.error(f"Could not write profile {path}: {str(e)}")
+            return None
+        logger.info(f"Slow request {name} took {elapsed:.2f}s; profile written to {path}")
+        return path
+
+    def _ensure_sampler(self):
+        # Threads do not survive a fork, so each worker starts its own sampler
+        if self._thread is not None and self._thread_pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or self._thread_pid != os.getpid():
+                self._thread = threading.Thread(target=self._run, name='slow-request-profiler', daemon=True)
+                self._thread_pid = os.getpid()
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    continue
+                frames = sys._current_frames()
+                for ident, samples in self._active.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        samples[self._collapse(frame)] += 1
+
+    def _collapse(self, frame):
+        stack = []
+        while frame is not None and len(stack) < self.max_depth:
+            code = frame.f_code
+            stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+            frame = frame.f_back
+        return ';'.join(reversed(stack))
@@ -0,0 +1,202 @@
+"""Pre-aggregated per-user energy totals.
+
+energy_rollups holds solar/electric sums and reading counts per user at 'hour',
+'day' and ISO 'week' granularity, plus a single 'total' bucket. Every write to
+energy_data applies the matching deltas in the same transaction, so summary
+endpoints read one row instead of scanning the user's history.
+"""
+import os
+from datetime import datetime, timedelta
+
+from database import TIMESTAMP_FORMAT, execute_query, normalize_timestamp
+
+GRANULARITIES = ('hour', 'day', 'week', 'total')
+TOTAL_BUCKET = 'all'
+
+
+def week_bucket(value):
+    year, week, _ = value.isocalendar()
+    return f'{year}-W{week:02d}'
+
+
+def bucket_start(granularity, bucket):
+    """The datetime an 'hour', 'day' or 'week' bucket key starts at"""
+    if granularity == 'hour':
+        return datetime.strptime(bucket, TIMESTAMP_FORMAT)
+    if granularity == 'day':
+        return datetime.strptime(bucket, '%Y-%m-%d')
+    year, week = bucket.split('-W')
+    return datetime.fromisocalendar(int(year), int(week), 1)
+
+
+def reading_buckets(date):
+    """(granularity, bucket) keys a reading at the given date contributes to"""
+    timestamp = datetime.strptime(normalize_timestamp(date), TIMESTAMP_FORMAT)
+    return [
+        ('hour', timestamp.strftime('%Y-%m-%d %H:00:00')),
+        ('day', timestamp.strftime('%Y-%m-%d')),
+        ('week', week_bucket(timestamp)),
+        ('total', TOTAL_BUCKET)
+    ]
+
+
+def record_reading(cursor, user_id, date, solar_energy, electric_energy, sign=1):
+    """Add (sign=1) or remove (sign=-1) a single reading from the user's rollups"""
+    try:
+        buckets = reading_buckets(date)
+    except ValueError:
+        # Unparseable legacy dates were never bucketed (see record_frame)
+        return
+    deltas = [
+        (granularity, bucket, sign * float(solar_energy or 0), sign * float(electric_energy or 0), sign)
+        for granularity, bucket in buckets
+    ]
+    _apply(cursor, user_id, deltas)
+
+
+def record_frame(cursor, user_id, frame, sign=1):
+    """Add or remove a DataFrame of readings (date, solar_energy, electric_energy) in one pass"""
+    import pandas as pd
+
+    timestamps = pd.to_datetime(frame['date'], format='ISO8601', errors='coerce')
+    # Unparseable legacy dates cannot be bucketed
+    frame = frame[timestamps.notna().to_numpy()]
+    timestamps = timestamps[timestamps.notna()]
+    if not len(frame):
+        return
+    iso = timestamps.dt.isocalendar()
+    values = pd.DataFrame({
+        'solar': frame['solar_energy'].fillna(0).to_numpy(dtype=float),
+        'electric': frame['electric_energy'].fillna(0).to_numpy(dtype=float)
+    })
+    keys = {
+        'hour': timestamps.dt.strftime('%Y-%m-%d %H:00:00').to_numpy(),
+        'day': timestamps.dt.strftime('%Y-%m-%d').to_numpy(),
+        'week': (iso['year'].astype(str) + '-W' + iso['week'].astype(str).str.zfill(2)).to_numpy()
+    }
+
+    deltas = []
+    for granularity, buckets in keys.items():
+        sums = values.groupby(buckets).agg(
+            solar=('solar', 'sum'), electric=('electric', 'sum'), count=('solar', 'size')
+        )
+        deltas.extend(
+            (granularity, bucket, sign * solar, sign * electric, sign * int(count))
+            for bucket, solar, electric, count in sums.itertuples(name=None)
+        )
+    deltas.append(('total', TOTAL_BUCKET, sign * float(values['solar'].sum()),
+                   sign * float(values['electric'].sum()), sign * len(values)))
+    _apply(cursor, user_id, deltas)
+
+
+def _apply(cursor, user_id, deltas):
+    query = '''
+        INSERT INTO energy_rollups (user_id, granularity, bucket, solar_total, electric_total, reading_count)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        ON CONFLICT (user_id, granularity, bucket) DO UPDATE SET
+            solar_total = energy_rollups.solar_total + excluded.solar_total,
+            electric_total = energy_rollups.electric_total + excluded.electric_total,
+            reading_count = energy_rollups.reading_count + excluded.reading_count
+    '''
+    rows = [(user_id,) + tuple(delta) for delta in deltas]
+    if os.environ.get('DATABASE_URL'):
+        from psycopg2.extras import execute_batch
+        execute_batch(cursor, query, rows, page_size=1000)
+    else:
+        cursor.executemany(query.replace('%s', '?'), rows)
+
+    if any(delta[4] < 0 for delta in deltas):
+        execute_query(cursor, "DELETE FROM energy_rollups WHERE user_id = %s AND reading_count <= 0", (user_id,))
+
+
+def get_rollup(cursor, user_id, granularity, bucket):
+    """Return (solar_total, electric_total, reading_count) for one bucket, zeros if absent"""
+    execute_query(cursor, '''
+        SELECT solar_total, electric_total, reading_count FROM energy_rollups
+        WHERE user_id = %s AND granularity = %s AND bucket = %s
+    ''', (user_id, granularity, bucket))
+    row = cursor.fetchone()
+    return (row[0], row[1], row[2]) if row else (0.0, 0.0, 0)
+
+
+def get_rollup_range(cursor, user_id, granularity, first_bucket, last_bucket):
+    """Return [(bucket, solar_total, electric_total, reading_count)] for an inclusive bucket range"""
+    execute_query(cursor, '''
+        SELECT bucket, solar_total, electric_total, reading_count FROM energy_rollups
+        WHERE user_id = %s AND granularity = %s AND bucket BETWEEN %s AND %s
+        ORDER BY bucket
+    ''', (user_id, granularity, first_bucket, last_bucket))
+    return cursor.fetchall()
+
+
+def hourly_series(cursor, user_ids, hours, chunk_size=500):
+    """Return {user_id: (latest hour, array)} of mean electric use per hour.
+
+    Each array covers the user's last `hours` hours up to their latest reading, oldest
+    first, with NaN for hours without readings. Users without readings are left out.
+    """
+    import numpy as np
+
+    series = {}
+    user_ids = list(user_ids)
+    for start in range(0, len(user_ids), chunk_size):
+        chunk = tuple(user_ids[start:start + chunk_size])
+        placeholders = ', '.join(['%s'] * len(chunk))
+        execute_query(cursor, f'''
+            SELECT user_id, MAX(bucket) FROM energy_rollups
+            WHERE granularity = 'hour' AND user_id IN ({placeholders})
+            GROUP BY user_id
+        ''', chunk)
+        latest = {row[0]: datetime.strptime(row[1], TIMESTAMP_FORMAT) for row in cursor.fetchall()}
+        if not latest:
+            continue
+        cutoff = min(latest.values()) - timedelta(hours=hours - 1)
+        placeholders = ', '.join(['%s'] * len(latest))
+        execute_query(cursor, f'''
+            SELECT user_id, bucket, electric_total, reading_count FROM energy_rollups
+            WHERE granularity = 'hour' AND user_id IN ({placeholders}) AND bucket >= %s
+        ''', tuple(latest) + (cutoff.strftime(TIMESTAMP_FORMAT),))
+        values = {user_id: np.full(hours, np.nan) for user_id in latest}
+        for user_id, bucket, electric_total, reading_count in cursor.fetchall():
+            age = int((latest[user_id] - datetime.strptime(bucket, TIMESTAMP_FORMAT)).total_seconds()) // 3600
+            if age < hours and reading_count > 0:
+                values[user_id][hours - 1 - age] = electric_total / reading_count
+        series.update((user_id, (latest[user_id], values[user_id])) for user_id in latest)
+    return series
+
+
+def clear(cursor, user_id):
+    """Drop all of the user's rollups, e.g. before their history is replaced"""
+    execute_query(cursor, "DELETE FROM energy_rollups WHERE user_id = %s", (user_id,))
+
+
+def rebuild(connection, user_id=None, batch_size=50000):
+    """Recompute rollups from energy_data (for one user or everyone); the caller commits.
+
+    Returns the number of readings aggregated.
+    """
+    import pandas as pd
+
+    read = connection.cursor()
+    write = connection.cursor()
+    if user_id is None:
+        write.execute("DELETE FROM energy_rollups")
+        read.execute("SELECT user_id, date, solar_energy, electric_energy FROM energy_data ORDER BY user_id")
+    else:
+        execute_query(write, "DELETE FROM energy_rollups WHERE user_id = %s", (user_id,))
+        execute_query(read, '''
+            SELECT user_id, date, solar_energy, electric_energy FROM energy_data WHERE user_id = %s
+        ''', (user_id,))
+
+    total = 0
+    while True:
+        rows = read.fetchmany(batch_size)
+        if not rows:
+            break
+        frame = pd.DataFrame([tuple(row) for row in rows],
+                             columns=['user_id', 'date', 'solar_energy', 'electric_energy'])
+        frame = frame[frame['date'].notna()]
+        for owner, readings in frame.groupby('user_id'):
+            record_frame(write, int(owner), readings)
+        total += len(frame)
+    return total
@@ -0,0 +1,157 @@
+"""Per-user columnar snapshots of energy_data for the analytics path.
+
+Each user has <root>/<user_id>/readings.bin, the history as raw analytics.readings
+READING_DTYPE records in date order, and meta.json with the number of records, the
+highest energy_data id they cover and the data version they were taken at. Analyses
+memory-map the file instead of re-reading and converting the whole table.
+
+energy_data only ever gains rows or loses them, so a refresh fetches the rows with
+ids above the covered one and appends them to the file in place. If fewer covered
+ids remain than the file holds, readings were deleted (or the history replaced) and
+the file is rebuilt. Readings dated before the end of the file are merged by
+rewriting it. meta.json is replaced last, so a reader never sees records from an
+unfinished append. numpy is imported on first use, so creating the store at
+startup loads nothing heavy.
+"""
+import fcntl
+import json
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+from database import execute_query
+
+# Bump when the file layout changes; older snapshots are rebuilt
+FORMAT_VERSION = 1
+
+
+class SnapshotStore:
+    def __init__(self, root, chunk_size=10000):
+        self.root = root
+        self.chunk_size = chunk_size
+
+    def readings(self, cursor, user_id, version=None):
+        """The user's readings as a read-only memory-mapped record array, brought up to date
+        with energy_data first unless the snapshot was taken at this data version"""
+        user_dir = os.path.join(self.root, str(user_id))
+        os.makedirs(user_dir, exist_ok=True)
+        with self._locked(user_dir):
+            meta = self._meta(user_dir)
+            if meta is None or version is None or meta['data_version'] != version:
+                meta = self._refresh(cursor, user_id, user_dir, meta, version)
+            return self._map(user_dir, meta)
+
+    def clear(self, user_id=None):
+        path = self.root if user_id is None else os.path.join(self.root, str(user_id))
+        shutil.rmtree(path, ignore_errors=True)
+
+    @contextmanager
+    def _locked(self, user_dir):
+        # Serializes refreshes of one user across threads and worker processes
+        with open(os.path.join(user_dir, '.lock'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _meta(self, user_dir):
+        from analytics.readings import READING_DTYPE
+
+        try:
+            with open(os.path.join(user_dir, 'meta.json')) as f:
+                meta = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        if meta.get('format') != FORMAT_VERSION or meta.get('dtype') != str(READING_DTYPE.descr):
+            return None
+        return meta
+
+    def _refresh(self, cursor, user_id, user_dir, meta, version):
+        import numpy as np
+        from analytics.readings import READING_DTYPE
+
+        execute_query(cursor, "SELECT MAX(id) FROM energy_data WHERE user_id = %s", (user_id,))
+        max_id = cursor.fetchone()[0] or 0
+        if meta is not None:
+            execute_query(cursor, "SELECT COUNT(*) FROM energy_data WHERE user_id = %s AND id <= %s",
+                     (user_id, meta['max_id']))
+            if cursor.fetchone()[0] != meta['rows']:
+                meta = None
+
+        if meta is None:
+            records = self._fetch(cursor, user_id, 0, max_id)
+            self._rewrite(user_dir, records)
+            rows = len(records)
+            last = str(records['timestamp'][-1]) if rows else None
+        else:
+            records = self._fetch(cursor, user_id, meta['max_id'], max_id)
+            rows, last = meta['rows'], meta['last']
+            if len(records):
+                if rows and records['timestamp'][0] < np.datetime64(last):
+                    # Late readings: merge them into place
+                    merged = np.concatenate([self._map(user_dir, meta), records])
+                    self._rewrite(user_dir, merged[np.argsort(merged['timestamp'], kind='stable')])
+                else:
+                    self._append(user_dir, meta, records)
+                rows += len(records)
+                last = max(last or '', str(records['timestamp'][-1]))
+
+        meta = {
+            'format': FORMAT_VERSION,
+            'dtype': str(READING_DTYPE.descr),
+            'rows': rows,
+            'max_id': max_id,
+            'last': last,
+            'data_version': version
+        }
+        self._write(os.path.join(user_dir, 'meta.json'), json.dumps(meta).encode())
+        return meta
+
+    def _fetch(self, cursor, user_id, after_id, max_id):
+        from analytics.readings import read_cursor
+
+        execute_query(cursor, '''
+            SELECT date, solar_energy, electric_energy, temperature, humidity
+            FROM energy_data
+            WHERE user_id = %s AND id > %s AND id <= %s
+            ORDER BY date
+        ''', (user_id, after_id, max_id))
+        return read_cursor(cursor, self.chunk_size)
+
+    def _append(self, user_dir, meta, records):
+        with open(os.path.join(user_dir, 'readings.bin'), 'r+b') as f:
+            # Drop anything an interrupted append left past the committed records
+            f.truncate(meta['rows'] * records.itemsize)
+            f.seek(0, os.SEEK_END)
+            f.write(records.tobytes())
+
+    def _rewrite(self, user_dir, records):
+        self._write(os.path.join(user_dir, 'readings.bin'), records.tobytes())
+
+    def _write(self, path, payload):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def _map(self, user_dir, meta):
+        import numpy as np
+        from analytics.readings import READING_DTYPE
+
+        if not meta['rows']:
+            return np.empty(0, dtype=READING_DTYPE)
+        return np.memmap(os.path.join(user_dir, 'readings.bin'), dtype=READING_DTYPE, mode='r',
+                         shape=(meta['rows'],))
+
+
+def create_snapshot_store(setting, chunk_size=10000):
+    """A directory path, or '' to read analytics data straight from energy_data"""
+    if not setting:
+        return None
+    return SnapshotStore(setting, chunk_size=chunk_size)
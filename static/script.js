@@ -1,7 +1,9 @@
 document.addEventListener("DOMContentLoaded", function () {
   const API_BASE = window.location.origin;
   let currentRange = "all";
+  let currentHorizon = "24h";
   window.energyChart = null; // ✅ Declare globally
+  window.forecastChart = null;
   let analyticsDebounceTimer = null;
 
   const registerForm = document.getElementById("register-form");
@@ -140,13 +142,19 @@ document.addEventListener("DOMContentLoaded", function () {
     const fromDate = document.getElementById("start-date")?.value;
     const toDate = document.getElementById("end-date")?.value;
 
-    let url = `${API_BASE}/get_energy_data`;
-
+    const params = new URLSearchParams();
     if (range !== "all") {
-      url += `?range=${range}`;
+      params.set("range", range);
     } else if (fromDate && toDate) {
-      url = `${API_BASE}/get_energy_data?from_date=${fromDate}&to_date=${toDate}`;
+      params.set("from_date", fromDate);
+      params.set("to_date", toDate);
     }
+    // The table lists every reading; only the chart is downsampled
+    fetchEnergyTable(new URLSearchParams(params));
+    // Let the server reduce wide ranges to about one point per chart pixel
+    params.set("max_points", Math.max(100, Math.round(chartCanvas?.clientWidth || 800)));
+    params.set("method", "lttb");
+    const url = `${API_BASE}/get_energy_data?${params}`;
 
     try {
       const response = await fetch(url, {
@@ -157,9 +165,9 @@ document.addEventListener("DOMContentLoaded", function () {
       const result = await response.json();
       if (response.ok && result.status === "success") {
         const data = result.data;
-        updateEnergyTable(data);
         updateEnergyChart(data);
-        updateTotals(data);
+        updateTotals(data, result.totals);
+        fetchForecast(currentHorizon);
         // Call debounced analytics after data update
         debouncedFetchAnalytics();
       } else {
@@ -170,6 +178,31 @@ document.addEventListener("DOMContentLoaded", function () {
     }
   }
 
+  // Fetch every reading in the range for the table, page by page
+  async function fetchEnergyTable(params) {
+    params.set("limit", 1000);
+    const rows = [];
+    try {
+      do {
+        const response = await fetch(`${API_BASE}/get_energy_data?${params}`, {
+          method: "GET",
+          credentials: "include",
+        });
+
+        const result = await response.json();
+        if (!response.ok || result.status !== "success") {
+          console.error("Could not retrieve energy data:", result.message);
+          return;
+        }
+        rows.push(...result.data);
+        params.set("cursor", result.next_cursor || "");
+      } while (params.get("cursor"));
+      updateEnergyTable(rows);
+    } catch (error) {
+      console.error("Fetch Error:", error);
+    }
+  }
+
   // Helper function to update energy table
   function updateEnergyTable(data) {
     const tbody = document.querySelector("#energy-table tbody");
@@ -182,7 +215,7 @@ document.addEventListener("DOMContentLoaded", function () {
         <td>${entry.date || 'N/A'}</td>
         <td>${(parseFloat(entry.solar_energy) || 0).toFixed(2)}</td>
         <td>${(parseFloat(entry.electric_energy) || 0).toFixed(2)}</td>
-        <td><button class="btn btn-sm btn-danger delete-btn" data-id="${entry.id}">Delete</button></td>
+        <td>${entry.id != null ? `<button class="btn btn-sm btn-danger delete-btn" data-id="${entry.id}">Delete</button>` : ''}</td>
       `;
       tbody.appendChild(row);
     });
@@ -265,10 +298,93 @@ document.addEventListener("DOMContentLoaded", function () {
     });
   }
 
-  // Helper function to update totals
-  function updateTotals(data) {
-    const totalSolar = data.reduce((sum, entry) => sum + (parseFloat(entry.solar_energy) || 0), 0);
-    const totalElectric = data.reduce((sum, entry) => sum + (parseFloat(entry.electric_energy) || 0), 0);
+  // Day- or week-ahead consumption forecast with its prediction interval
+  async function fetchForecast(horizon) {
+    const chartCanvas = document.getElementById("forecastChart");
+    if (!chartCanvas) return;
+
+    try {
+      const response = await fetch(`${API_BASE}/api/forecast?horizon=${horizon}`, {
+        method: "GET",
+        credentials: "include",
+      });
+      const result = await response.json();
+      if (response.ok && result.status === "success") {
+        updateForecastChart(result);
+      } else {
+        console.error("Could not retrieve forecast:", result.message);
+      }
+    } catch (error) {
+      console.error("Forecast Error:", error);
+    }
+  }
+
+  function updateForecastChart(result) {
+    const chartCanvas = document.getElementById("forecastChart");
+    const points = result.forecast || [];
+    const percent = Math.round((result.interval || 0) * 100);
+
+    if (window.forecastChart && typeof window.forecastChart.destroy === "function") {
+      window.forecastChart.destroy();
+    }
+
+    window.forecastChart = new Chart(chartCanvas.getContext("2d"), {
+      type: "line",
+      data: {
+        labels: points.map(point => point.date),
+        datasets: [
+          {
+            label: `Upper (${percent}%)`,
+            data: points.map(point => point.upper),
+            borderColor: "rgba(41, 128, 185, 0.3)",
+            pointRadius: 0,
+            fill: false
+          },
+          {
+            label: `Lower (${percent}%)`,
+            data: points.map(point => point.lower),
+            borderColor: "rgba(41, 128, 185, 0.3)",
+            backgroundColor: "rgba(41, 128, 185, 0.15)",
+            pointRadius: 0,
+            fill: "-1"
+          },
+          {
+            label: "Forecast Electric Energy",
+            data: points.map(point => point.value),
+            borderColor: "#2980b9",
+            pointRadius: 0,
+            fill: false,
+            tension: 0.3
+          },
+        ],
+      },
+      options: {
+        responsive: true,
+        scales: {
+          y: {
+            beginAtZero: true,
+            title: {
+              display: true,
+              text: 'Energy (kWh)'
+            }
+          }
+        },
+        plugins: {
+          title: {
+            display: true,
+            text: points.length ? `Forecast (${result.model})` : 'Not enough data for a forecast yet'
+          }
+        }
+      },
+    });
+  }
+
+  // Helper function to update totals (exact server totals when the data was downsampled)
+  function updateTotals(data, totals) {
+    const totalSolar = totals ? totals.solar_energy
+      : data.reduce((sum, entry) => sum + (parseFloat(entry.solar_energy) || 0), 0);
+    const totalElectric = totals ? totals.electric_energy
+      : data.reduce((sum, entry) => sum + (parseFloat(entry.electric_energy) || 0), 0);
     
     const totalSolarElement = document.getElementById("total-solar");
     const totalElectricElement = document.getElementById("total-electric");
@@ -307,6 +423,13 @@ document.addEventListener("DOMContentLoaded", function () {
     });
   });
 
+  document.querySelectorAll(".forecast-btn").forEach((button) => {
+    button.addEventListener("click", function () {
+      currentHorizon = this.getAttribute("data-horizon");
+      fetchForecast(currentHorizon);
+    });
+  });
+
   const applyDateFilterBtn = document.getElementById("filter-btn");
   if (applyDateFilterBtn) {
     applyDateFilterBtn.addEventListener("click", () => {
@@ -468,6 +591,11 @@ document.addEventListener("DOMContentLoaded", function () {
             recommendationsList.appendChild(li);
           }
         }
+
+        // A background recompute is running: refresh once it finishes
+        if (data.job_id) {
+          followAnalyticsJob(data.job_id);
+        }
       } else {
         console.error("Analytics error:", data.message || "Unknown error");
         throw new Error(data.message || "Failed to get analytics data");
@@ -490,6 +618,27 @@ document.addEventListener("DOMContentLoaded", function () {
     }
   }
 
+  // Poll a background analytics job and re-render when it completes
+  async function followAnalyticsJob(jobId, attempt = 0) {
+    if (attempt >= 30) return;
+    try {
+      const response = await fetch(`${API_BASE}/analytics_job/${jobId}`, {
+        method: "GET",
+        credentials: "include",
+      });
+      const job = await response.json();
+      if (!response.ok || job.status !== "success") return;
+
+      if (job.job_status === "done") {
+        fetchAnalytics();
+      } else if (job.job_status === "pending" || job.job_status === "running") {
+        setTimeout(() => followAnalyticsJob(jobId, attempt + 1), 2000);
+      }
+    } catch (error) {
+      console.error("Analytics job poll error:", error);
+    }
+  }
+
   if (window.location.pathname.includes("dashboard")) {
     console.log("Dashboard loaded, fetching initial data...");
     fetchEnergyData(currentRange);
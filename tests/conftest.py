@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """main with a fresh SQLite database and no on-disk stores"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('SQLITE_PATH', str(tmp_path / 'solar_energy.db'))
+    monkeypatch.setenv('MODEL_STORE', '')
+    monkeypatch.setenv('READING_SNAPSHOTS', '')
+    monkeypatch.setenv('FORECAST_CACHE_DIR', '')
+    monkeypatch.delenv('DATABASE_URL', raising=False)
+
+    import database
+    import main
+
+    monkeypatch.setattr(database, '_pool', None)
+    monkeypatch.setattr(main, 'startup_complete', False)
+    main.startup(keep_alive=False)
+    yield main
+    database.get_pool().close_all()
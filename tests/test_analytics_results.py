@@ -0,0 +1,22 @@
+import analytics_results
+
+
+def test_pending_includes_histories_from_before_data_versions(app):
+    conn = app.get_db_connection()
+    cursor = conn.cursor()
+    cursor.executemany("INSERT INTO users (username, password) VALUES (?, 'x')", [('old',), ('empty',)])
+    cursor.execute("SELECT id FROM users WHERE username = 'old'")
+    user_id = cursor.fetchone()[0]
+    # Readings written before migration 5 leave the user at data_version 0
+    cursor.executemany(
+        "INSERT INTO energy_data (user_id, date, solar_energy, electric_energy) VALUES (?, ?, 1, 2)",
+        [(user_id, f'2024-03-05 {hour:02d}:00:00') for hour in range(8)]
+    )
+    conn.commit()
+
+    assert analytics_results.pending(cursor) == [(user_id, 0)]
+
+    analytics_results.save(cursor, user_id, 0, 'done', analysis={}, row_count=8)
+    conn.commit()
+    assert analytics_results.pending(cursor) == []
+    conn.close()
@@ -0,0 +1,43 @@
+def add_reading(main, user_id, date, solar_energy, electric_energy):
+    conn = main.get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO energy_data (user_id, date, solar_energy, electric_energy) VALUES (?, ?, ?, ?)",
+                   (user_id, date, solar_energy, electric_energy))
+    entry_id = cursor.lastrowid
+    conn.commit()
+    conn.close()
+    return entry_id
+
+
+def rollup_total(main, user_id):
+    conn = main.get_db_connection()
+    row = main.rollups.get_rollup(conn.cursor(), user_id, 'total', main.rollups.TOTAL_BUCKET)
+    conn.close()
+    return row
+
+
+def test_delete_entry_with_legacy_date(app):
+    conn = app.get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO users (username, password) VALUES ('legacy', 'x')")
+    user_id = cursor.lastrowid
+    conn.commit()
+    conn.close()
+
+    client = app.app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = user_id
+        session['username'] = 'legacy'
+    assert client.post('/add_energy', json={
+        'date': '2024-03-05 10:00:00', 'solar_energy': 2.0, 'electric_energy': 3.0
+    }).status_code == 200
+    # Migration 3 keeps dates SQLite cannot parse as they were stored
+    legacy_id = add_reading(app, user_id, '03/05/2024', 5.0, 7.0)
+
+    response = client.post('/delete_entry', json={'id': legacy_id})
+
+    assert response.status_code == 200
+    entries = client.get('/get_energy_data').get_json()['data']
+    assert [entry['id'] for entry in entries if entry['id'] == legacy_id] == []
+    # The legacy reading was never in the rollups, so the other reading's totals stand
+    assert rollup_total(app, user_id) == (2.0, 3.0, 1)